@@ -0,0 +1,91 @@
+'''Быстрый путь ответов: JSON собирается из строк БД без моделей Pydantic.
+
+Включается FAST_JSON_RESPONSES. Формат ответа тот же, что у схем из
+app.schemas, response_model эндпоинтов остаются для документации.
+С установленным orjson сериализация идёт через него, иначе через json.
+'''
+import json
+from typing import Any, Callable, Iterable, Mapping
+
+from fastapi.responses import JSONResponse, Response
+
+from app.schemas.pagination import encode_cursor
+
+try:
+    import orjson
+except ImportError:  # orjson не обязателен
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RawJSONResponse(Response):
+    '''Готовый JSON без повторной сериализации'''
+    media_type = "application/json"
+
+
+def organization_item(row: Mapping) -> dict:
+    return {"name": row["name"], "phones": list(row["phones"])}
+
+
+def organization_activity_item(row: Mapping) -> dict:
+    phones = row.get("phones")
+    return {
+        "organization": row["organization_name"],
+        "activity": row["activity_name"],
+        "phones": list(phones) if phones is not None else None,
+    }
+
+
+def organization_search_item(row: Mapping) -> dict:
+    return {"name": row["name"], "phones": list(row["phones"]), "rank": row["rank"]}
+
+
+def organization_distance_item(row: Mapping) -> dict:
+    return {"name": row["name"], "phones": list(row["phones"]), "distance_m": row["distance_m"]}
+
+
+def organization_cluster_item(row: Mapping) -> dict:
+    return {"lat": row["lat"], "lon": row["lon"], "count": row["count"]}
+
+
+def fast_page(
+    rows: Iterable[Mapping],
+    next_key: tuple | None,
+    item: Callable[[Mapping], dict] = organization_item,
+    headers: Mapping[str, str] | None = None
+) -> FastJSONResponse:
+    '''То же, что Page[...] в обычном пути'''
+    return FastJSONResponse(
+        {"items": [item(row) for row in rows], "next_cursor": encode_cursor(next_key)},
+        headers=headers,
+    )
+
+
+def fast_list(
+    rows: Iterable[Mapping],
+    item: Callable[[Mapping], dict] = organization_item
+) -> FastJSONResponse:
+    return FastJSONResponse([item(row) for row in rows])
+
+
+def raw_page(
+    items_json: str,
+    next_key: tuple | None,
+    headers: Mapping[str, str] | None = None
+) -> RawJSONResponse:
+    '''Страница из JSON-массива элементов, собранного в БД'''
+    body = b''.join((
+        b'{"items":', items_json.encode("utf-8"),
+        b',"next_cursor":', dumps(encode_cursor(next_key)), b'}',
+    ))
+    return RawJSONResponse(body, headers=headers)
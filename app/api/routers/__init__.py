@@ -1,3 +1,8 @@
 from app.api.routers.organization import router as organization_router
 from app.api.routers.debug import router as debug_router
 from app.api.routers.health import router as health_router
+from app.api.routers.admin import router as admin_router
+from app.api.routers.export import router as export_router
+from app.api.routers.tile import router as tile_router
+from app.api.routers.activity import router as activity_router
+from app.api.routers.build import router as building_router
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.responses import FastJSONResponse
+from app.config.database import get_read_session
+from app.config.settings import settings
+from app.deps import get_optional_bbox
+from app.schemas.activity import ActivityTreeOut
+from app.schemas.geo import BBox
+from app.services.activity import ActivityService
+
+
+router = APIRouter(tags=['Activity'])
+
+
+@router.get("/activities/tree", response_model=list[ActivityTreeOut])
+async def get_activity_tree(
+    building_id: int | None = Query(None, description="Считать только организации здания"),
+    bbox: BBox | None = Depends(get_optional_bbox),
+    session: AsyncSession = Depends(get_read_session)
+):
+    tree = await ActivityService().get_activity_tree(session, building_id, bbox)
+    if settings.FAST_JSON_RESPONSES:
+        return FastJSONResponse(tree)
+    return [ActivityTreeOut.model_validate(node) for node in tree]
@@ -0,0 +1,68 @@
+import asyncio
+import os
+from pathlib import PurePath
+
+from fastapi import (APIRouter, BackgroundTasks, Depends, File, HTTPException,
+                     Query, Response, UploadFile)
+
+from app.config.settings import settings
+from app.deps import get_token_header
+from app.schemas.bulk_import import ImportFormat, ImportJobOut
+from app.services.bulk_import import (ImportConflictError, ImportFormatError,
+                                      default_job_name, detect_format,
+                                      get_job, import_file_in_background,
+                                      save_upload, start_job)
+
+
+router = APIRouter(prefix='/admin', tags=['Admin'], dependencies=[Depends(get_token_header)])
+
+
+@router.post(
+    "/import",
+    response_model=ImportJobOut,
+    status_code=202,
+    responses={
+        200: {"description": "Файл уже загружен этой задачей"},
+        409: {"description": "Задача начата с другим файлом"},
+    },
+)
+async def bulk_import(
+    response: Response,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(..., description="CSV или NDJSON с организациями"),
+    format: ImportFormat | None = Query(None, description="По умолчанию - по расширению файла"),
+    job: str | None = Query(None, description="Имя задачи, по умолчанию имя файла и начало его sha256"),
+    batch_size: int = Query(settings.IMPORT_BATCH_SIZE, ge=1, description="Записей в пачке"),
+    restart: bool = Query(False, description="Загрузить заново уже завершённую задачу"),
+):
+    try:
+        fmt = format or detect_format(file.filename)
+    except ImportFormatError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+    # Загрузка идёт после ответа, UploadFile к тому времени уже закрыт
+    filename = file.filename or 'upload'
+    path, source_hash = await asyncio.to_thread(
+        save_upload, file.file, PurePath(filename).suffix
+    )
+    name = job or default_job_name(filename, source_hash)
+    try:
+        import_job = await start_job(name, restart, source_hash)
+    except ImportConflictError as exc:
+        os.unlink(path)
+        raise HTTPException(status_code=409, detail=str(exc))
+
+    if import_job.status == 'done':
+        os.unlink(path)
+        response.status_code = 200
+    else:
+        background_tasks.add_task(import_file_in_background, path, fmt, name, batch_size)
+    return ImportJobOut.model_validate(import_job)
+
+
+@router.get("/import/{job}", response_model=ImportJobOut)
+async def bulk_import_status(job: str):
+    import_job = await get_job(job)
+    if import_job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return ImportJobOut.model_validate(import_job)
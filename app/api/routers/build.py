@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.responses import FastJSONResponse, fast_page
+from app.config.database import get_read_session
+from app.config.settings import settings
+from app.deps import PageParams, get_page_params
+from app.schemas.building import (BuildingCoordinatesOut,
+                                  BuildingFeatureCollectionOut, BuildingOut,
+                                  CoordinatesFormat)
+from app.schemas.pagination import Page, encode_cursor
+from app.services.building import BuildingService
+
+
+router = APIRouter(tags=['Building'])
+
+
+def building_item(row) -> dict:
+    return dict(row)
+
+
+@router.get("/buildings", response_model=Page[BuildingOut])
+async def get_buildings(
+    city: str | None = Query(None, description="Город"),
+    street: str | None = Query(None, description="Улица"),
+    page: PageParams = Depends(get_page_params),
+    session: AsyncSession = Depends(get_read_session)
+):
+    building_service = BuildingService()
+    buildings, next_key = await building_service.get_buildings(
+        session, city, street, page.limit, page.after
+    )
+    if settings.FAST_JSON_RESPONSES:
+        return fast_page(buildings, next_key, building_item)
+    return Page(
+        items=[BuildingOut(**building) for building in buildings],
+        next_cursor=encode_cursor(next_key),
+    )
+
+
+@router.get(
+        "/buildings/coordinates",
+        response_model=BuildingCoordinatesOut | BuildingFeatureCollectionOut,
+        responses={200: {"description": "packed - плоские массивы, geojson - FeatureCollection"}}
+    )
+async def get_building_coordinates(
+    coordinates_format: CoordinatesFormat = Query(
+        CoordinatesFormat.packed,
+        alias="format",
+        description="packed или geojson"
+    ),
+    session: AsyncSession = Depends(get_read_session)
+):
+    '''Все здания с координатами одним ответом, для предзагрузки карты'''
+    building_service = BuildingService()
+    coordinates = await building_service.get_building_coordinates(session, coordinates_format)
+    # Ответ большой, без проверки моделью
+    return FastJSONResponse(coordinates)
+
+
+@router.get("/buildings/{building_id}", response_model=BuildingOut)
+async def get_building(
+    building_id: int,
+    session: AsyncSession = Depends(get_read_session)
+):
+    building_service = BuildingService()
+    building = await building_service.get_building(session, building_id)
+    if building is None:
+        raise HTTPException(status_code=404, detail="Здание не найдено")
+    if settings.FAST_JSON_RESPONSES:
+        return FastJSONResponse(building_item(building))
+    return BuildingOut(**building)
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+
+from app.schemas.export import ExportFormat
+from app.services.export import (MEDIA_TYPES, export_checkpoint,
+                                 export_organizations)
+
+
+router = APIRouter(tags=['Export'])
+
+
+@router.get("/export/organizations")
+async def export_organizations_dump(
+    format: ExportFormat = Query(ExportFormat.ndjson, description="ndjson или csv"),
+    building_id: int | None = Query(None, description="Только организации здания"),
+    activity_id: int | None = Query(None, description="Только организации из поддерева деятельности"),
+    updated_since: datetime | None = Query(
+        None,
+        description="Только изменённые с этого момента (для инкрементальной синхронизации)"
+    ),
+):
+    # До начала выгрузки, см. export_checkpoint
+    checkpoint = await export_checkpoint()
+    return StreamingResponse(
+        export_organizations(format, building_id, activity_id, updated_since),
+        media_type=MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="organizations.{format.value}"',
+            "X-Export-Checkpoint": checkpoint.isoformat(),
+        },
+    )
@@ -1,101 +1,372 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.config.database import get_session
+from app.api.http_cache import (is_not_modified, make_etag,
+                                not_modified_response, validator_headers)
+from app.api.responses import (FastJSONResponse, fast_list, fast_page,
+                               organization_activity_item,
+                               organization_cluster_item,
+                               organization_distance_item, organization_item,
+                               organization_search_item, raw_page)
+from app.config.database import get_read_session, get_read_snapshot_session
 from app.config.settings import settings
-from app.schemas.organization import OrganizationActivityOut, OrganizationOut
+from app.deps import (PageParams, get_bbox, get_organization_ids,
+                      get_page_params)
+from app.schemas.geo import (GRID_MAX_ZOOM, BBox, GeoJSONPolygon,
+                             grid_cell_range)
+from app.schemas.organization import (OrganizationActivityOut,
+                                      OrganizationBatchIn,
+                                      OrganizationBatchItem,
+                                      OrganizationClusterOut,
+                                      OrganizationDistanceOut, OrganizationOut,
+                                      OrganizationSearchOut, SearchMode)
+from app.schemas.pagination import Page, encode_cursor
 from app.services.organization import OrganizationService
 
 
 router = APIRouter(tags=['Organization'])
 
 
-@router.get("/organizations/by_building/{building_id}", response_model=list[OrganizationOut])
-async def get_organizations_by_building(building_id: int, session: AsyncSession = Depends(get_session)):
+@router.get("/organizations/by_building/{building_id}", response_model=Page[OrganizationOut])
+async def get_organizations_by_building(
+    request: Request,
+    response: Response,
+    building_id: int,
+    page: PageParams = Depends(get_page_params),
+    # Версия для ETag и тело ответа - из одного снимка
+    session: AsyncSession = Depends(get_read_snapshot_session)
+):
     org_service = OrganizationService()
-    orgs = await org_service.get_organizations_by_building(session, building_id)
+    version = await org_service.get_building_organizations_version(session, building_id)
 
-    if not orgs:
+    if version is None or not version['count']:
         raise HTTPException(status_code=404, detail="В здании нету организаций")
 
-    return [
-        OrganizationOut(name=org_name, phones=org_phones) 
-        for org_name, org_phones in orgs
-    ]
+    etag = make_etag(
+        'by_building', building_id, page.limit, page.after,
+        version['count'], version['updated_at']
+    )
+    headers = validator_headers(etag, version['updated_at'])
+    if is_not_modified(request, etag, version['updated_at']):
+        return not_modified_response(headers)
+
+    if 'by_building' in settings.DB_JSON_ENDPOINTS:
+        items_json, next_key, _ = await org_service.get_organizations_by_building_json(
+            session, building_id, page.limit, page.after,
+            version=(version['count'], version['updated_at'])
+        )
+        return raw_page(items_json, next_key, headers=headers)
+
+    orgs, next_key = await org_service.get_organizations_by_building(
+        session, building_id, page.limit, page.after,
+        version=(version['count'], version['updated_at'])
+    )
+    if settings.FAST_JSON_RESPONSES:
+        return fast_page(orgs, next_key, headers=headers)
+    response.headers.update(headers)
+    return Page(
+        items=[OrganizationOut(name=org['name'], phones=org['phones']) for org in orgs],
+        next_cursor=encode_cursor(next_key),
+    )
 
 
 @router.get(
         "/activities/{activity_id}/organizations",
-        response_model=list[OrganizationOut]
+        response_model=Page[OrganizationOut]
     )
 async def organizations_by_activity(
     activity_id: int,
-    session: AsyncSession = Depends(get_session)
+    page: PageParams = Depends(get_page_params),
+    session: AsyncSession = Depends(get_read_session)
 ):
     org_service = OrganizationService()
-    orgs = await org_service.get_organizations_by_activity(session, activity_id)
+    if 'by_activity' in settings.DB_JSON_ENDPOINTS:
+        items_json, next_key, ids = await org_service.get_organizations_by_activity_json(
+            session, activity_id, page.limit, page.after
+        )
+        if not ids and page.after is None:
+            raise HTTPException(status_code=404, detail="Для данной деятельности не нашлось ни одной организации")
+        return raw_page(items_json, next_key)
 
-    if not orgs:
+    orgs, next_key = await org_service.get_organizations_by_activity(
+        session, activity_id, page.limit, page.after
+    )
+
+    if not orgs and page.after is None:
         raise HTTPException(status_code=404, detail="Для данной деятельности не нашлось ни одной организации")
 
-    return [
-        OrganizationOut(name=org_name, phones=org_phones) 
-        for org_name, org_phones in orgs
-    ]
+    if settings.FAST_JSON_RESPONSES:
+        return fast_page(orgs, next_key)
+    return Page(
+        items=[OrganizationOut(name=org['name'], phones=org['phones']) for org in orgs],
+        next_cursor=encode_cursor(next_key),
+    )
 
 
-@router.get("/organizations_by_nested_activity", response_model=list[OrganizationActivityOut])
-async def get_organizations_by_nested_activity(activity_id: int, session: AsyncSession = Depends(get_session)):
+@router.get("/organizations_by_nested_activity", response_model=Page[OrganizationActivityOut])
+async def get_organizations_by_nested_activity(
+    activity_id: int,
+    page: PageParams = Depends(get_page_params),
+    session: AsyncSession = Depends(get_read_session)
+):
     org_service = OrganizationService()
-    orgs = await org_service.get_organizations_by_nested_activity(session, activity_id)    
-    return [
-        OrganizationActivityOut(
-            organization=row["organization_name"],
-            activity=row["activity_name"],
-            phones=row.get('phone', None)
-        )
-        for row in orgs
-    ]
+    orgs, next_key = await org_service.get_organizations_by_nested_activity(
+        session, activity_id, page.limit, page.after
+    )
+    if settings.FAST_JSON_RESPONSES:
+        return fast_page(orgs, next_key, organization_activity_item)
+    return Page(
+        items=[
+            OrganizationActivityOut(
+                organization=row["organization_name"],
+                activity=row["activity_name"],
+                phones=row.get('phones', None)
+            )
+            for row in orgs
+        ],
+        next_cursor=encode_cursor(next_key),
+    )
 
 
 @router.get("/organization/{organization_id}", response_model=OrganizationOut)
 async def get_organization_by_id(
+    request: Request,
+    response: Response,
     organization_id: int,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     org_service = OrganizationService()
-    org = await org_service.get_organization_by_id(session, organization_id)    
+    updated_at = await org_service.get_organization_version(session, organization_id)
+
+    if updated_at is None:
+        raise HTTPException(status_code=404, detail="Организация не найдена")
+
+    etag = make_etag('organization', organization_id, updated_at)
+    headers = validator_headers(etag, updated_at)
+    if is_not_modified(request, etag, updated_at):
+        return not_modified_response(headers)
+
+    org = await org_service.get_organization_by_id(session, organization_id, version=updated_at)
 
     if not org:
         raise HTTPException(status_code=404, detail="Организация не найдена")
+    if settings.FAST_JSON_RESPONSES:
+        return FastJSONResponse(organization_item(org), headers=headers)
+    response.headers.update(headers)
     return OrganizationOut(name=org['name'], phones=org['phones'])
 
 
-@router.get("/organization_by_name", response_model=list[OrganizationOut])
+async def resolve_organization_batch(session: AsyncSession, ids: list[int]):
+    orgs = await OrganizationService().get_organizations_by_ids(session, ids)
+    if settings.FAST_JSON_RESPONSES:
+        return FastJSONResponse([
+            {
+                "id": org_id,
+                "found": org_id in orgs,
+                "organization": organization_item(orgs[org_id]) if org_id in orgs else None,
+            }
+            for org_id in ids
+        ])
+    # Ответ в порядке запроса, повторяющиеся id повторяются
+    return [
+        OrganizationBatchItem(
+            id=org_id,
+            found=org_id in orgs,
+            organization=(
+                OrganizationOut(name=orgs[org_id]['name'], phones=orgs[org_id]['phones'])
+                if org_id in orgs else None
+            ),
+        )
+        for org_id in ids
+    ]
+
+
+@router.post("/organizations/batch", response_model=list[OrganizationBatchItem])
+async def get_organizations_batch(
+    batch: OrganizationBatchIn,
+    session: AsyncSession = Depends(get_read_session)
+):
+    return await resolve_organization_batch(session, batch.ids)
+
+
+@router.get("/organizations/batch", response_model=list[OrganizationBatchItem])
+async def get_organizations_batch_by_query(
+    ids: list[int] = Depends(get_organization_ids),
+    session: AsyncSession = Depends(get_read_session)
+):
+    return await resolve_organization_batch(session, ids)
+
+
+@router.get("/organization_by_name", response_model=Page[OrganizationOut])
 async def get_organization_by_name(
     organization_name: str = Query(..., description="Название организации"),
-    session: AsyncSession = Depends(get_session)
+    page: PageParams = Depends(get_page_params),
+    session: AsyncSession = Depends(get_read_session)
 ):
     org_service = OrganizationService()
-    orgs = await org_service.get_organization_by_name(session, organization_name)    
+    orgs, next_key = await org_service.get_organization_by_name(
+        session, organization_name, page.limit, page.after
+    )
 
-    if not orgs:
+    if not orgs and page.after is None:
         raise HTTPException(status_code=404, detail="Организация не найдена")
 
-    return [OrganizationOut(name=org['name'], phones=org['phones']) for org in orgs]
+    if settings.FAST_JSON_RESPONSES:
+        return fast_page(orgs, next_key)
+    return Page(
+        items=[OrganizationOut(name=org['name'], phones=org['phones']) for org in orgs],
+        next_cursor=encode_cursor(next_key),
+    )
+
+
+@router.get("/organizations/search", response_model=Page[OrganizationSearchOut])
+async def search_organizations(
+    q: str = Query(..., min_length=2, description="Строка поиска"),
+    mode: SearchMode = Query(SearchMode.fulltext, description="Режим поиска"),
+    page: PageParams = Depends(get_page_params),
+    # В транзакции: порог pg_trgm выставляется через set_config(..., true)
+    session: AsyncSession = Depends(get_read_snapshot_session)
+):
+    org_service = OrganizationService()
+    orgs, next_key = await org_service.search_organizations(
+        session, q, mode, page.limit, page.after
+    )
+    if settings.FAST_JSON_RESPONSES:
+        return fast_page(orgs, next_key, organization_search_item)
+    return Page(
+        items=[
+            OrganizationSearchOut(name=org['name'], phones=org['phones'], rank=org['rank'])
+            for org in orgs
+        ],
+        next_cursor=encode_cursor(next_key),
+    )
 
 
-@router.get("/organizations/nearby", response_model=list[OrganizationOut])
+@router.get("/organizations/nearby", response_model=Page[OrganizationOut])
 async def get_organizations_nearby(
     lat: float = Query(..., description="Широта центра поиска"),
     lon: float = Query(..., description="Долгота центра поиска"),
     radius_m: float = Query(settings.DEFAULT_RADIUS, gt=0, description="Радиус поиска в метрах"),
-    session: AsyncSession = Depends(get_session)
+    page: PageParams = Depends(get_page_params),
+    session: AsyncSession = Depends(get_read_session)
 ):
     org_service = OrganizationService()
-    orgs = await org_service.get_organizations_nearby(session, lat, lon, radius_m)
+    if 'nearby' in settings.DB_JSON_ENDPOINTS:
+        items_json, next_key, ids = await org_service.get_organizations_nearby_json(
+            session, lat, lon, radius_m, page.limit, page.after
+        )
+        if not ids and page.after is None:
+            raise HTTPException(status_code=404, detail=f"В радиусе {radius_m}м нет ни одной организации")
+        return raw_page(items_json, next_key)
+
+    orgs, next_key = await org_service.get_organizations_nearby(
+        session, lat, lon, radius_m, page.limit, page.after
+    )
 
-    if not orgs:
+    if not orgs and page.after is None:
         raise HTTPException(status_code=404, detail=f"В радиусе {radius_m}м нет ни одной организации")
 
-    return [OrganizationOut(name=name, phones=phones) for name, phones in orgs]
+    if settings.FAST_JSON_RESPONSES:
+        return fast_page(orgs, next_key)
+    return Page(
+        items=[OrganizationOut(name=org['name'], phones=org['phones']) for org in orgs],
+        next_cursor=encode_cursor(next_key),
+    )
+
+
+@router.get("/organizations/nearest", response_model=list[OrganizationDistanceOut])
+async def get_nearest_organizations(
+    lat: float = Query(..., ge=-90, le=90, description="Широта точки"),
+    lon: float = Query(..., ge=-180, le=180, description="Долгота точки"),
+    k: int = Query(
+        settings.NEAREST_K_DEFAULT,
+        ge=1,
+        le=settings.NEAREST_K_MAX,
+        description="Сколько ближайших организаций вернуть"
+    ),
+    session: AsyncSession = Depends(get_read_session)
+):
+    org_service = OrganizationService()
+    orgs = await org_service.get_nearest_organizations(session, lat, lon, k)
+
+    if settings.FAST_JSON_RESPONSES:
+        return fast_list(orgs, organization_distance_item)
+    return [
+        OrganizationDistanceOut(
+            name=org['name'],
+            phones=org['phones'],
+            distance_m=org['distance_m']
+        )
+        for org in orgs
+    ]
+
+
+def check_area_limit(page: PageParams) -> None:
+    # Всего по всем страницам - не больше AREA_SEARCH_MAX_RESULTS,
+    # см. OrganizationRepo.get_organizations_within_db
+    if page.limit > settings.AREA_SEARCH_MAX_RESULTS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Для поиска по области limit не больше {settings.AREA_SEARCH_MAX_RESULTS}"
+        )
+
+
+@router.get("/organizations/within", response_model=Page[OrganizationOut])
+async def get_organizations_in_bbox(
+    bbox: BBox = Depends(get_bbox),
+    page: PageParams = Depends(get_page_params),
+    session: AsyncSession = Depends(get_read_session)
+):
+    check_area_limit(page)
+    org_service = OrganizationService()
+    orgs, next_key = await org_service.get_organizations_in_bbox(
+        session, bbox, page.limit, page.after
+    )
+    if settings.FAST_JSON_RESPONSES:
+        return fast_page(orgs, next_key)
+    return Page(
+        items=[OrganizationOut(name=org['name'], phones=org['phones']) for org in orgs],
+        next_cursor=encode_cursor(next_key),
+    )
+
+
+@router.post("/organizations/within", response_model=Page[OrganizationOut])
+async def get_organizations_in_polygon(
+    polygon: GeoJSONPolygon,
+    page: PageParams = Depends(get_page_params),
+    session: AsyncSession = Depends(get_read_session)
+):
+    check_area_limit(page)
+    org_service = OrganizationService()
+    orgs, next_key = await org_service.get_organizations_in_polygon(
+        session, polygon, page.limit, page.after
+    )
+    if settings.FAST_JSON_RESPONSES:
+        return fast_page(orgs, next_key)
+    return Page(
+        items=[OrganizationOut(name=org['name'], phones=org['phones']) for org in orgs],
+        next_cursor=encode_cursor(next_key),
+    )
+
+
+@router.get("/organizations/clusters", response_model=list[OrganizationClusterOut])
+async def get_organization_clusters(
+    bbox: BBox = Depends(get_bbox),
+    zoom: int = Query(..., ge=0, le=GRID_MAX_ZOOM, description="Масштаб карты"),
+    activity_id: int | None = Query(None, description="Только организации из поддерева деятельности"),
+    session: AsyncSession = Depends(get_read_session)
+):
+    cell_x, cell_y = grid_cell_range(bbox, zoom)
+    if (cell_x[1] - cell_x[0] + 1) * (cell_y[1] - cell_y[0] + 1) > settings.CLUSTERS_MAX_CELLS:
+        raise HTTPException(status_code=422, detail="bbox слишком большой для этого масштаба")
+
+    org_service = OrganizationService()
+    clusters = await org_service.get_organization_clusters(
+        session, zoom, cell_x, cell_y, activity_id
+    )
+    if settings.FAST_JSON_RESPONSES:
+        return fast_list(clusters, organization_cluster_item)
+    return [
+        OrganizationClusterOut(lat=row['lat'], lon=row['lon'], count=row['count'])
+        for row in clusters
+    ]
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import get_read_session
+from app.config.settings import settings
+from app.services.tiles import TileService
+
+MVT_MEDIA_TYPE = 'application/vnd.mapbox-vector-tile'
+
+router = APIRouter(tags=['Tiles'])
+
+
+@router.get("/tiles/{z}/{x}/{y}.mvt", response_class=Response)
+async def get_tile(
+    z: int = Path(..., ge=0, le=settings.TILES_MAX_ZOOM, description="Масштаб"),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    session: AsyncSession = Depends(get_read_session)
+):
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=404, detail="Тайл вне сетки масштаба")
+    if z < settings.TILES_MIN_ZOOM:
+        # Пустой тайл: на мелких масштабах в тайл попадает слишком много зданий
+        return Response(status_code=204)
+
+    tile = await TileService().get_tile(session, z, x, y)
+    if not tile:
+        return Response(status_code=204)
+    return Response(content=tile, media_type=MVT_MEDIA_TYPE)
@@ -0,0 +1,222 @@
+'''Кэш ответов сервисного слоя с инвалидацией по тегам.
+
+Ключ строится из имени метода и его аргументов (без self и session).
+Теги вида "organization:1", "building:2", "activity:3" вешаются на
+запись при сохранении. Сбрасывают их триггеры БД уведомлением
+cache_invalidate (см. on_cache_notify): так сброс доходит до всех
+процессов и срабатывает при любой записи, в том числе COPY и SQL вручную.
+Сессии ORM вдобавок сбрасывают свои теги сразу после коммита
+(см. collect_cache_tags), не дожидаясь уведомления.
+
+Результат, прочитанный из БД до сброса, но дописанный в кэш после него,
+отбрасывается по поколению (ResponseCache.generation), иначе он жил бы
+до конца TTL.
+'''
+import asyncio
+import functools
+import hashlib
+import inspect
+import logging
+from collections.abc import Mapping
+from time import perf_counter
+from typing import Any, Callable, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.cache.backends import (MISS, CacheBackend, MemoryBackend, NullBackend,
+                                RedisBackend)
+from app.config.database import after_commit_hooks, read_router
+from app.config.settings import settings
+from app.metrics import CACHE_LATENCY_SECONDS, CACHE_REQUESTS
+from app.models import (Activity, Building, Organization, OrganizationActivity,
+                        OrganizationPhone)
+
+logger = logging.getLogger(__name__)
+
+SKIP_ARGUMENTS = ('self', 'session')
+SESSION_TAGS_KEY = 'cache_tags'
+CACHE_CHANNEL = 'cache_invalidate'
+# payload уведомления, по которому сбрасывается весь кэш
+ALL_TAGS = '*'
+
+
+def create_backend() -> CacheBackend:
+    if settings.CACHE_BACKEND == 'redis':
+        return RedisBackend(settings.REDIS_URL)
+    if settings.CACHE_BACKEND == 'memory':
+        return MemoryBackend(settings.CACHE_MAX_ENTRIES)
+    return NullBackend()
+
+
+class ResponseCache:
+    '''Обёртка над бэкендом: метрики и деградация до промаха при ошибках'''
+
+    def __init__(self, backend: CacheBackend, ttl: float) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        # Растёт при каждом сбросе: значение, прочитанное из БД до сброса,
+        # не сохраняем (как TileCache.generation)
+        self.generation = 0
+
+    async def _timed(self, operation: str, call):
+        started = perf_counter()
+        try:
+            return await call
+        finally:
+            CACHE_LATENCY_SECONDS.labels(
+                backend=self.backend.name, operation=operation
+            ).observe(perf_counter() - started)
+
+    async def get(self, key: str, method: str) -> Any:
+        try:
+            value = await self._timed('get', self.backend.get(key))
+        except Exception:
+            logger.exception('Кэш недоступен, запрос пойдёт в БД')
+            value = MISS
+        CACHE_REQUESTS.labels(method=method, result='miss' if value is MISS else 'hit').inc()
+        return value
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        tags: Iterable[str],
+        generation: int | None = None
+    ) -> None:
+        '''Сохраняет значение, если с generation (взятого до чтения из БД)
+        не было сбросов'''
+        if generation is not None and generation != self.generation:
+            return
+        tags = tuple(tags)
+        try:
+            await self._timed('set', self.backend.set(key, value, self.ttl, tags))
+            if generation is not None and generation != self.generation:
+                # Сброс пришёл, пока шла запись в бэкенд
+                await self._timed('invalidate', self.backend.invalidate_tags(tags))
+        except Exception:
+            logger.exception('Не удалось записать в кэш')
+
+    async def invalidate(self, tags: Iterable[str]) -> None:
+        tags = tuple(tags)
+        if not tags:
+            return
+        self.generation += 1
+        try:
+            await self._timed('invalidate', self.backend.invalidate_tags(tags))
+        except Exception:
+            logger.exception('Не удалось сбросить теги кэша %s', tags)
+
+    async def clear(self) -> None:
+        self.generation += 1
+        try:
+            await self._timed('clear', self.backend.clear())
+        except Exception:
+            logger.exception('Не удалось очистить кэш')
+
+
+response_cache = ResponseCache(create_backend(), settings.CACHE_TTL_SECONDS)
+
+
+def to_plain(value: Any) -> Any:
+    '''Строки SQLAlchemy -> dict/tuple, чтобы результат можно было сериализовать'''
+    if isinstance(value, Row):
+        return tuple(value)
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, (list, tuple)):
+        return type(value)(to_plain(item) for item in value)
+    return value
+
+
+def make_key(func: Callable, arguments: Mapping[str, Any]) -> str:
+    digest = hashlib.sha1(repr(sorted(arguments.items())).encode()).hexdigest()
+    return f'{func.__module__}.{func.__qualname__}:{digest}'
+
+
+def call_arguments(signature: inspect.Signature, args, kwargs) -> dict[str, Any]:
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return {
+        name: value
+        for name, value in bound.arguments.items()
+        if name not in SKIP_ARGUMENTS
+    }
+
+
+def cached(tags: Callable[[dict[str, Any], Any], Iterable[str]]):
+    '''Кэширует результат метода сервиса.
+
+    tags(arguments, result) возвращает теги записи.
+    '''
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            arguments = call_arguments(signature, args, kwargs)
+            key = make_key(func, arguments)
+            value = await response_cache.get(key, func.__name__)
+            if value is not MISS:
+                return value
+
+            generation = response_cache.generation
+            value = to_plain(await func(*args, **kwargs))
+            await response_cache.set(key, value, tags(arguments, value), generation)
+            return value
+
+        return wrapper
+    return decorator
+
+
+def entity_tags(obj) -> set[str]:
+    if isinstance(obj, Organization):
+        return {f'organization:{obj.id}', f'building:{obj.building_id}', 'organizations'}
+    if isinstance(obj, OrganizationPhone):
+        return {f'organization:{obj.organization_id}'}
+    if isinstance(obj, OrganizationActivity):
+        return {f'organization:{obj.organization_id}', f'activity:{obj.activity_id}'}
+    if isinstance(obj, Building):
+        return {f'building:{obj.id}', 'buildings'}
+    if isinstance(obj, Activity):
+        return {f'activity:{obj.id}', 'activities'}
+    return set()
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_cache_tags(session, flush_context):
+    '''Копит теги изменённых сущностей до коммита, см. invalidate_session_tags'''
+    tags = session.info.setdefault(SESSION_TAGS_KEY, set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        tags |= entity_tags(obj)
+
+
+def invalidate_soon(tags: Iterable[str]) -> None:
+    '''Сброс тегов из синхронного кода (например, обработчика NOTIFY)'''
+    # Поколение сдвигаем сразу, не дожидаясь задачи
+    response_cache.generation += 1
+    asyncio.get_running_loop().create_task(response_cache.invalidate(tags))
+
+
+def on_cache_notify(payload: str | None) -> None:
+    '''Обработчик cache_invalidate: теги через запятую или '*'.
+
+    None приходит после переподключения LISTEN: уведомления за время
+    обрыва потеряны, поэтому кэш сбрасывается целиком. Запись уже
+    закоммичена на primary, но реплики могут её ещё не получить, поэтому
+    перезаполнять кэш какое-то время будем с primary.
+    '''
+    read_router.mark_written()
+    if payload is None or payload == ALL_TAGS:
+        response_cache.generation += 1
+        asyncio.get_running_loop().create_task(response_cache.clear())
+        return
+    invalidate_soon(tag for tag in payload.split(',') if tag)
+
+
+async def invalidate_session_tags(session) -> None:
+    await response_cache.invalidate(session.info.pop(SESSION_TAGS_KEY, set()))
+
+
+after_commit_hooks.append(invalidate_session_tags)
@@ -0,0 +1,146 @@
+import pickle
+import time
+from collections import OrderedDict
+from typing import Any, Iterable
+
+# Отличает закэшированный None от отсутствия записи
+MISS = object()
+
+
+class CacheBackend:
+    name = 'base'
+
+    async def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str]) -> None:
+        raise NotImplementedError
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        raise NotImplementedError
+
+    async def clear(self) -> None:
+        raise NotImplementedError
+
+
+class NullBackend(CacheBackend):
+    name = 'none'
+
+    async def get(self, key: str) -> Any:
+        return MISS
+
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str]) -> None:
+        pass
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        pass
+
+    async def clear(self) -> None:
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    '''LRU с TTL в памяти процесса.
+
+    Инвалидация действует только на текущий воркер; до остальных
+    она доходит уведомлением cache_invalidate (см. app.cache).
+    '''
+    name = 'memory'
+
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max_entries
+        # key -> (expires_at, value, tags)
+        self._entries: OrderedDict[str, tuple[float, Any, tuple[str, ...]]] = OrderedDict()
+        self._tags: dict[str, set[str]] = {}
+
+    async def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISS
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self._drop(key)
+            return MISS
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str]) -> None:
+        self._drop(key)
+        tags = tuple(tags)
+        self._entries[key] = (time.monotonic() + ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self._max_entries:
+            self._drop(next(iter(self._entries)))
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            for key in self._tags.pop(tag, ()):
+                self._drop(key)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisBackend(CacheBackend):
+    '''Кэш в Redis (или совместимом сервере), общий для всех воркеров.
+
+    Теги хранятся множествами ключей. Клиент можно передать готовым,
+    например fakeredis.aioredis.FakeRedis() в тестах.
+    '''
+    name = 'redis'
+
+    def __init__(self, url: str | None = None, client=None, prefix: str = 'orgcache:') -> None:
+        if client is None:
+            try:
+                from redis import asyncio as redis_asyncio
+            except ImportError as exc:
+                raise RuntimeError('Для CACHE_BACKEND=redis нужен пакет redis') from exc
+            client = redis_asyncio.from_url(url)
+        self._redis = client
+        self._prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return f'{self._prefix}key:{key}'
+
+    def _tag(self, tag: str) -> str:
+        return f'{self._prefix}tag:{tag}'
+
+    async def get(self, key: str) -> Any:
+        raw = await self._redis.get(self._key(key))
+        if raw is None:
+            return MISS
+        return pickle.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str]) -> None:
+        ttl_ms = max(1, int(ttl * 1000))
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.set(self._key(key), pickle.dumps(value), px=ttl_ms)
+            for tag in tags:
+                pipe.sadd(self._tag(tag), self._key(key))
+                # Все записи с одним TTL, так что множество живёт не меньше своих ключей
+                pipe.pexpire(self._tag(tag), ttl_ms)
+            await pipe.execute()
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            tag_key = self._tag(tag)
+            keys = await self._redis.smembers(tag_key)
+            await self._redis.delete(tag_key, *keys)
+
+    async def clear(self) -> None:
+        keys = [key async for key in self._redis.scan_iter(match=f'{self._prefix}*')]
+        if keys:
+            await self._redis.delete(*keys)
@@ -0,0 +1,118 @@
+'''Объединение одинаковых одновременных вызовов сервиса (single-flight).
+
+Первый вызов с данным ключом (leader) выполняет метод, остальные
+(follower) ждут его результат и не ходят в БД. Ключ строится так же,
+как у кэша ответов (make_key), но по аргументам после normalize:
+например, координаты nearby округляются, и близкие точки дают один
+запрос. Если leader отменён (клиент отключился), follower повторяют
+вызов сами. Работает в пределах одного процесса.
+'''
+import asyncio
+import functools
+import inspect
+from typing import Any, Callable, Mapping
+
+from app.cache import call_arguments, make_key
+from app.config.database import READ_ONLY_SESSION_KEY, SNAPSHOT_SESSION_KEY
+from app.config.settings import settings
+from app.metrics import COALESCED_CALLS, COALESCED_CONNECTIONS_SAVED
+
+
+class SingleFlight:
+
+    def __init__(self) -> None:
+        self._calls: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, method: str, call: Callable, session=None) -> Any:
+        waited = False
+        while (future := self._calls.get(key)) is not None:
+            if not waited:
+                waited = True
+                COALESCED_CALLS.labels(method=method, role='follower').inc()
+                if await release_read_connection(session):
+                    COALESCED_CONNECTIONS_SAVED.labels(method=method).inc()
+            try:
+                # shield: отмена follower не должна отменять общий вызов
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # Отменён leader, а не этот вызов - пробуем снова
+
+        COALESCED_CALLS.labels(method=method, role='leader').inc()
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Без follower исключение никто не заберёт, не пишем об этом в лог
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+
+async def release_read_connection(session) -> bool:
+    '''Возвращает в пул соединение сессии чтения на время ожидания.
+
+    Сессия остаётся рабочей: при следующем запросе возьмёт соединение заново.
+    Сессии записи не трогаем, чтобы не потерять незакоммиченные изменения,
+    сессии со снимком - чтобы следующие запросы читали из того же снимка.
+    '''
+    if (
+        session is None
+        or not session.info.get(READ_ONLY_SESSION_KEY)
+        or session.info.get(SNAPSHOT_SESSION_KEY)
+    ):
+        return False
+    await session.close()
+    return True
+
+
+single_flight = SingleFlight()
+
+
+def coalesced(normalize: Callable[[Mapping[str, Any]], Mapping[str, Any]] | None = None):
+    '''Объединяет одинаковые одновременные вызовы метода сервиса.
+
+    normalize(arguments) возвращает аргументы, которые нужно заменить
+    перед вызовом; метод вызывается уже с ними, поэтому результат
+    соответствует ключу.
+    '''
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not settings.COALESCE_REQUESTS:
+                return await func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            if normalize is not None:
+                bound.arguments.update(normalize(bound.arguments))
+            key = make_key(func, call_arguments(signature, bound.args, bound.kwargs))
+            return await single_flight.do(
+                key,
+                func.__name__,
+                lambda: func(*bound.args, **bound.kwargs),
+                bound.arguments.get('session'),
+            )
+
+        return wrapper
+    return decorator
+
+
+def round_coordinates(arguments: Mapping[str, Any]) -> dict[str, Any]:
+    '''Округляет lat/lon до COALESCE_COORDINATE_PRECISION знаков'''
+    precision = settings.COALESCE_COORDINATE_PRECISION
+    if precision is None:
+        return {}
+    return {name: round(arguments[name], precision) for name in ('lat', 'lon')}
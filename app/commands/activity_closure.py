@@ -0,0 +1,55 @@
+'''Обслуживание таблицы activity_closure.
+
+    python -m app.commands.activity_closure backfill
+    python -m app.commands.activity_closure check [--fix]
+'''
+import argparse
+import asyncio
+import sys
+
+from app.config.database import async_session
+from app.repositories.activity import ActivityRepo
+
+
+async def backfill() -> int:
+    async with async_session() as session:
+        rows = await ActivityRepo(session).rebuild_closure_db()
+        await session.commit()
+    print(f'activity_closure пересобрана, строк: {rows}')
+    return 0
+
+
+async def check(fix: bool) -> int:
+    async with async_session() as session:
+        drift = await ActivityRepo(session).get_closure_drift_db()
+
+    if not drift['missing'] and not drift['extra']:
+        print('activity_closure совпадает с parent_id')
+        return 0
+
+    print(
+        f"activity_closure разошлась с parent_id: "
+        f"не хватает {drift['missing']}, лишних {drift['extra']}"
+    )
+    if fix:
+        return await backfill()
+    return 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Обслуживание activity_closure')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('backfill', help='Пересобрать таблицу по parent_id')
+    check_parser = subparsers.add_parser('check', help='Проверить расхождение с parent_id')
+    check_parser.add_argument('--fix', action='store_true', help='Пересобрать при расхождении')
+    args = parser.parse_args()
+
+    if args.command == 'backfill':
+        code = asyncio.run(backfill())
+    else:
+        code = asyncio.run(check(args.fix))
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+'''Обслуживание счётчиков организаций по деятельностям (activity_org_count).
+
+    python -m app.commands.activity_rollup backfill
+    python -m app.commands.activity_rollup check [--fix]
+'''
+import argparse
+import asyncio
+import sys
+
+from app.config.database import async_session
+from app.repositories.activity import ActivityRepo
+
+
+async def backfill() -> int:
+    async with async_session() as session:
+        await ActivityRepo(session).rebuild_rollup_db()
+        await session.commit()
+    print('activity_org_count пересчитана')
+    return 0
+
+
+async def check(fix: bool) -> int:
+    async with async_session() as session:
+        wrong = await ActivityRepo(session).get_rollup_drift_db()
+
+    if not wrong:
+        print('activity_org_count совпадает с organization_activity')
+        return 0
+
+    print(f'activity_org_count разошлась с organization_activity у {wrong} деятельностей')
+    if fix:
+        return await backfill()
+    return 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Обслуживание activity_org_count')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('backfill', help='Пересчитать счётчики')
+    check_parser = subparsers.add_parser('check', help='Проверить расхождение с organization_activity')
+    check_parser.add_argument('--fix', action='store_true', help='Пересчитать при расхождении')
+    args = parser.parse_args()
+
+    if args.command == 'backfill':
+        code = asyncio.run(backfill())
+    else:
+        code = asyncio.run(check(args.fix))
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
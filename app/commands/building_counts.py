@@ -0,0 +1,41 @@
+'''Проверка счётчиков building.organization_count.
+
+    python -m app.commands.building_counts check [--fix]
+'''
+import argparse
+import asyncio
+import sys
+
+from app.config.database import async_session
+from app.repositories.building import BuildingRepo
+
+
+async def check(fix: bool) -> int:
+    async with async_session() as session:
+        repo = BuildingRepo(session)
+        wrong = await repo.get_organization_count_drift_db()
+        if not wrong:
+            print('building.organization_count совпадает с организациями')
+            return 0
+
+        print(f'building.organization_count разошёлся с организациями у {wrong} зданий')
+        if not fix:
+            return 1
+        fixed = await repo.refresh_organization_counts_db()
+        await session.commit()
+    print(f'Исправлено зданий: {fixed}')
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Проверка building.organization_count')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    check_parser = subparsers.add_parser('check', help='Проверить расхождение с организациями')
+    check_parser.add_argument('--fix', action='store_true', help='Пересчитать при расхождении')
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(check(args.fix)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+'''Массовая загрузка организаций из CSV или NDJSON.
+
+    python -m app.commands.bulk_import organizations.csv
+    python -m app.commands.bulk_import - --format ndjson --job nightly < dump.ndjson
+
+Повторный запуск с тем же файлом (или с тем же --job) продолжает
+прерванную загрузку. Для stdin --job обязателен.
+'''
+import argparse
+import asyncio
+import logging
+import sys
+
+from app.config.settings import settings
+from app.schemas.bulk_import import ImportFormat
+from app.services.bulk_import import (ImportConflictError, ImportFormatError,
+                                      default_job_name, detect_format,
+                                      file_digest, import_organizations)
+
+
+async def run(path: str, fmt: ImportFormat | None, job: str | None, batch_size: int, restart: bool) -> int:
+    try:
+        fmt = fmt or detect_format(path)
+    except ImportFormatError as exc:
+        print(f'{exc}, укажите --format', file=sys.stderr)
+        return 2
+
+    if path == '-':
+        if not job:
+            print('Для загрузки из stdin укажите --job', file=sys.stderr)
+            return 2
+        source_hash = None
+        stream = open(sys.stdin.fileno(), encoding='utf-8', newline='', closefd=False)
+    else:
+        source_hash = await asyncio.to_thread(file_digest, path)
+        job = job or default_job_name(path, source_hash)
+        stream = open(path, encoding='utf-8', newline='')
+
+    with stream:
+        try:
+            result = await import_organizations(stream, fmt, job, batch_size, restart, source_hash)
+        except (ImportFormatError, ImportConflictError) as exc:
+            print(f'Загрузка {job} прервана: {exc}', file=sys.stderr)
+            return 1
+
+    if not result.imported_records and result.status == 'done':
+        print(f'Задача {job} уже загружена ({result.processed_records} записей), см. --restart')
+        return 0
+    print(
+        f'Задача {job}: загружено {result.imported_records} записей '
+        f'за {result.batches} пачек, всего {result.processed_records}; строки: {result.rows}'
+    )
+    if result.skipped_activities:
+        print(f'Пропущено ссылок на неизвестные деятельности: {result.skipped_activities}')
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Массовая загрузка организаций')
+    parser.add_argument('path', help="Файл CSV/NDJSON или '-' для stdin")
+    parser.add_argument('--format', type=ImportFormat, choices=list(ImportFormat), help='По умолчанию - по расширению')
+    parser.add_argument('--job', help='Имя задачи для продолжения загрузки, по умолчанию имя файла и начало его sha256')
+    parser.add_argument('--batch-size', type=int, default=settings.IMPORT_BATCH_SIZE)
+    parser.add_argument('--restart', action='store_true', help='Загрузить заново уже завершённую задачу')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    code = asyncio.run(run(args.path, args.format, args.job, args.batch_size, args.restart))
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+'''Обслуживание таблицы organization_grid (кластеры /organizations/clusters).
+
+    python -m app.commands.organization_grid backfill
+    python -m app.commands.organization_grid check [--fix]
+    python -m app.commands.organization_grid fold
+'''
+import argparse
+import asyncio
+import sys
+
+from app.config.database import async_session
+from app.repositories.organization import OrganizationRepo
+from app.services.organization_grid import fold_grid
+
+
+async def backfill() -> int:
+    async with async_session() as session:
+        rows = await OrganizationRepo(session).rebuild_grid_db()
+        await session.commit()
+    print(f'organization_grid пересобрана, ячеек: {rows}')
+    return 0
+
+
+async def fold() -> int:
+    folded = await fold_grid()
+    print(f'Свёрнуто дельт organization_grid_delta: {folded}')
+    return 0
+
+
+async def check(fix: bool) -> int:
+    async with async_session() as session:
+        drift = await OrganizationRepo(session).get_grid_drift_db()
+
+    if not drift['missing'] and not drift['extra']:
+        print('organization_grid совпадает с организациями')
+        return 0
+
+    print(
+        f"organization_grid разошлась с организациями: "
+        f"не хватает {drift['missing']}, лишних {drift['extra']}"
+    )
+    if fix:
+        return await backfill()
+    return 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Обслуживание organization_grid')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('backfill', help='Пересобрать таблицу по организациям')
+    check_parser = subparsers.add_parser('check', help='Проверить расхождение с организациями')
+    check_parser.add_argument('--fix', action='store_true', help='Пересобрать при расхождении')
+    subparsers.add_parser('fold', help='Свернуть дельты в organization_grid')
+    args = parser.parse_args()
+
+    if args.command == 'backfill':
+        code = asyncio.run(backfill())
+    elif args.command == 'fold':
+        code = asyncio.run(fold())
+    else:
+        code = asyncio.run(check(args.fix))
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
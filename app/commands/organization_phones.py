@@ -0,0 +1,56 @@
+'''Обслуживание organization.phone_numbers.
+
+    python -m app.commands.organization_phones backfill
+    python -m app.commands.organization_phones reconcile [--dry-run]
+'''
+import argparse
+import asyncio
+import sys
+
+from app.config.database import async_session
+from app.repositories.organization import OrganizationRepo
+
+
+async def backfill() -> int:
+    async with async_session() as session:
+        rows = await OrganizationRepo(session).refresh_phone_numbers_db(only_mismatched=False)
+        await session.commit()
+    print(f'phone_numbers пересчитаны для {rows} организаций')
+    return 0
+
+
+async def reconcile(dry_run: bool) -> int:
+    async with async_session() as session:
+        rows = await OrganizationRepo(session).refresh_phone_numbers_db()
+        if dry_run:
+            await session.rollback()
+        else:
+            await session.commit()
+
+    if not rows:
+        print('phone_numbers совпадают с organization_phone')
+        return 0
+    if dry_run:
+        print(f'phone_numbers разошлись с organization_phone у {rows} организаций')
+        return 1
+    print(f'phone_numbers исправлены у {rows} организаций')
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Обслуживание organization.phone_numbers')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('backfill', help='Пересчитать для всех организаций')
+    reconcile_parser = subparsers.add_parser('reconcile', help='Найти и исправить расхождения')
+    reconcile_parser.add_argument('--dry-run', action='store_true', help='Только проверить')
+    args = parser.parse_args()
+
+    if args.command == 'backfill':
+        code = asyncio.run(backfill())
+    else:
+        code = asyncio.run(reconcile(args.dry_run))
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
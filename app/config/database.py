@@ -1,26 +1,232 @@
-from sqlalchemy.ext.asyncio import (AsyncAttrs, async_sessionmaker,
-                                    create_async_engine)
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable
+
+from sqlalchemy import Engine, event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import (AsyncAttrs, AsyncEngine, AsyncSession,
+                                    async_sessionmaker, create_async_engine)
 from sqlalchemy.orm import DeclarativeBase
 
+from app.config.pool import instrumented_pool
 from app.config.settings import settings
+from app.instrumentation import (after_cursor_execute, before_cursor_execute,
+                                 handle_error)
+from app.metrics import DB_POOL_CAPACITY
+
+logger = logging.getLogger(__name__)
+
+# Метки в session.info у сессий read_session_scope: сессия только для
+# чтения и сессия в транзакции (не autocommit) с одним снимком на запрос
+READ_ONLY_SESSION_KEY = 'read_only'
+SNAPSHOT_SESSION_KEY = 'snapshot'
+
+
+# Соединение LISTEN (app.config.notifications) берётся из пула primary
+# и занято всё время работы процесса
+LISTEN_CONNECTIONS = 1
+
+
+def pool_limits(reserved: int = 0) -> tuple[int, int]:
+    '''pool_size и max_overflow одного процесса с учётом DB_CONNECTIONS_TOTAL.
+
+    reserved - соединения, которые процесс держит постоянно: они
+    добавляются к DB_POOL_SIZE, но не выходят за бюджет процесса.
+    '''
+    if not settings.DB_CONNECTIONS_TOTAL:
+        return settings.DB_POOL_SIZE + reserved, settings.DB_MAX_OVERFLOW
+    per_worker = settings.DB_CONNECTIONS_TOTAL // max(settings.WORKERS, 1)
+    if per_worker < reserved + 1:
+        raise ValueError(
+            f'DB_CONNECTIONS_TOTAL={settings.DB_CONNECTIONS_TOTAL} мало для '
+            f'WORKERS={settings.WORKERS}: процессу нужно хотя бы {reserved + 1} соединения'
+        )
+    pool_size = min(settings.DB_POOL_SIZE + reserved, per_worker)
+    return pool_size, min(settings.DB_MAX_OVERFLOW, per_worker - pool_size)
+
+
+def create_engine(url: str, label: str, reserved: int = 0, **connect_args) -> AsyncEngine:
+    '''Движок с пулом и кэшем выражений из настроек'''
+    pool_size, max_overflow = pool_limits(reserved)
+    DB_POOL_CAPACITY.labels(label).set(pool_size + max_overflow)
+    return create_async_engine(
+        url,
+        echo=settings.DB_ECHO,
+        poolclass=instrumented_pool(label),
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            # кэш asyncpg и кэш подготовленных выражений диалекта SQLAlchemy
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            **connect_args,
+        },
+    )
 
-engine = create_async_engine(
-    settings.database_url, echo=True
-)
+
+engine = create_engine(settings.database_url, 'primary', reserved=LISTEN_CONNECTIONS)
 
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
+# Реплики принимают только чтение, даже если запрос по ошибке попытается писать
+replica_engines = [
+    create_engine(
+        url,
+        f'replica{index}',
+        server_settings={"default_transaction_read_only": "on"}
+    )
+    for index, url in enumerate(settings.DATABASE_REPLICA_URLS)
+]
+
+
+# Замеры всех SQL-запросов, см. app.instrumentation
+event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+event.listen(Engine, 'handle_error', handle_error)
+
+
+class ReplicaRouter:
+    '''Выбор движка для чтения.
+
+    Реплики перебираются по кругу. Реплика, к которой не удалось
+    подключиться, исключается на REPLICA_EJECT_SECONDS; если живых
+    реплик нет, чтение идёт на primary.
+
+    Реплики отстают от primary. После записи (коммит в этом процессе или
+    уведомление cache_invalidate о чужом коммите) чтение
+    REPLICA_STICKY_SECONDS идёт на primary, чтобы не прочитать данные
+    старше записи и не положить их в кэш после сброса.
+    '''
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replicas: list[AsyncEngine],
+        eject_seconds: float,
+        sticky_seconds: float = 0.0
+    ) -> None:
+        self._primary = primary
+        self._replicas = replicas
+        self._eject_seconds = eject_seconds
+        self._sticky_seconds = sticky_seconds
+        self._ejected_until: dict[int, float] = {}
+        self._primary_until = 0.0
+        self._counter = itertools.count()
+
+    def mark_written(self) -> None:
+        '''Была запись: какое-то время читаем с primary'''
+        if self._replicas and self._sticky_seconds:
+            self._primary_until = time.monotonic() + self._sticky_seconds
+
+    def candidates(self) -> list[AsyncEngine]:
+        now = time.monotonic()
+        if self._primary_until > now:
+            return [self._primary]
+        healthy = [
+            replica for index, replica in enumerate(self._replicas)
+            if self._ejected_until.get(index, 0) <= now
+        ]
+        if healthy:
+            start = next(self._counter) % len(healthy)
+            healthy = healthy[start:] + healthy[:start]
+        return [*healthy, self._primary]
+
+    def eject(self, candidate: AsyncEngine) -> None:
+        for index, replica in enumerate(self._replicas):
+            if replica is candidate:
+                logger.warning('Реплика %s исключена на %s с', replica.url, self._eject_seconds)
+                self._ejected_until[index] = time.monotonic() + self._eject_seconds
+
+
+read_router = ReplicaRouter(
+    engine,
+    replica_engines,
+    settings.REPLICA_EJECT_SECONDS,
+    settings.REPLICA_STICKY_SECONDS
+)
+
+read_session = async_sessionmaker(expire_on_commit=False)
+
+
+async def dispose_engines() -> None:
+    '''Закрывает соединения пулов процесса при остановке'''
+    for item in (engine, *replica_engines):
+        await item.dispose()
+
 
 class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 
+# Вызываются после успешного commit в get_session (например, сброс кэша)
+after_commit_hooks: list[Callable[[AsyncSession], Awaitable[None]]] = []
+
+
 async def get_session():
     '''Получение сессии в запросе, нужно явно делать commit'''
     async with async_session() as session:
         try:
             yield session
             await session.commit()
+            read_router.mark_written()
+            for hook in after_commit_hooks:
+                await hook(session)
         except Exception:
             await session.rollback()
             raise
+
+
+@asynccontextmanager
+async def read_session_scope(**execution_options):
+    '''Сессия для чтения на реплике (или primary).
+
+    По умолчанию в autocommit: без BEGIN/COMMIT, каждый SELECT - отдельный
+    запрос. Для согласованного снимка можно передать, например,
+    isolation_level="REPEATABLE READ". Писать через эту сессию нельзя.
+    '''
+    execution_options = execution_options or {"isolation_level": "AUTOCOMMIT"}
+    info = {
+        READ_ONLY_SESSION_KEY: True,
+        SNAPSHOT_SESSION_KEY: execution_options.get("isolation_level") != "AUTOCOMMIT",
+    }
+    candidates = read_router.candidates()
+    for candidate in candidates:
+        session = read_session(bind=candidate, info=dict(info))
+        try:
+            # Соединение берём сразу, чтобы при недоступной реплике
+            # успеть переключиться на следующую
+            await session.connection(execution_options=execution_options)
+        except (DBAPIError, OSError):
+            await session.close()
+            if candidate is candidates[-1]:
+                raise
+            read_router.eject(candidate)
+            continue
+        break
+
+    async with session:
+        yield session
+
+
+async def get_read_session():
+    '''Сессия только для чтения в запросе, коммит не нужен'''
+    async with read_session_scope() as session:
+        yield session
+
+
+async def get_read_snapshot_session():
+    '''Как get_read_session, но все запросы в одной транзакции.
+
+    Один снимок на запрос (например, версия для ETag и тело ответа),
+    и действуют настройки set_config(..., true) / SET LOCAL.
+    '''
+    async with read_session_scope(
+        isolation_level="REPEATABLE READ",
+        postgresql_readonly=True
+    ) as session:
+        yield session
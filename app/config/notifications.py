@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Callable
+
+from app.config.database import engine
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_CHANNEL = 'activity_changed'
+
+Handler = Callable[[str | None], None]
+
+
+class PgListener:
+    '''LISTEN/NOTIFY поверх одного долгоживущего соединения из пула primary
+    (зарезервировано в pool_limits, см. LISTEN_CONNECTIONS).
+
+    Обработчик получает payload уведомления. После (пере)подключения
+    обработчики вызываются с None: уведомления за время обрыва потеряны,
+    подписчик должен сам перечитать состояние.
+    '''
+
+    def __init__(self, reconnect_delay: float = 5.0) -> None:
+        self._handlers: dict[str, list[Handler]] = defaultdict(list)
+        self._reconnect_delay = reconnect_delay
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        self._handlers[channel].append(handler)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _dispatch(self, channel: str, payload: str | None) -> None:
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception('Ошибка в обработчике канала %s', channel)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self._dispatch(channel, payload)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('LISTEN соединение потеряно, переподключение')
+            await asyncio.sleep(self._reconnect_delay)
+
+    async def _listen(self) -> None:
+        async with engine.connect() as connection:
+            raw = await connection.get_raw_connection()
+            driver = raw.driver_connection
+            lost = asyncio.Event()
+            driver.add_termination_listener(lambda _: lost.set())
+            for channel in self._handlers:
+                await driver.add_listener(channel, self._on_notify)
+            try:
+                for channel in self._handlers:
+                    self._dispatch(channel, None)
+                await lost.wait()
+            finally:
+                if not driver.is_closed():
+                    for channel in self._handlers:
+                        await driver.remove_listener(channel, self._on_notify)
+
+
+listener = PgListener()
@@ -0,0 +1,44 @@
+'''Пул соединений с метриками Prometheus'''
+import time
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.instrumentation import record_pool_wait
+from app.metrics import (DB_POOL_CHECKOUT_SECONDS, DB_POOL_IN_USE,
+                         DB_POOL_OVERFLOW)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    '''AsyncAdaptedQueuePool, который замеряет ожидание соединения.
+
+    metrics_label различает пулы primary и реплик, см. instrumented_pool.
+    '''
+    metrics_label = 'primary'
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            DB_POOL_CHECKOUT_SECONDS.labels(self.metrics_label).observe(waited)
+            record_pool_wait(waited)
+            self._export_usage()
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self._export_usage()
+
+    def _export_usage(self):
+        DB_POOL_IN_USE.labels(self.metrics_label).set(self.checkedout())
+        # overflow() отрицателен, пока пул не заполнен до pool_size
+        DB_POOL_OVERFLOW.labels(self.metrics_label).set(max(self.overflow(), 0))
+
+
+def instrumented_pool(label: str) -> type[InstrumentedQueuePool]:
+    '''Класс пула для create_async_engine(poolclass=...) с заданной меткой'''
+    return type(
+        f'InstrumentedQueuePool[{label}]',
+        (InstrumentedQueuePool,),
+        {'metrics_label': label}
+    )
@@ -10,11 +10,98 @@ class Settings(BaseSettings):
 
     TOKEN: str
 
+    # Сервер (python -m app.server)
+    APP_HOST: str = "0.0.0.0"
+    APP_PORT: int = 8000
+    WORKERS: int = 1
+    # Каталог метрик Prometheus, общий для процессов при WORKERS > 1
+    PROMETHEUS_MULTIPROC_DIR: str = "/tmp/prometheus_multiproc"
+
+    # Пул соединений и asyncpg (на процесс)
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Кэш подготовленных выражений asyncpg и SQLAlchemy на соединение;
+    # за pgbouncer в режиме transaction нужно выставить 0
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # Бюджет соединений на все процессы: если задан, pool_size и
+    # max_overflow каждого процесса урезаются до DB_CONNECTIONS_TOTAL // WORKERS,
+    # включая соединение LISTEN
+    DB_CONNECTIONS_TOTAL: int = 0
+
+    # Запросы дольше порога пишутся в лог (0 - выключено), с EXPLAIN
+    SLOW_QUERY_SECONDS: float = 0.5
+    SLOW_QUERY_EXPLAIN: bool = True
+    # Заголовок Server-Timing с временем в БД и пуле. Раскрывает
+    # внутренние тайминги, поэтому по умолчанию выключен
+    SERVER_TIMING: bool = False
+
+    # Реплики для чтения, JSON-список URL вида postgresql+asyncpg://...
+    DATABASE_REPLICA_URLS: list[str] = []
+    REPLICA_EJECT_SECONDS: float = 30.0
+    # Сколько после записи читать с primary, а не с отстающей реплики
+    # (0 - не переключаться)
+    REPLICA_STICKY_SECONDS: float = 1.0
+
     model_config = SettingsConfigDict(
         env_file='.env',
         env_file_encoding="utf-8"
     )
     DEFAULT_RADIUS: float = 1000.0
+    NEAREST_K_DEFAULT: int = 10
+    NEAREST_K_MAX: int = 100
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 500
+    # Максимум id в одном запросе /organizations/batch
+    BATCH_MAX_IDS: int = 500
+    # Минимальная похожесть (pg_trgm similarity) для нечёткого поиска
+    SEARCH_SIMILARITY_THRESHOLD: float = 0.3
+    # Жёсткий предел строк поиска по области на все страницы вместе
+    AREA_SEARCH_MAX_RESULTS: int = 200
+    # Читать телефоны из organization.phone_numbers вместо organization_phone
+    PHONES_READ_MODEL: bool = True
+    # Кэш ответов сервисов: memory | redis | none
+    CACHE_BACKEND: str = "memory"
+    CACHE_TTL_SECONDS: float = 60.0
+    CACHE_MAX_ENTRIES: int = 10_000
+    REDIS_URL: str = "redis://localhost:6379/0"
+    # Одинаковые одновременные вызовы сервиса в процессе выполняются один раз
+    COALESCE_REQUESTS: bool = True
+    # Знаков после запятой у координат nearby при объединении вызовов
+    # (5 - около метра); None - без округления
+    COALESCE_COORDINATE_PRECISION: int | None = 5
+    # Собирать JSON ответов из строк БД без моделей Pydantic (app.api.responses)
+    FAST_JSON_RESPONSES: bool = False
+    # Эндпоинты, страницу которых целиком собирает в JSON сама БД:
+    # by_building, by_activity, nearby
+    DB_JSON_ENDPOINTS: list[str] = []
+    # Cache-Control для ответов с ETag, чтобы их мог кэшировать nginx
+    HTTP_CACHE_CONTROL: str = "public, max-age=0, must-revalidate"
+    # Предел ячеек сетки на один запрос /organizations/clusters
+    CLUSTERS_MAX_CELLS: int = 10_000
+    # Свёртка organization_grid_delta в organization_grid: период (0 - не
+    # сворачивать в приложении) и дельт за одну транзакцию
+    GRID_FOLD_INTERVAL_SECONDS: float = 5.0
+    GRID_FOLD_BATCH_SIZE: int = 50_000
+    # Векторные тайлы /tiles/{z}/{x}/{y}.mvt
+    TILES_MIN_ZOOM: int = 10
+    TILES_MAX_ZOOM: int = 20
+    TILE_EXTENT: int = 4096
+    TILE_BUFFER: int = 64
+    # Бюджет кэша тайлов процесса в байтах
+    TILE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    TILE_CACHE_TTL_SECONDS: float = 600.0
+    # Записей в одной пачке (и транзакции) массовой загрузки
+    IMPORT_BATCH_SIZE: int = 5000
+    # Строк за одно чтение серверного курсора при выгрузке
+    EXPORT_FETCH_SIZE: int = 1000
+    # Запас контрольной точки выгрузки на отставание реплик и часы
+    EXPORT_CHECKPOINT_MARGIN_SECONDS: float = 60.0
+    # Страховочная пересборка кэша дерева деятельностей, если NOTIFY потерялся
+    ACTIVITY_TREE_REFRESH_SECONDS: float = 300.0
 
     @property
     def database_url(self):
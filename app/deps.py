@@ -1,10 +1,81 @@
+from dataclasses import dataclass
 from typing import Annotated
 
-from fastapi import Header, HTTPException
+from fastapi import Header, HTTPException, Query
 
 from app.config.settings import settings
+from app.schemas.geo import BBox
+from app.schemas.organization import ID_MAX
+from app.schemas.pagination import InvalidCursorError, decode_cursor
 
 
 async def get_token_header(x_token: Annotated[str, Header()]):
     if x_token != settings.TOKEN:
         raise HTTPException(status_code=401, detail="X-Token невалидный")
+
+
+@dataclass(frozen=True)
+class PageParams:
+    limit: int
+    # Ключ последней строки предыдущей страницы
+    after: tuple | None = None
+
+
+async def get_page_params(
+    limit: int = Query(
+        settings.PAGE_SIZE_DEFAULT,
+        ge=1,
+        le=settings.PAGE_SIZE_MAX,
+        description="Размер страницы"
+    ),
+    cursor: str | None = Query(None, description="next_cursor из предыдущего ответа"),
+) -> PageParams:
+    if cursor is None:
+        return PageParams(limit=limit)
+    try:
+        return PageParams(limit=limit, after=decode_cursor(cursor))
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Некорректный cursor")
+
+
+def parse_bbox(bbox: str) -> BBox:
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="bbox должен быть в формате minLon,minLat,maxLon,maxLat")
+
+    if not (-180 <= min_lon < max_lon <= 180 and -90 <= min_lat < max_lat <= 90):
+        raise HTTPException(status_code=422, detail="Некорректные границы bbox")
+    return BBox(min_lon, min_lat, max_lon, max_lat)
+
+
+async def get_bbox(
+    bbox: str = Query(..., description="minLon,minLat,maxLon,maxLat")
+) -> BBox:
+    return parse_bbox(bbox)
+
+
+async def get_optional_bbox(
+    bbox: str | None = Query(None, description="minLon,minLat,maxLon,maxLat")
+) -> BBox | None:
+    if bbox is None:
+        return None
+    return parse_bbox(bbox)
+
+
+async def get_organization_ids(
+    ids: str = Query(..., description="id организаций через запятую")
+) -> list[int]:
+    try:
+        organization_ids = [int(value) for value in ids.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids должен быть списком целых чисел через запятую")
+    if not all(1 <= organization_id <= ID_MAX for organization_id in organization_ids):
+        raise HTTPException(status_code=422, detail=f"id должны быть от 1 до {ID_MAX}")
+
+    if len(organization_ids) > settings.BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Не больше {settings.BATCH_MAX_IDS} id за запрос"
+        )
+    return organization_ids
@@ -0,0 +1,174 @@
+'''Замеры SQL по запросам и методам репозиториев.
+
+Время каждого SQL-выражения пишется в гистограмму db_query_seconds с
+меткой метода репозитория (см. BaseRepo.__init_subclass__), а внутри
+HTTP-запроса ещё и копится в RequestStats. ServerTimingMiddleware
+отдаёт эти суммы в заголовке Server-Timing и гистограммах по ручкам.
+Выражения дольше SLOW_QUERY_SECONDS пишутся в лог вместе с EXPLAIN.
+'''
+import asyncio
+import functools
+import logging
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from app.config.settings import settings
+from app.metrics import (DB_QUERIES, DB_QUERY_SECONDS, REQUEST_DB_QUERIES,
+                         REQUEST_DB_SECONDS, REQUEST_POOL_WAIT_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+UNLABELED = 'other'
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_seconds: float = 0.0
+    pool_wait_seconds: float = 0.0
+
+
+current_repo_method: ContextVar[str] = ContextVar('current_repo_method', default=UNLABELED)
+current_request_stats: ContextVar[RequestStats | None] = ContextVar('current_request_stats', default=None)
+
+# Когда последний раз делали EXPLAIN для текста запроса, чтобы не
+# объяснять один и тот же медленный запрос на каждом вызове. Порядок -
+# по времени EXPLAIN: устаревшие записи снимаются с начала, а размер
+# ограничен EXPLAIN_MAX_STATEMENTS (тексты с литералами не повторяются)
+_explained_at: OrderedDict[str, float] = OrderedDict()
+_explain_tasks: set[asyncio.Task] = set()
+EXPLAIN_INTERVAL_SECONDS = 300.0
+EXPLAIN_MAX_STATEMENTS = 1000
+
+
+def label_repo_method(func):
+    '''Метит SQL внутри метода репозитория его именем; вложенные вызовы не перебивают метку'''
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if current_repo_method.get() != UNLABELED:
+            return await func(*args, **kwargs)
+        token = current_repo_method.set(func.__name__)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            current_repo_method.reset(token)
+    return wrapper
+
+
+def record_pool_wait(seconds: float) -> None:
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.pool_wait_seconds += seconds
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    elapsed = time.perf_counter() - started
+    method = current_repo_method.get()
+    DB_QUERIES.labels(method).inc()
+    DB_QUERY_SECONDS.labels(method).observe(elapsed)
+
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+    if settings.SLOW_QUERY_SECONDS and elapsed >= settings.SLOW_QUERY_SECONDS:
+        log_slow_query(statement, None if executemany else parameters, elapsed, method)
+
+
+def handle_error(exception_context):
+    # Выражение упало: снимаем его отметку времени
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+
+def log_slow_query(statement: str, parameters, elapsed: float, method: str) -> None:
+    now = time.monotonic()
+    explained_at = _explained_at.get(statement)
+    explain = (
+        settings.SLOW_QUERY_EXPLAIN
+        and parameters is not None
+        and not statement.lstrip().upper().startswith('EXPLAIN')
+        and (explained_at is None or now - explained_at >= EXPLAIN_INTERVAL_SECONDS)
+    )
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        explain = False
+    if not explain:
+        logger.warning('Медленный запрос %s: %.3f с\n%s', method, elapsed, statement)
+        return
+
+    remember_explained(statement, now)
+    # EXPLAIN идёт отдельным соединением, чтобы не мешать текущему запросу
+    task = loop.create_task(explain_slow_query(statement, parameters, elapsed, method))
+    _explain_tasks.add(task)
+    task.add_done_callback(_explain_tasks.discard)
+
+
+def remember_explained(statement: str, now: float) -> None:
+    _explained_at[statement] = now
+    _explained_at.move_to_end(statement)
+    while _explained_at:
+        oldest_at = next(iter(_explained_at.values()))
+        if len(_explained_at) <= EXPLAIN_MAX_STATEMENTS and now - oldest_at < EXPLAIN_INTERVAL_SECONDS:
+            break
+        _explained_at.popitem(last=False)
+
+
+async def explain_slow_query(statement: str, parameters, elapsed: float, method: str) -> None:
+    from app.config.database import engine
+
+    try:
+        async with engine.connect() as connection:
+            result = await connection.exec_driver_sql(f'EXPLAIN {statement}', parameters)
+            plan = '\n'.join(row[0] for row in result)
+    except Exception:
+        logger.warning('Медленный запрос %s: %.3f с\n%s', method, elapsed, statement, exc_info=True)
+        return
+    logger.warning('Медленный запрос %s: %.3f с\n%s\nПлан:\n%s', method, elapsed, statement, plan)
+
+
+class ServerTimingMiddleware:
+    '''ASGI-middleware: время в БД и пуле по каждому HTTP-запросу'''
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start' and settings.SERVER_TIMING:
+                total_ms = (time.perf_counter() - started) * 1000
+                value = (
+                    f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", '
+                    f'pool;dur={stats.pool_wait_seconds * 1000:.1f}, '
+                    f'total;dur={total_ms:.1f}'
+                )
+                message['headers'] = [*message.get('headers', []), (b'server-timing', value.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request_stats.reset(token)
+            route = scope.get('route')
+            handler = getattr(route, 'path', 'none')
+            REQUEST_DB_QUERIES.labels(handler).observe(stats.queries)
+            REQUEST_DB_SECONDS.labels(handler).observe(stats.db_seconds)
+            REQUEST_POOL_WAIT_SECONDS.labels(handler).observe(stats.pool_wait_seconds)
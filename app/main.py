@@ -1,17 +1,68 @@
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from prometheus_fastapi_instrumentator import Instrumentator
 
-from app.api.routers import organization_router, debug_router, health_router
+from app.api.routers import (activity_router, admin_router, building_router,
+                             debug_router, export_router, health_router,
+                             organization_router, tile_router)
+from app.cache import CACHE_CHANNEL, invalidate_soon, on_cache_notify
+from app.config.database import dispose_engines
+from app.config.notifications import ACTIVITY_CHANNEL, listener
+from app.instrumentation import ServerTimingMiddleware
+from app.schemas.pagination import InvalidCursorError
+from app.services.activity_tree import activity_tree_cache
+from app.services.organization_grid import grid_folder
+from app.services.tiles import TILES_CHANNEL, tile_cache
 # from app.deps import get_token_header
 
 
-app = FastAPI()
-# app = FastAPI(dependencies=[Depends(get_token_header)])
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await activity_tree_cache.start()
+    listener.subscribe(ACTIVITY_CHANNEL, activity_tree_cache.request_rebuild)
+    listener.subscribe(ACTIVITY_CHANNEL, lambda payload: invalidate_soon(['activities']))
+    listener.subscribe(CACHE_CHANNEL, on_cache_notify)
+    # Названия деятельностей есть в тайлах (top_activity)
+    listener.subscribe(ACTIVITY_CHANNEL, lambda payload: tile_cache.clear())
+    listener.subscribe(TILES_CHANNEL, tile_cache.on_notify)
+    await listener.start()
+    grid_folder.start()
+    yield
+    await grid_folder.stop()
+    await listener.stop()
+    await activity_tree_cache.stop()
+    await dispose_engines()
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        # Gauge с livesum перестают учитывать остановленный процесс
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(os.getpid())
+
+
+app = FastAPI(lifespan=lifespan)
+# app = FastAPI(lifespan=lifespan, dependencies=[Depends(get_token_header)])
+app.add_middleware(ServerTimingMiddleware)
+
+
+@app.exception_handler(InvalidCursorError)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursorError):
+    # cursor от другого эндпоинта: декодируется, но не подходит по ключу
+    return JSONResponse(status_code=400, content={"detail": "Некорректный cursor"})
+
 
 app.include_router(organization_router)
 app.include_router(debug_router)
 app.include_router(health_router)
+app.include_router(admin_router)
+app.include_router(export_router)
+app.include_router(tile_router)
+app.include_router(activity_router)
+app.include_router(building_router)
 
+# При PROMETHEUS_MULTIPROC_DIR expose собирает метрики всех процессов
+# через MultiProcessCollector, см. app.server
 Instrumentator(
     should_group_status_codes=False,
     excluded_handlers=["/metrics", "/docs", "/openapi.json", "/redoc"],
@@ -0,0 +1,137 @@
+'''Прикладные метрики Prometheus.
+
+Регистрируются в общем реестре prometheus_client и отдаются
+через /metrics вместе с метриками Instrumentator. При нескольких
+процессах (PROMETHEUS_MULTIPROC_DIR, см. app.server) значения
+складываются по всем живым процессам, отсюда multiprocess_mode
+у Gauge.
+'''
+from prometheus_client import Counter, Gauge, Histogram
+
+ACTIVITY_TREE_LOOKUPS = Counter(
+    'activity_tree_cache_lookups_total',
+    'Обращения к кэшу дерева деятельностей',
+    ['result'],
+)
+ACTIVITY_TREE_REBUILD_SECONDS = Histogram(
+    'activity_tree_cache_rebuild_seconds',
+    'Время пересборки кэша дерева деятельностей',
+)
+
+CACHE_REQUESTS = Counter(
+    'response_cache_requests_total',
+    'Обращения к кэшу ответов сервисов',
+    ['method', 'result'],
+)
+CACHE_LATENCY_SECONDS = Histogram(
+    'response_cache_latency_seconds',
+    'Время операций кэша ответов',
+    ['backend', 'operation'],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+COALESCED_CALLS = Counter(
+    'coalesced_calls_total',
+    'Вызовы сервиса: leader выполняет запрос, follower ждёт его результат',
+    ['method', 'role'],
+)
+COALESCED_CONNECTIONS_SAVED = Counter(
+    'coalesced_connections_saved_total',
+    'Соединения, возвращённые в пул ожидающими вызовами (follower)',
+    ['method'],
+)
+
+TILE_CACHE_REQUESTS = Counter(
+    'tile_cache_requests_total',
+    'Обращения к кэшу векторных тайлов',
+    ['result'],
+)
+TILE_CACHE_BYTES = Gauge(
+    'tile_cache_bytes',
+    'Размер кэша векторных тайлов',
+    multiprocess_mode='livesum',
+)
+
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    'db_pool_checkout_seconds',
+    'Время ожидания соединения из пула',
+    ['pool'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_IN_USE = Gauge(
+    'db_pool_connections_in_use',
+    'Соединения, выданные из пула',
+    ['pool'],
+    multiprocess_mode='livesum',
+)
+DB_POOL_OVERFLOW = Gauge(
+    'db_pool_overflow_connections',
+    'Соединения сверх pool_size',
+    ['pool'],
+    multiprocess_mode='livesum',
+)
+DB_POOL_CAPACITY = Gauge(
+    'db_pool_capacity',
+    'Максимум соединений пула: pool_size + max_overflow',
+    ['pool'],
+    multiprocess_mode='livesum',
+)
+
+GRID_DELTAS_FOLDED = Counter(
+    'organization_grid_deltas_folded_total',
+    'Дельты organization_grid_delta, свёрнутые в organization_grid',
+)
+
+IMPORT_BATCHES = Counter(
+    'bulk_import_batches_total',
+    'Пачки массовой загрузки',
+    ['status'],
+)
+IMPORT_BATCH_SECONDS = Histogram(
+    'bulk_import_batch_seconds',
+    'Время загрузки одной пачки: COPY и upsert',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+IMPORT_RECORDS = Counter(
+    'bulk_import_records_total',
+    'Загруженные входные записи',
+)
+IMPORT_ROWS = Counter(
+    'bulk_import_rows_total',
+    'Вставленные, изменённые и удалённые строки по таблицам',
+    ['table'],
+)
+IMPORT_SKIPPED_ACTIVITIES = Counter(
+    'bulk_import_skipped_activities_total',
+    'Пропущенные ссылки на неизвестные деятельности',
+)
+
+DB_QUERIES = Counter(
+    'db_queries_total',
+    'SQL-запросы, выполненные приложением',
+    ['method'],
+)
+DB_QUERY_SECONDS = Histogram(
+    'db_query_seconds',
+    'Время SQL-запроса по методам репозиториев',
+    ['method'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'SQL-запросов на HTTP-запрос',
+    ['handler'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+REQUEST_DB_SECONDS = Histogram(
+    'http_request_db_seconds',
+    'Суммарное время SQL на HTTP-запрос',
+    ['handler'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+REQUEST_POOL_WAIT_SECONDS = Histogram(
+    'http_request_pool_wait_seconds',
+    'Ожидание соединений из пула на HTTP-запрос',
+    ['handler'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
@@ -1,3 +1,5 @@
 from app.models.activity import *
 from app.models.building import *
 from app.models.organization import *
+from app.models.import_job import *
+from app.models.organization_grid import *
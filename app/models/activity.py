@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy import CheckConstraint, ForeignKey, String
+from sqlalchemy import CheckConstraint, ForeignKey, Index, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.config.database import Base, engine
@@ -44,6 +44,62 @@ class Activity(Base):
         return self.name
 
 
+class ActivityClosure(Base):
+    '''Таблица замыкания дерева деятельностей (предок -> потомок).
+
+    Заполняется триггерами БД при изменении activity, руками не писать.
+    '''
+    __tablename__ = 'activity_closure'
+
+    ancestor_id: Mapped[int] = mapped_column(
+        ForeignKey("activity.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    descendant_id: Mapped[int] = mapped_column(
+        ForeignKey("activity.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    # 0 - сама деятельность, 1 - прямой потомок и т.д.
+    depth: Mapped[int] = mapped_column(nullable=False)
+
+    __table_args__ = (
+        Index("ix_activity_closure_descendant_id", "descendant_id"),
+    )
+
+
+class ActivityOrganizationLink(Base):
+    '''Сколько деятельностей организации входит в поддерево предка.
+
+    Заполняется триггерами БД на organization_activity и activity,
+    руками не писать.
+    '''
+    __tablename__ = 'activity_organization_link'
+
+    ancestor_id: Mapped[int] = mapped_column(
+        ForeignKey("activity.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    organization_id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    links: Mapped[int] = mapped_column(nullable=False)
+
+
+class ActivityOrgCount(Base):
+    '''Число организаций у деятельности: с ней самой и во всём поддереве.
+
+    Поддерживается триггерами вместе с activity_organization_link,
+    пересобрать: python -m app.commands.activity_rollup.
+    '''
+    __tablename__ = 'activity_org_count'
+
+    activity_id: Mapped[int] = mapped_column(
+        ForeignKey("activity.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    direct_count: Mapped[int] = mapped_column(nullable=False)
+    # Организация с несколькими деятельностями из поддерева считается один раз
+    subtree_count: Mapped[int] = mapped_column(nullable=False)
+
+
 # import asyncio
 
 # async def init_db():
@@ -1,10 +1,13 @@
 
+from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Float, String
+from sqlalchemy import (DateTime, FetchedValue, Float, Index, String, func,
+                        text)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.config.database import Base
+from app.models.types import Geography
 
 if TYPE_CHECKING:
     from .organization import Organization
@@ -19,9 +22,41 @@ class Building(Base):
     office: Mapped[str | None] = mapped_column(String)
     latitude: Mapped[float] = mapped_column(Float, nullable=True)
     longitude: Mapped[float] = mapped_column(Float, nullable=True)
+    # Хранимая точка для гео-запросов, индекс ix_building_geog (GiST).
+    # Выставляется триггером БД по longitude и latitude
+    geog: Mapped[str | None] = mapped_column(
+        Geography(),
+        server_default=FetchedValue(),
+        server_onupdate=FetchedValue(),
+        deferred=True
+    )
+    # Число организаций в здании, поддерживается триггерами на organization
+    organization_count: Mapped[int] = mapped_column(
+        nullable=False,
+        server_default=text('0')
+    )
+    # Выставляется триггером БД при любом изменении строки (кроме organization_count)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        index=True
+    )
+    # Время последнего изменения организаций здания, в том числе удаления;
+    # выставляется триггером на organization
+    organizations_changed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now()
+    )
     organizations: Mapped[list["Organization"]] = relationship(
         back_populates="building"
     )
 
+    __table_args__ = (
+        Index("ix_building_city_street_id", "city", "street", "id"),
+        Index("ix_building_street", "street"),
+    )
+
     def __str__(self):
         return f'{self.city} - {self.street} - {self.house}'
\ No newline at end of file
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.config.database import Base
+
+
+class ImportJob(Base):
+    '''Контрольная точка массовой загрузки (см. app.services.bulk_import).
+
+    processed_records сдвигается в той же транзакции, что и загрузка
+    пачки, поэтому после сбоя загрузку можно продолжить с этого места.
+    '''
+    __tablename__ = 'import_job'
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String, nullable=False, unique=True)
+    # running | failed | done
+    status: Mapped[str] = mapped_column(String, nullable=False)
+    processed_records: Mapped[int] = mapped_column(nullable=False, server_default="0")
+    error: Mapped[str | None] = mapped_column(String)
+    # sha256 входного файла, если он известен (не stdin)
+    source_hash: Mapped[str | None] = mapped_column(String)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now()
+    )
+    # Выставляется триггером БД при любом изменении строки
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now()
+    )
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
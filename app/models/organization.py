@@ -1,7 +1,9 @@
 
+from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, String, UniqueConstraint
+from sqlalchemy import DateTime, ForeignKey, String, UniqueConstraint, func, text
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.config.database import Base
@@ -15,8 +17,10 @@ class Organization(Base):
     __tablename__ = 'organization'
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String, nullable=False)
-    building_id: Mapped[int] = mapped_column(ForeignKey("building.id"))
+    # Кроме btree есть GIN-индексы для поиска: ix_organization_name_trgm
+    # (pg_trgm) и ix_organization_name_tsv (to_tsvector('russian', name))
+    name: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    building_id: Mapped[int] = mapped_column(ForeignKey("building.id"), index=True)
     building: Mapped["Building"] = relationship(back_populates="organizations")
 
     organization_activities: Mapped[list["OrganizationActivity"]] = relationship(
@@ -32,6 +36,21 @@ class Organization(Base):
         back_populates="organization",
         cascade="all, delete-orphan"
     )
+    # Денормализованная копия organization_phone.phone (по порядку id) для
+    # чтения без JOIN и GROUP BY. Поддерживается триггерами на
+    # organization_phone, писать телефоны нужно через phones
+    phone_numbers: Mapped[list[str]] = mapped_column(
+        ARRAY(String),
+        nullable=False,
+        server_default=text("'{}'")
+    )
+    # Выставляется триггером БД при любом изменении строки
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        index=True
+    )
 
     def __str__(self):
         return f'{self.name}'
@@ -39,10 +58,19 @@ class Organization(Base):
 
 class OrganizationPhone(Base):
     __tablename__ = "organization_phone"
+    __table_args__ = (
+        UniqueConstraint("organization_id", "phone", name="uq_organization_phone_org_phone"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    organization_id: Mapped[int] = mapped_column(ForeignKey("organization.id"))
+    organization_id: Mapped[int] = mapped_column(ForeignKey("organization.id"), index=True)
     phone: Mapped[str] = mapped_column(String, nullable=False)
+    # Выставляется триггером БД при любом изменении строки
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now()
+    )
 
     organization: Mapped["Organization"] = relationship(
         back_populates="phones"
@@ -59,6 +87,7 @@ class OrganizationActivity(Base):
     )
     activity_id: Mapped[int] = mapped_column(
         ForeignKey("activity.id"),
+        index=True,
         # primary_key=True
     )
     organization: Mapped["Organization"] = relationship(
@@ -66,4 +95,22 @@ class OrganizationActivity(Base):
     )
     activity: Mapped["Activity"] = relationship(
         back_populates="organization_activities"
-    )
\ No newline at end of file
+    )
+
+
+class OrganizationTombstone(Base):
+    '''Удалённая организация для инкрементальной выгрузки.
+
+    Пишется триггером при удалении из organization и снимается при
+    повторной вставке того же id.
+    '''
+    __tablename__ = "organization_tombstone"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    building_id: Mapped[int] = mapped_column(nullable=False)
+    deleted_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        index=True
+    )
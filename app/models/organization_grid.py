@@ -0,0 +1,47 @@
+from sqlalchemy import BigInteger, Float, Identity, Index, SmallInteger
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.config.database import Base
+
+
+class OrganizationGridCell(Base):
+    '''Число организаций в ячейке сетки на каждом масштабе.
+
+    Ячейка масштаба zoom - тайл масштаба zoom + GRID_SUBDIVISION.
+    Пишется только свёрткой OrganizationGridDelta, руками не писать;
+    пересобрать: python -m app.commands.organization_grid.
+    '''
+    __tablename__ = 'organization_grid'
+
+    zoom: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    cell_x: Mapped[int] = mapped_column(primary_key=True)
+    cell_y: Mapped[int] = mapped_column(primary_key=True)
+    # Ячейки, ставшие пустыми, не удаляются, а остаются с нулём
+    org_count: Mapped[int] = mapped_column(nullable=False)
+    # Суммы координат зданий по организациям, центроид = сумма / org_count
+    sum_lon: Mapped[float] = mapped_column(Float, nullable=False)
+    sum_lat: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+class OrganizationGridDelta(Base):
+    '''Изменения organization_grid, ещё не свёрнутые в неё.
+
+    Триггеры БД на organization и building только дописывают сюда строки:
+    общие ячейки мелких масштабов не становятся точкой блокировок записи.
+    organization_grid_fold() переносит дельты в organization_grid
+    (см. app.services.organization_grid), чтение складывает обе таблицы.
+    '''
+    __tablename__ = 'organization_grid_delta'
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+    zoom: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    cell_x: Mapped[int] = mapped_column(nullable=False)
+    cell_y: Mapped[int] = mapped_column(nullable=False)
+    # Знаковые: удаление и переезд организации дают отрицательные значения
+    org_count: Mapped[int] = mapped_column(nullable=False)
+    sum_lon: Mapped[float] = mapped_column(Float, nullable=False)
+    sum_lat: Mapped[float] = mapped_column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_organization_grid_delta_cell", "zoom", "cell_x", "cell_y"),
+    )
@@ -0,0 +1,17 @@
+from sqlalchemy.types import UserDefinedType
+
+
+class Geography(UserDefinedType):
+    '''PostGIS geography без зависимости от geoalchemy2.
+
+    Значения в ORM не разбираются: колонка нужна для запросов
+    (ST_DWithin, <->), а не для чтения в Python.
+    '''
+    cache_ok = True
+
+    def __init__(self, geometry_type: str = 'Point', srid: int = 4326) -> None:
+        self.geometry_type = geometry_type
+        self.srid = srid
+
+    def get_col_spec(self, **kw):
+        return f'geography({self.geometry_type}, {self.srid})'
@@ -0,0 +1,153 @@
+from sqlalchemy import delete, except_, func, insert, literal, select
+
+from app.models import (Activity, ActivityClosure, ActivityOrgCount,
+                        Organization, OrganizationActivity)
+from app.repositories.base import BaseRepo
+from app.repositories.building import building_geometry
+
+
+class ActivityRepo(BaseRepo[Activity]):
+    model_class = Activity
+
+    async def get_tree_nodes_db(self):
+        result = await self.session.execute(
+            select(
+                Activity.id,
+                Activity.name,
+                Activity.parent_id,
+                Activity.level,
+            )
+            .order_by(Activity.level, Activity.id)
+        )
+        return result.all()
+
+    async def get_descendant_ids_db(self, activity_id: int):
+        result = await self.session.execute(
+            select(ActivityClosure.descendant_id)
+            .where(ActivityClosure.ancestor_id == activity_id)
+        )
+        return result.scalars().all()
+
+    def _activity_tree_cte(self):
+        '''Замыкание дерева, построенное по parent_id рекурсивным CTE'''
+        tree = (
+            select(
+                Activity.id.label('ancestor_id'),
+                Activity.id.label('descendant_id'),
+                literal(0).label('depth'),
+            )
+            .cte('activity_tree', recursive=True)
+        )
+        child = Activity.__table__.alias()
+        return tree.union_all(
+            select(
+                tree.c.ancestor_id,
+                child.c.id,
+                tree.c.depth + 1,
+            )
+            .where(child.c.parent_id == tree.c.descendant_id)
+        )
+
+    async def rebuild_closure_db(self):
+        '''Полностью пересобирает activity_closure по parent_id'''
+        tree = self._activity_tree_cte()
+        await self.session.execute(delete(ActivityClosure))
+        result = await self.session.execute(
+            insert(ActivityClosure).from_select(
+                ['ancestor_id', 'descendant_id', 'depth'],
+                select(tree.c.ancestor_id, tree.c.descendant_id, tree.c.depth)
+            )
+        )
+        return result.rowcount
+
+    async def get_closure_drift_db(self):
+        '''Количество строк, которых не хватает в activity_closure и лишних строк'''
+        tree = self._activity_tree_cte()
+        expected = select(tree.c.ancestor_id, tree.c.descendant_id, tree.c.depth)
+        actual = select(
+            ActivityClosure.ancestor_id,
+            ActivityClosure.descendant_id,
+            ActivityClosure.depth,
+        )
+        missing = except_(expected, actual).subquery()
+        extra = except_(actual, expected).subquery()
+        result = await self.session.execute(
+            select(
+                select(func.count()).select_from(missing).scalar_subquery().label('missing'),
+                select(func.count()).select_from(extra).scalar_subquery().label('extra'),
+            )
+        )
+        return result.mappings().one()
+
+    async def get_org_counts_db(self):
+        '''activity_id -> (direct_count, subtree_count) из activity_org_count'''
+        result = await self.session.execute(
+            select(
+                ActivityOrgCount.activity_id,
+                ActivityOrgCount.direct_count,
+                ActivityOrgCount.subtree_count,
+            )
+        )
+        return {row.activity_id: (row.direct_count, row.subtree_count) for row in result}
+
+    async def get_scoped_org_counts_db(self, building_id: int | None = None, area_geom=None):
+        '''То же, что get_org_counts_db, но только по организациям здания и/или области'''
+        def scoped(stmt):
+            stmt = stmt.join(Organization, Organization.id == OrganizationActivity.organization_id)
+            if building_id is not None:
+                stmt = stmt.where(Organization.building_id == building_id)
+            if area_geom is not None:
+                stmt = stmt.join(Organization.building).where(
+                    func.ST_Intersects(building_geometry(), area_geom)
+                )
+            return stmt
+
+        direct = await self.session.execute(
+            scoped(
+                select(OrganizationActivity.activity_id, func.count().label('count'))
+                .select_from(OrganizationActivity)
+            )
+            .group_by(OrganizationActivity.activity_id)
+        )
+        subtree = await self.session.execute(
+            scoped(
+                select(
+                    ActivityClosure.ancestor_id,
+                    func.count(OrganizationActivity.organization_id.distinct()).label('count'),
+                )
+                .select_from(OrganizationActivity)
+                .join(ActivityClosure, ActivityClosure.descendant_id == OrganizationActivity.activity_id)
+            )
+            .group_by(ActivityClosure.ancestor_id)
+        )
+        direct_counts = {row.activity_id: row.count for row in direct}
+        return {
+            row.ancestor_id: (direct_counts.get(row.ancestor_id, 0), row.count)
+            for row in subtree
+        }
+
+    async def rebuild_rollup_db(self):
+        '''Полностью пересчитывает activity_org_count и activity_organization_link'''
+        await self.session.execute(select(func.activity_rollup_rebuild()))
+
+    async def get_rollup_drift_db(self):
+        '''Деятельности, у которых activity_org_count разошлась с organization_activity'''
+        direct = (
+            select(func.count())
+            .where(OrganizationActivity.activity_id == Activity.id)
+            .scalar_subquery()
+        )
+        subtree = (
+            select(func.count(OrganizationActivity.organization_id.distinct()))
+            .join(ActivityClosure, ActivityClosure.descendant_id == OrganizationActivity.activity_id)
+            .where(ActivityClosure.ancestor_id == Activity.id)
+            .scalar_subquery()
+        )
+        expected = select(Activity.id, direct, subtree)
+        actual = select(
+            ActivityOrgCount.activity_id,
+            ActivityOrgCount.direct_count,
+            ActivityOrgCount.subtree_count,
+        )
+        wrong = except_(expected, actual).subquery()
+        return await self.session.scalar(select(func.count()).select_from(wrong))
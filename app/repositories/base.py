@@ -1,16 +1,56 @@
-from typing import Generic, Type, TypeVar, Any
+import inspect
+import json
+import math
+from typing import Generic, Sequence, Type, TypeVar, Any
 
-from sqlalchemy import select
+from sqlalchemy import (BigInteger, Integer, Label, Numeric, Select,
+                        SmallInteger, String, Text, cast, func,
+                        literal_column, select, tuple_)
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config.database import Base
+from app.instrumentation import label_repo_method
+from app.schemas.pagination import InvalidCursorError
 
 ModelType = TypeVar("ModelType", bound=Base)
 
 
+def integer_bits(column_type: Integer) -> int:
+    if isinstance(column_type, SmallInteger):
+        return 16
+    if isinstance(column_type, BigInteger):
+        return 64
+    return 32
+
+
+def cursor_value_fits(column_type, value) -> bool:
+    '''Подходит ли значение из cursor к типу колонки ключа.
+
+    Иначе неверный cursor дошёл бы до asyncpg и вернул 500 вместо 400.
+    '''
+    if isinstance(value, bool):
+        return False
+    if isinstance(column_type, Integer):
+        bound = 2 ** (integer_bits(column_type) - 1)
+        return isinstance(value, int) and -bound <= value < bound
+    if isinstance(column_type, Numeric):
+        return isinstance(value, (int, float)) and math.isfinite(value)
+    if isinstance(column_type, String):
+        return isinstance(value, str) and '\x00' not in value
+    return True
+
+
 class BaseRepo(Generic[ModelType]):
     model_class: Type[ModelType]
 
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        # SQL внутри *_db методов попадает в метрики с их именем
+        for name, attr in list(vars(cls).items()):
+            if name.endswith('_db') and inspect.iscoroutinefunction(attr):
+                setattr(cls, name, label_repo_method(attr))
+
     def __init__(self, session: AsyncSession) -> None:
         self.session = session
 
@@ -37,6 +77,97 @@ class BaseRepo(Generic[ModelType]):
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
+    async def fetch_page(
+        self,
+        stmt: Select,
+        keys: Sequence[Label],
+        after: tuple | None,
+        limit: int,
+    ):
+        '''Keyset-пагинация без OFFSET.
+
+        keys - уникальный ключ сортировки, каждая колонка должна быть
+        в select под своей меткой. Возвращает строки страницы и ключ
+        последней строки, если за ней есть ещё строки.
+        '''
+        result = await self.session.execute(self._page_select(stmt, keys, after, limit))
+        rows = result.mappings().all()
+        if len(rows) <= limit:
+            return rows, None
+
+        rows = rows[:limit]
+        return rows, tuple(rows[-1][key.name] for key in keys)
+
+    def _page_select(
+        self,
+        stmt: Select,
+        keys: Sequence[Label],
+        after: tuple | None,
+        limit: int,
+    ) -> Select:
+        '''Запрос страницы: строки после after по ключу, на одну больше limit'''
+        if after is not None:
+            if len(after) != len(keys) or not all(
+                cursor_value_fits(key.type, value) for key, value in zip(keys, after)
+            ):
+                raise InvalidCursorError(after)
+            if len(keys) == 1:
+                stmt = stmt.where(keys[0].element > after[0])
+            else:
+                stmt = stmt.where(tuple_(*(key.element for key in keys)) > tuple_(*after))
+        return stmt.order_by(*(key.element for key in keys)).limit(limit + 1)
+
+    async def fetch_json_page(
+        self,
+        stmt: Select,
+        keys: Sequence[Label],
+        after: tuple | None,
+        limit: int,
+        fields: Sequence[str],
+    ):
+        '''Как fetch_page, но страницу в JSON собирает сама БД.
+
+        fields - метки колонок stmt, из которых строится объект элемента;
+        stmt должен выбирать и колонку id.
+        Возвращает JSON-текст массива элементов, ключ последней строки
+        (или None) и id строк страницы (для тегов кэша).
+        '''
+        page = self._page_select(stmt, keys, after, limit).subquery('page')
+        ordering = [page.c[key.name] for key in keys]
+        rows = (
+            select(page, func.row_number().over(order_by=ordering).label('page_row'))
+            .subquery('page_rows')
+        )
+        ordering = [rows.c[key.name] for key in keys]
+        in_page = rows.c.page_row <= limit
+        item = func.json_build_object(
+            *(
+                part
+                for field in fields
+                for part in (literal_column(f"'{field}'"), rows.c[field])
+            )
+        )
+        result = await self.session.execute(
+            select(
+                cast(
+                    func.coalesce(
+                        func.json_agg(aggregate_order_by(item, *ordering)).filter(in_page),
+                        literal_column("'[]'::json")
+                    ),
+                    Text
+                ).label('items'),
+                cast(
+                    func.json_agg(func.json_build_array(*ordering)).filter(rows.c.page_row == limit),
+                    Text
+                ).label('last_key'),
+                func.bool_or(rows.c.page_row > limit).label('has_more'),
+                func.array_agg(aggregate_order_by(rows.c.id, *ordering)).filter(in_page).label('ids'),
+            )
+        )
+        row = result.mappings().one()
+        next_key = tuple(json.loads(row['last_key'])[0]) if row['has_more'] else None
+        return row['items'], next_key, row['ids'] or []
+
     async def create(self, **data: Any):
         obj = self.model_class(**data)
         self.session.add(obj)
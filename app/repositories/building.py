@@ -0,0 +1,140 @@
+from sqlalchemy import except_, func, literal_column, select, true, update
+
+from app.models import Activity, Building, Organization, OrganizationActivity
+from app.repositories.base import BaseRepo
+
+
+def building_geometry():
+    '''Точка здания геометрией SRID 4326, как в индексе ix_building_geom'''
+    return func.geometry(Building.geog)
+
+
+def building_mercator():
+    '''Точка здания в EPSG:3857, как в индексе ix_building_geom_3857.
+
+    SRID литералом, а не параметром: иначе выражение не совпадёт
+    с индексным в общем плане подготовленного запроса.
+    '''
+    return func.ST_Transform(building_geometry(), literal_column('3857'))
+
+
+class BuildingRepo(BaseRepo[Building]):
+    model_class = Building
+
+    def _building_select(self):
+        building_id = Building.id.label('id')
+        stmt = select(
+            building_id,
+            Building.city.label('city'),
+            Building.street.label('street'),
+            Building.house.label('house'),
+            Building.office.label('office'),
+            Building.latitude.label('latitude'),
+            Building.longitude.label('longitude'),
+            Building.organization_count.label('organization_count'),
+        )
+        return stmt, [building_id]
+
+    async def get_buildings_db(
+        self,
+        city: str | None,
+        street: str | None,
+        limit: int,
+        after: tuple | None = None
+    ):
+        stmt, keys = self._building_select()
+        if city is not None:
+            stmt = stmt.where(Building.city == city)
+        if street is not None:
+            stmt = stmt.where(Building.street == street)
+        return await self.fetch_page(stmt, keys, after, limit)
+
+    async def get_building_db(self, building_id: int):
+        stmt, _ = self._building_select()
+        result = await self.session.execute(stmt.where(Building.id == building_id))
+        return result.mappings().one_or_none()
+
+    async def get_building_coordinates_db(self):
+        '''Координаты и число организаций всех зданий с координатами'''
+        result = await self.session.execute(
+            select(
+                Building.id,
+                Building.longitude,
+                Building.latitude,
+                Building.organization_count,
+            )
+            .where(Building.longitude.is_not(None), Building.latitude.is_not(None))
+            .order_by(Building.id)
+        )
+        return result.all()
+
+    def _organization_counts(self):
+        return (
+            select(func.count(Organization.id))
+            .where(Organization.building_id == Building.id)
+            .scalar_subquery()
+        )
+
+    async def refresh_organization_counts_db(self):
+        '''Пересчитывает building.organization_count, возвращает число исправленных зданий'''
+        counts = self._organization_counts()
+        result = await self.session.execute(
+            update(Building)
+            .values(organization_count=counts)
+            .where(Building.organization_count.is_distinct_from(counts))
+        )
+        return result.rowcount
+
+    async def get_organization_count_drift_db(self):
+        '''Число зданий, у которых organization_count разошёлся с организациями'''
+        wrong = except_(
+            select(Building.id, self._organization_counts()),
+            select(Building.id, Building.organization_count),
+        ).subquery()
+        return await self.session.scalar(select(func.count()).select_from(wrong))
+
+    async def get_tile_db(self, z: int, x: int, y: int, extent: int, buffer: int) -> bytes:
+        '''Векторный тайл (MVT) со слоем buildings.
+
+        У каждого здания: число организаций, название первой по алфавиту
+        организации и самая частая деятельность.
+        '''
+        envelope = func.ST_TileEnvelope(z, x, y)
+        stats = (
+            select(
+                func.count(Organization.id).label('org_count'),
+                func.min(Organization.name).label('name'),
+            )
+            .where(Organization.building_id == Building.id)
+            .lateral('stats')
+        )
+        top_activity = (
+            select(Activity.name.label('top_activity'))
+            .select_from(OrganizationActivity)
+            .join(Organization, Organization.id == OrganizationActivity.organization_id)
+            .join(Activity, Activity.id == OrganizationActivity.activity_id)
+            .where(Organization.building_id == Building.id)
+            .group_by(Activity.id, Activity.name)
+            .order_by(func.count().desc(), Activity.id)
+            .limit(1)
+            .lateral('top_activity')
+        )
+        features = (
+            select(
+                Building.id.label('building_id'),
+                func.concat_ws(', ', Building.city, Building.street, Building.house).label('address'),
+                stats.c.org_count,
+                stats.c.name,
+                top_activity.c.top_activity,
+                func.ST_AsMVTGeom(building_mercator(), envelope, extent, buffer).label('geom'),
+            )
+            .select_from(Building)
+            .join(stats, true())
+            .outerjoin(top_activity, true())
+            .where(building_mercator().op('&&')(envelope))
+            .subquery('features')
+        )
+        tile = await self.session.scalar(
+            select(func.ST_AsMVT(features.table_valued(), 'buildings', extent, 'geom'))
+        )
+        return bytes(tile or b'')
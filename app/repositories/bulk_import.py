@@ -0,0 +1,226 @@
+from collections.abc import Mapping
+from typing import Any
+
+from sqlalchemy import (Column, Float, Integer, MetaData, String, Table,
+                        any_, bindparam, delete, exists, func, select, tuple_,
+                        update)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.schema import CreateTable
+
+from app.models import (Activity, Building, ImportJob, Organization,
+                        OrganizationActivity, OrganizationPhone)
+from app.repositories.base import BaseRepo
+
+# Временные таблицы для COPY. Живут до конца соединения и очищаются
+# при коммите, поэтому подготовленные выражения asyncpg не устаревают
+staging_metadata = MetaData()
+
+
+def staging_table(name: str, *columns: Column) -> Table:
+    return Table(
+        name,
+        staging_metadata,
+        *columns,
+        prefixes=['TEMPORARY'],
+        postgresql_on_commit='DELETE ROWS'
+    )
+
+
+import_building = staging_table(
+    'import_building',
+    Column('id', Integer),
+    Column('city', String),
+    Column('street', String),
+    Column('house', String),
+    Column('office', String),
+    Column('latitude', Float),
+    Column('longitude', Float),
+)
+# Необязательные поля здания: пропуск в записи не затирает значение в базе
+BUILDING_KEEP = {
+    'street': '',
+    'house': '',
+    'office': None,
+    'latitude': None,
+    'longitude': None,
+}
+import_organization = staging_table(
+    'import_organization',
+    Column('id', Integer),
+    Column('name', String),
+    Column('building_id', Integer),
+)
+import_organization_phone = staging_table(
+    'import_organization_phone',
+    Column('organization_id', Integer),
+    Column('phone', String),
+)
+import_organization_activity = staging_table(
+    'import_organization_activity',
+    Column('organization_id', Integer),
+    Column('activity_id', Integer),
+)
+
+
+def upsert_from(model, staging: Table, keep: Mapping[str, Any] | None = None):
+    '''INSERT ... SELECT из staging с обновлением только изменившихся строк.
+
+    keep - необязательные столбцы: NULL в staging значит "не передано".
+    Новая строка получает значение из keep, существующая сохраняет своё.
+    '''
+    keep = keep or {}
+    columns = [column.name for column in staging.columns]
+    data_columns = [name for name in columns if name != 'id']
+    target = model.__table__
+    source = [
+        column if keep.get(column.name) is None else func.coalesce(column, keep[column.name])
+        for column in staging.columns
+    ]
+    stmt = insert(model).from_select(columns, select(*source))
+    values = {}
+    for name in data_columns:
+        value = stmt.excluded[name]
+        if name in keep:
+            if keep[name] is not None:
+                # Значение из keep в EXCLUDED - подстановка для пропуска
+                value = func.nullif(value, keep[name])
+            value = func.coalesce(value, target.c[name])
+        values[name] = value
+    return stmt.on_conflict_do_update(
+        index_elements=[target.c.id],
+        set_=values,
+        where=tuple_(*(target.c[name] for name in data_columns)).is_distinct_from(
+            tuple_(*values.values())
+        )
+    )
+
+
+class ImportRepo(BaseRepo[ImportJob]):
+    model_class = ImportJob
+
+    async def get_job_db(self, name: str):
+        return await self.session.scalar(
+            select(self.model_class).where(self.model_class.name == name)
+        )
+
+    async def advance_job_db(self, name: str, processed: int, count: int) -> bool:
+        '''Сдвигает контрольную точку, если её никто не сдвинул раньше нас'''
+        result = await self.session.execute(
+            update(self.model_class)
+            .where(
+                self.model_class.name == name,
+                self.model_class.processed_records == processed,
+            )
+            .values(processed_records=processed + count)
+        )
+        return result.rowcount == 1
+
+    async def copy_batch_db(self, batch) -> None:
+        '''COPY пачки во временные таблицы текущей транзакции'''
+        tables = (
+            (import_building, batch.buildings.values()),
+            (import_organization, batch.organizations.values()),
+            (import_organization_phone, batch.phones),
+            (import_organization_activity, batch.activities),
+        )
+        for table, _ in tables:
+            await self.session.execute(CreateTable(table, if_not_exists=True))
+
+        connection = await self.session.connection()
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+        for table, records in tables:
+            records = list(records)
+            if records:
+                await driver_connection.copy_records_to_table(
+                    table.name,
+                    records=records,
+                    columns=[column.name for column in table.columns]
+                )
+
+    async def unknown_activities_db(self) -> dict[int, int]:
+        '''Неизвестные activity_id из staging и число ссылок на каждый'''
+        activity = import_organization_activity
+        result = await self.session.execute(
+            select(activity.c.activity_id, func.count())
+            .where(~exists().where(Activity.id == activity.c.activity_id))
+            .group_by(activity.c.activity_id)
+        )
+        return dict(result.all())
+
+    async def upsert_batch_db(self, batch) -> dict[str, int]:
+        '''Переносит строки из временных таблиц, возвращает число затронутых строк.
+
+        Телефоны и деятельности организаций, у которых запись их перечисляет
+        (batch.phone_owners, batch.activity_owners), заменяются списком из
+        записи: лишние строки удаляются.
+        '''
+        rows = {}
+        result = await self.session.execute(upsert_from(Building, import_building, BUILDING_KEEP))
+        rows['building'] = result.rowcount
+        result = await self.session.execute(upsert_from(Organization, import_organization))
+        rows['organization'] = result.rowcount
+
+        phone = import_organization_phone
+        deleted = await self.session.execute(
+            delete(OrganizationPhone)
+            .where(
+                OrganizationPhone.organization_id == any_(
+                    bindparam('phone_owners', sorted(batch.phone_owners), type_=ARRAY(Integer))
+                ),
+                ~exists().where(
+                    phone.c.organization_id == OrganizationPhone.organization_id,
+                    phone.c.phone == OrganizationPhone.phone
+                )
+            )
+        )
+        result = await self.session.execute(
+            insert(OrganizationPhone)
+            .from_select(
+                ['organization_id', 'phone'],
+                select(phone.c.organization_id, phone.c.phone)
+            )
+            .on_conflict_do_nothing(constraint='uq_organization_phone_org_phone')
+        )
+        rows['organization_phone'] = deleted.rowcount + result.rowcount
+
+        # Деятельности не загружаются, неизвестные activity_id пропускаются
+        # (см. unknown_activities_db)
+        activity = import_organization_activity
+        deleted = await self.session.execute(
+            delete(OrganizationActivity)
+            .where(
+                OrganizationActivity.organization_id == any_(
+                    bindparam('activity_owners', sorted(batch.activity_owners), type_=ARRAY(Integer))
+                ),
+                ~exists().where(
+                    activity.c.organization_id == OrganizationActivity.organization_id,
+                    activity.c.activity_id == OrganizationActivity.activity_id
+                )
+            )
+        )
+        result = await self.session.execute(
+            insert(OrganizationActivity)
+            .from_select(
+                ['organization_id', 'activity_id'],
+                select(activity.c.organization_id, activity.c.activity_id)
+                .where(exists().where(Activity.id == activity.c.activity_id))
+            )
+            .on_conflict_do_nothing(index_elements=['organization_id', 'activity_id'])
+        )
+        rows['organization_activity'] = deleted.rowcount + result.rowcount
+        return rows
+
+    async def fix_sequences_db(self) -> None:
+        '''После загрузки с явными id сдвигает последовательности за max(id)'''
+        for model in (Building, Organization):
+            table = model.__table__
+            await self.session.execute(
+                select(
+                    func.setval(
+                        func.pg_get_serial_sequence(table.name, 'id'),
+                        select(func.coalesce(func.max(table.c.id), 0) + 1).scalar_subquery(),
+                        False
+                    )
+                )
+            )
@@ -1,116 +1,598 @@
-from sqlalchemy import func, select, text
+from datetime import datetime
+from typing import Sequence
+
+from sqlalchemy import (Float, Integer, any_, bindparam, delete, except_,
+                        exists, func, insert, literal_column, or_, select,
+                        text, true, union_all, update)
+from sqlalchemy.dialects.postgresql import ARRAY
 
-from app.models import Activity, Organization, OrganizationPhone, Building
-from app.repositories.base import BaseRepo
 from app.config.settings import settings
+from app.models import (Activity, ActivityClosure, Building, Organization,
+                        OrganizationActivity, OrganizationGridCell,
+                        OrganizationGridDelta, OrganizationPhone,
+                        OrganizationTombstone)
+from app.repositories.base import BaseRepo
+from app.repositories.building import building_geometry, building_mercator
+from app.schemas.geo import MERCATOR_HALF_WORLD, CellRange, grid_cell_size
+from app.schemas.organization import SearchMode
+
+RUSSIAN = literal_column("'russian'")
+# Поля OrganizationOut для страниц, собираемых в JSON на стороне БД
+ORGANIZATION_JSON_FIELDS = ('name', 'phones')
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def phones_array():
+    '''Телефоны организации коррелированным подзапросом, без GROUP BY'''
+    return func.array(
+        select(OrganizationPhone.phone)
+        .where(OrganizationPhone.organization_id == Organization.id)
+        .order_by(OrganizationPhone.id)
+        .scalar_subquery()
+    )
+
+
+def phones_column():
+    '''Телефоны организации для выборки.
+
+    По умолчанию берутся из денормализованной organization.phone_numbers;
+    с PHONES_READ_MODEL=False - подзапросом к organization_phone.
+    '''
+    if settings.PHONES_READ_MODEL:
+        return Organization.phone_numbers.label("phones")
+    return phones_array().label("phones")
+
 
 class OrganizationRepo(BaseRepo[Organization]):
     model_class = Organization
 
 
     async def get_organization_by_id_db(self, org_id: int):
-        phones_agg = func.array_remove(func.array_agg(OrganizationPhone.phone), None).label("phones")
         result = await self.session.execute(
             select(
                 self.model_class.name.label('name'),
-                phones_agg,
+                phones_column(),
             )
-            .outerjoin(self.model_class.phones)
             .where(self.model_class.id == org_id)
-            .group_by(self.model_class.id, self.model_class.name)
         )
         return result.mappings().one_or_none()
 
-    async def get_organization_by_name_db(self, name: str):
-        phones_agg = func.array_remove(func.array_agg(OrganizationPhone.phone), None).label("phones")
+    async def get_organizations_by_ids_db(self, org_ids: Sequence[int]):
+        '''Организации по списку id одним запросом, порядок не гарантирован'''
         result = await self.session.execute(
             select(
+                self.model_class.id.label('id'),
                 self.model_class.name.label('name'),
-                phones_agg
+                phones_column(),
+            )
+            .where(
+                self.model_class.id == any_(
+                    bindparam('organization_ids', list(org_ids), type_=ARRAY(Integer))
+                )
             )
-            .outerjoin(self.model_class.phones)
-            .where(self.model_class.name == name)
-            .group_by(self.model_class.id, self.model_class.name)
         )
         return result.mappings().all()
 
-    async def get_data_by_build_id_db(self, building_id: int):
-        phones_agg = func.array_remove(func.array_agg(OrganizationPhone.phone), None).label("phones")
+    async def get_organization_updated_at_db(self, org_id: int):
+        return await self.session.scalar(
+            select(self.model_class.updated_at).where(self.model_class.id == org_id)
+        )
+
+    async def get_building_organizations_version_db(self, building_id: int):
+        '''Количество организаций в здании и время последнего их изменения.
+
+        Оба значения поддерживают триггеры на organization, время
+        сдвигается и при удалении. None, если здания нет.
+        '''
         result = await self.session.execute(
             select(
+                Building.organization_count.label('count'),
+                Building.organizations_changed_at.label('updated_at'),
+            )
+            .where(Building.id == building_id)
+        )
+        return result.mappings().one_or_none()
+
+    async def get_organization_by_name_db(
+        self,
+        name: str,
+        limit: int,
+        after: tuple | None = None
+    ):
+        org_id = self.model_class.id.label('id')
+        stmt = (
+            select(
+                org_id,
                 self.model_class.name.label('name'),
-                phones_agg
+                phones_column()
             )
-            .outerjoin(self.model_class.phones)
-            .where(self.model_class.building_id == building_id)
-            .group_by(self.model_class.id, self.model_class.name)
+            .where(self.model_class.name == name)
         )
-        return result.all()
-    
-    async def get_data_by_activity_id_db(self, activity_id: int):
-        phones_agg = func.array_remove(func.array_agg(OrganizationPhone.phone), None).label("phones")
-        result = await self.session.execute(
+        return await self.fetch_page(stmt, [org_id], after, limit)
+
+    async def search_organizations_db(
+        self,
+        query: str,
+        mode: SearchMode,
+        limit: int,
+        after: tuple | None = None
+    ):
+        name = self.model_class.name
+        if mode is SearchMode.fulltext:
+            tsquery = func.websearch_to_tsquery(RUSSIAN, query)
+            document = func.to_tsvector(RUSSIAN, name)
+            condition = document.op("@@")(tsquery)
+            rank = func.ts_rank(document, tsquery, type_=Float)
+        else:
+            rank = func.similarity(name, query, type_=Float)
+            if mode is SearchMode.prefix:
+                condition = name.ilike(escape_like(query) + "%", escape="\\")
+            else:
+                # % отбирает по trgm-индексу с порогом pg_trgm.similarity_threshold,
+                # его выставляем из настроек до конца транзакции
+                await self.session.execute(
+                    select(
+                        func.set_config(
+                            'pg_trgm.similarity_threshold',
+                            str(settings.SEARCH_SIMILARITY_THRESHOLD),
+                            True
+                        )
+                    )
+                )
+                condition = name.op("%")(query)
+
+        # Сортировка по убыванию ранга: в ключе ранг с минусом,
+        # чтобы keyset-сравнение кортежей оставалось по возрастанию
+        keys = [(-rank).label('sort_rank'), self.model_class.id.label('id')]
+        stmt = (
             select(
-                self.model_class.name,
-                phones_agg
+                *keys,
+                name.label('name'),
+                rank.label('rank'),
+                phones_column()
             )
-            .join(self.model_class.activities)
-            .outerjoin(self.model_class.phones)
-            .where(Activity.id == activity_id)
-            .group_by(self.model_class.id, self.model_class.name)
+            .where(condition)
         )
+        return await self.fetch_page(stmt, keys, after, limit)
 
-        return result.all()
-    
-    async def organizations_by_nested_activity_db(self, activity_id):
-        phones_agg = func.array_remove(func.array_agg(OrganizationPhone.phone), None).label("phones")
-        activity_cte = (
-            select(Activity.id)
-            .where(Activity.id == activity_id)
-            .cte(recursive=True)
+    def _building_select(self, building_id: int):
+        org_id = self.model_class.id.label('id')
+        stmt = (
+            select(
+                org_id,
+                self.model_class.name.label('name'),
+                phones_column()
+            )
+            .where(self.model_class.building_id == building_id)
         )
+        return stmt, [org_id]
+
+    async def get_data_by_build_id_db(
+        self,
+        building_id: int,
+        limit: int,
+        after: tuple | None = None
+    ):
+        stmt, keys = self._building_select(building_id)
+        return await self.fetch_page(stmt, keys, after, limit)
 
-        activity_alias = Activity.__table__.alias()
-        activity_cte = activity_cte.union_all(
-            select(activity_alias.c.id)
-            .where(activity_alias.c.parent_id == activity_cte.c.id)
+    async def get_data_by_build_id_json_db(
+        self,
+        building_id: int,
+        limit: int,
+        after: tuple | None = None
+    ):
+        stmt, keys = self._building_select(building_id)
+        return await self.fetch_json_page(stmt, keys, after, limit, ORGANIZATION_JSON_FIELDS)
+
+    def _activity_select(self, activity_id: int):
+        org_id = self.model_class.id.label('id')
+        stmt = (
+            select(
+                org_id,
+                self.model_class.name.label('name'),
+                phones_column()
+            )
+            .join(OrganizationActivity, OrganizationActivity.organization_id == self.model_class.id)
+            .where(OrganizationActivity.activity_id == activity_id)
         )
+        return stmt, [org_id]
+
+    async def get_data_by_activity_id_db(
+        self,
+        activity_id: int,
+        limit: int,
+        after: tuple | None = None
+    ):
+        stmt, keys = self._activity_select(activity_id)
+        return await self.fetch_page(stmt, keys, after, limit)
 
+    async def get_data_by_activity_id_json_db(
+        self,
+        activity_id: int,
+        limit: int,
+        after: tuple | None = None
+    ):
+        stmt, keys = self._activity_select(activity_id)
+        return await self.fetch_json_page(stmt, keys, after, limit, ORGANIZATION_JSON_FIELDS)
+
+    def _nested_activity_select(self):
+        # Одна организация встречается по разу на каждую свою деятельность
+        # из поддерева, поэтому ключ страницы составной
+        keys = [self.model_class.id.label('id'), Activity.id.label('activity_id')]
         stmt = (
             select(
+                *keys,
                 self.model_class.name.label('organization_name'),
                 Activity.name.label('activity_name'),
-                phones_agg,
+                phones_column(),
             )
-            .join(self.model_class.activities)
-            .outerjoin(self.model_class.phones)
-            .where(Activity.id.in_(select(activity_cte.c.id)))
-            .group_by(self.model_class.id, self.model_class.name, Activity.name)
+            .join(OrganizationActivity, OrganizationActivity.organization_id == self.model_class.id)
+            .join(Activity, Activity.id == OrganizationActivity.activity_id)
         )
+        return stmt, keys
 
-        result = await self.session.execute(stmt)
-        return result.mappings().all()
+    async def organizations_by_nested_activity_db(
+        self,
+        activity_id,
+        limit: int,
+        after: tuple | None = None
+    ):
+        stmt, keys = self._nested_activity_select()
+        stmt = (
+            stmt
+            .join(ActivityClosure, ActivityClosure.descendant_id == OrganizationActivity.activity_id)
+            .where(ActivityClosure.ancestor_id == activity_id)
+        )
+        return await self.fetch_page(stmt, keys, after, limit)
+
+    async def organizations_by_activity_ids_db(
+        self,
+        activity_ids: Sequence[int],
+        limit: int,
+        after: tuple | None = None
+    ):
+        '''То же, что organizations_by_nested_activity_db, но поддерево уже известно'''
+        stmt, keys = self._nested_activity_select()
+        stmt = stmt.where(
+            OrganizationActivity.activity_id == any_(
+                bindparam('activity_ids', list(activity_ids), type_=ARRAY(Integer))
+            )
+        )
+        return await self.fetch_page(stmt, keys, after, limit)
 
 
+    def _nearby_select(self, point_geog, radius_m: float):
+        org_id = Organization.id.label("id")
+        stmt = (
+            select(
+                org_id,
+                Organization.name.label("name"),
+                phones_column(),
+            )
+            .join(Organization.building)
+            .where(func.ST_DWithin(Building.geog, point_geog, radius_m))
+        )
+        return stmt, [org_id]
+
     async def get_organizations_nearby_db(
         self,
         point_geog,
-        building_point_geog,
-        radius_m=settings.DEFAULT_RADIUS
+        radius_m=settings.DEFAULT_RADIUS,
+        limit: int = settings.PAGE_SIZE_DEFAULT,
+        after: tuple | None = None
+    ):
+        stmt, keys = self._nearby_select(point_geog, radius_m)
+        return await self.fetch_page(stmt, keys, after, limit)
+
+    async def get_organizations_nearby_json_db(
+        self,
+        point_geog,
+        radius_m=settings.DEFAULT_RADIUS,
+        limit: int = settings.PAGE_SIZE_DEFAULT,
+        after: tuple | None = None
     ):
-        phones_agg = func.array_remove(func.array_agg(OrganizationPhone.phone), None).label("phones")
+        stmt, keys = self._nearby_select(point_geog, radius_m)
+        return await self.fetch_json_page(stmt, keys, after, limit, ORGANIZATION_JSON_FIELDS)
+
+    async def get_organizations_within_db(
+        self,
+        area_geom,
+        limit: int,
+        after: tuple | None = None,
+        max_results: int = settings.AREA_SEARCH_MAX_RESULTS
+    ):
+        '''Организации в зданиях внутри area_geom (геометрия SRID 4326).
+
+        По всем страницам вместе отдаётся не больше max_results строк:
+        сколько уже отдано, считается по строкам до after.
+        '''
+        # ST_Intersects сам отбирает кандидатов по ix_building_geom
+        inside = func.ST_Intersects(building_geometry(), area_geom)
+        org_id = Organization.id.label("id")
+        stmt = (
+            select(
+                org_id,
+                Organization.name.label("name"),
+                phones_column(),
+            )
+            .join(Organization.building)
+            .where(inside)
+        )
+        rows, next_key = await self.fetch_page(stmt, [org_id], after, limit)
+
+        seen = 0
+        if after is not None:
+            previous = (
+                select(Organization.id)
+                .join(Organization.building)
+                .where(inside, Organization.id <= after[0])
+                .limit(max_results)
+                .subquery()
+            )
+            seen = await self.session.scalar(select(func.count()).select_from(previous))
+        remaining = max(max_results - seen, 0)
+        if len(rows) >= remaining:
+            return rows[:remaining], None
+        return rows, next_key
+
+    async def get_nearest_organizations_db(self, point_geog, k: int):
+        result = await self.session.execute(
+            select(
+                Organization.id.label("id"),
+                Organization.name.label("name"),
+                phones_column(),
+                func.ST_Distance(Building.geog, point_geog).label("distance_m"),
+            )
+            .join(Organization.building)
+            .where(Building.geog.is_not(None))
+            .order_by(Building.geog.op("<->")(point_geog), Organization.id)
+            .limit(k)
+        )
+        return result.mappings().all()
+
+    def _grid_cells_union(self, *where_for):
+        '''organization_grid вместе с ещё не свёрнутыми дельтами'''
+        return union_all(*(
+            select(
+                table.zoom, table.cell_x, table.cell_y,
+                table.org_count, table.sum_lon, table.sum_lat
+            )
+            .where(*where_for(table))
+            for table in (OrganizationGridCell, OrganizationGridDelta)
+        )).subquery()
+
+    async def get_grid_clusters_db(self, zoom: int, cell_x: CellRange, cell_y: CellRange):
+        '''Кластеры из organization_grid и её дельт, без чтения организаций'''
+        cells = self._grid_cells_union(lambda table: (
+            table.zoom == zoom,
+            table.cell_x.between(*cell_x),
+            table.cell_y.between(*cell_y),
+        ))
+        org_count = func.sum(cells.c.org_count)
         result = await self.session.execute(
-                select(
-                    Organization.name.label("name"),
-                    phones_agg,
+            select(
+                (func.sum(cells.c.sum_lon) / org_count).label('lon'),
+                (func.sum(cells.c.sum_lat) / org_count).label('lat'),
+                org_count.label('count'),
+            )
+            .group_by(cells.c.cell_y, cells.c.cell_x)
+            .having(org_count > 0)
+            .order_by(cells.c.cell_y, cells.c.cell_x)
+        )
+        return result.mappings().all()
+
+    async def get_live_clusters_db(
+        self,
+        zoom: int,
+        cell_x: CellRange,
+        cell_y: CellRange,
+        activity_ids: Sequence[int]
+    ):
+        '''Кластеры по той же сетке, но только организаций с деятельностями из activity_ids'''
+        size = grid_cell_size(zoom)
+        point = building_mercator()
+        column = func.floor((func.ST_X(point) + MERCATOR_HALF_WORLD) / size)
+        row = func.floor((MERCATOR_HALF_WORLD - func.ST_Y(point)) / size)
+        # Охват диапазона ячеек, чтобы отбор шёл по ix_building_geom_3857
+        area = func.ST_MakeEnvelope(
+            cell_x[0] * size - MERCATOR_HALF_WORLD,
+            MERCATOR_HALF_WORLD - (cell_y[1] + 1) * size,
+            (cell_x[1] + 1) * size - MERCATOR_HALF_WORLD,
+            MERCATOR_HALF_WORLD - cell_y[0] * size,
+            3857,
+        )
+        result = await self.session.execute(
+            select(
+                func.avg(Building.longitude).label('lon'),
+                func.avg(Building.latitude).label('lat'),
+                func.count().label('count'),
+            )
+            .select_from(Organization)
+            .join(Organization.building)
+            .where(
+                point.op('&&')(area),
+                exists().where(
+                    OrganizationActivity.organization_id == Organization.id,
+                    OrganizationActivity.activity_id == any_(
+                        bindparam('activity_ids', list(activity_ids), type_=ARRAY(Integer))
+                    ),
+                ),
+            )
+            .group_by(column, row)
+            .order_by(row, column)
+        )
+        return result.mappings().all()
+
+    def _grid_cells_select(self):
+        '''organization_grid, посчитанная заново по организациям'''
+        cells = (
+            func.organization_grid_cells(Building.longitude, Building.latitude)
+            .table_valued('zoom', 'cell_x', 'cell_y')
+            .lateral('cells')
+        )
+        return (
+            select(
+                cells.c.zoom,
+                cells.c.cell_x,
+                cells.c.cell_y,
+                func.count().label('org_count'),
+                func.sum(Building.longitude).label('sum_lon'),
+                func.sum(Building.latitude).label('sum_lat'),
+            )
+            .select_from(Organization)
+            .join(Organization.building)
+            .join(cells, true())
+            .where(Building.longitude.is_not(None), Building.latitude.is_not(None))
+            .group_by(cells.c.zoom, cells.c.cell_x, cells.c.cell_y)
+        )
+
+    async def rebuild_grid_db(self):
+        '''Полностью пересобирает organization_grid, дельты отбрасываются'''
+        cell = OrganizationGridCell
+        await self.session.execute(delete(OrganizationGridDelta))
+        await self.session.execute(delete(cell))
+        result = await self.session.execute(
+            insert(cell).from_select(
+                ['zoom', 'cell_x', 'cell_y', 'org_count', 'sum_lon', 'sum_lat'],
+                self._grid_cells_select()
+            )
+        )
+        return result.rowcount
+
+    async def fold_grid_db(self, batch_size: int) -> int:
+        '''Переносит до batch_size дельт в organization_grid.
+
+        0 - дельт нет или их сейчас сворачивает другая транзакция.
+        '''
+        return await self.session.scalar(select(func.organization_grid_fold(batch_size)))
+
+    async def get_grid_drift_db(self):
+        '''Ячейки, в которых organization_grid с дельтами разошлась с организациями'''
+        expected = self._grid_cells_select().subquery()
+        expected = select(expected.c.zoom, expected.c.cell_x, expected.c.cell_y, expected.c.org_count)
+        cells = self._grid_cells_union(lambda table: ())
+        org_count = func.sum(cells.c.org_count)
+        actual = (
+            select(cells.c.zoom, cells.c.cell_x, cells.c.cell_y, org_count)
+            .group_by(cells.c.zoom, cells.c.cell_x, cells.c.cell_y)
+            .having(org_count != 0)
+        )
+        missing = except_(expected, actual).subquery()
+        extra = except_(actual, expected).subquery()
+        result = await self.session.execute(
+            select(
+                select(func.count()).select_from(missing).scalar_subquery().label('missing'),
+                select(func.count()).select_from(extra).scalar_subquery().label('extra'),
+            )
+        )
+        return result.mappings().one()
+
+    async def stream_export_db(
+        self,
+        fetch_size: int,
+        building_id: int | None = None,
+        activity_ids: Sequence[int] | None = None,
+        updated_since: datetime | None = None
+    ):
+        '''Все организации с адресом, телефонами и деятельностями.
+
+        Строки читаются серверным курсором порциями по fetch_size,
+        см. AsyncResult.partitions().
+        '''
+        stmt = (
+            select(
+                Organization.id.label("id"),
+                Organization.name.label("name"),
+                Organization.updated_at.label("updated_at"),
+                Building.id.label("building_id"),
+                Building.city.label("city"),
+                Building.street.label("street"),
+                Building.house.label("house"),
+                Building.office.label("office"),
+                Building.latitude.label("latitude"),
+                Building.longitude.label("longitude"),
+                phones_column(),
+                func.array(
+                    select(OrganizationActivity.activity_id)
+                    .where(OrganizationActivity.organization_id == Organization.id)
+                    .order_by(OrganizationActivity.activity_id)
+                    .scalar_subquery()
+                ).label("activity_ids"),
+            )
+            .join(Organization.building)
+            .order_by(Organization.id)
+        )
+        if building_id is not None:
+            stmt = stmt.where(Organization.building_id == building_id)
+        if activity_ids is not None:
+            stmt = stmt.where(
+                exists().where(
+                    OrganizationActivity.organization_id == Organization.id,
+                    OrganizationActivity.activity_id == any_(
+                        bindparam('activity_ids', list(activity_ids), type_=ARRAY(Integer))
+                    ),
                 )
-                .join(Organization.building)
-                .outerjoin(Organization.phones)
-                .where(
-                    Building.latitude.is_not(None),
-                    Building.longitude.is_not(None),
-                    func.ST_DWithin(building_point_geog, point_geog, radius_m),
+            )
+        if updated_since is not None:
+            # Смена адреса здания тоже должна попасть в выгрузку
+            stmt = stmt.where(
+                or_(
+                    Organization.updated_at >= updated_since,
+                    Organization.building_id.in_(
+                        select(Building.id).where(Building.updated_at >= updated_since)
+                    ),
                 )
-                .group_by(Organization.id, Organization.name)
             )
-        return result.all()
+        return await self.session.stream(stmt.execution_options(yield_per=fetch_size))
+
+    async def stream_deleted_db(
+        self,
+        fetch_size: int,
+        deleted_since: datetime,
+        building_id: int | None = None
+    ):
+        '''Организации, удалённые начиная с deleted_since'''
+        stmt = (
+            select(
+                OrganizationTombstone.id.label("id"),
+                OrganizationTombstone.building_id.label("building_id"),
+                OrganizationTombstone.deleted_at.label("updated_at"),
+            )
+            .where(OrganizationTombstone.deleted_at >= deleted_since)
+            .order_by(OrganizationTombstone.id)
+        )
+        if building_id is not None:
+            stmt = stmt.where(OrganizationTombstone.building_id == building_id)
+        return await self.session.stream(stmt.execution_options(yield_per=fetch_size))
+
+    async def get_export_checkpoint_db(self, margin_seconds: float) -> datetime:
+        '''Момент, с которого следующая выгрузка не пропустит изменений.
+
+        updated_at - время начала изменившей строку транзакции, поэтому
+        транзакция, которая идёт сейчас, закоммитит строки с updated_at
+        в прошлом. Точка не позже начала самой старой открытой транзакции
+        базы, с запасом margin_seconds на отставание реплик.
+        '''
+        return await self.session.scalar(
+            text(
+                "SELECT least(now(), min(xact_start)) - make_interval(secs => :margin) "
+                "FROM pg_stat_activity "
+                "WHERE datname = current_database() AND pid <> pg_backend_pid()"
+            ),
+            {"margin": margin_seconds}
+        )
+
+    async def refresh_phone_numbers_db(self, only_mismatched: bool = True):
+        '''Пересчитывает organization.phone_numbers по organization_phone.
+
+        Возвращает число исправленных организаций.
+        '''
+        stmt = update(self.model_class).values(phone_numbers=phones_array())
+        if only_mismatched:
+            stmt = stmt.where(self.model_class.phone_numbers.is_distinct_from(phones_array()))
+        result = await self.session.execute(stmt)
+        return result.rowcount
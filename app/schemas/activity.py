@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+
+class ActivityTreeOut(BaseModel):
+    id: int
+    name: str
+    level: int
+    # Организации с этой деятельностью
+    direct_count: int
+    # Организации с деятельностью из поддерева, каждая один раз
+    subtree_count: int
+    children: list["ActivityTreeOut"] = []
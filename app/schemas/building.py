@@ -0,0 +1,52 @@
+from enum import Enum
+from typing import Literal
+
+from pydantic import BaseModel
+
+from app.schemas.geo import Position
+
+
+class BuildingOut(BaseModel):
+    id: int
+    city: str
+    street: str
+    house: str
+    office: str | None
+    latitude: float | None
+    longitude: float | None
+    organization_count: int
+
+
+class CoordinatesFormat(str, Enum):
+    packed = "packed"
+    geojson = "geojson"
+
+
+class BuildingCoordinatesOut(BaseModel):
+    '''Все здания плоскими массивами: i-е здание - ids[i],
+    coordinates[2i] (долгота), coordinates[2i + 1] (широта)'''
+    ids: list[int]
+    coordinates: list[float]
+    organization_counts: list[int]
+
+
+class GeoJSONPoint(BaseModel):
+    type: Literal["Point"]
+    coordinates: Position
+
+
+class BuildingFeatureProperties(BaseModel):
+    organization_count: int
+
+
+class BuildingFeature(BaseModel):
+    type: Literal["Feature"]
+    id: int
+    geometry: GeoJSONPoint
+    properties: BuildingFeatureProperties
+
+
+class BuildingFeatureCollectionOut(BaseModel):
+    '''Все здания как GeoJSON FeatureCollection точек'''
+    type: Literal["FeatureCollection"]
+    features: list[BuildingFeature]
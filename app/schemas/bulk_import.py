@@ -0,0 +1,34 @@
+from enum import Enum
+
+from pydantic import BaseModel, Field
+
+
+class ImportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+class ImportResultOut(BaseModel):
+    job: str
+    status: str
+    # Всего записей, загруженных по этой задаче (с учётом прошлых запусков)
+    processed_records: int
+    # Сколько записей загружено в этом запуске
+    imported_records: int
+    batches: int
+    # Затронутые строки по таблицам: вставленные, изменённые и удалённые
+    rows: dict[str, int]
+    # Пропущенные ссылки организаций на неизвестные activity_id
+    skipped_activities: int
+
+
+class ImportJobOut(BaseModel):
+    '''Состояние задачи загрузки из import_job'''
+    job: str = Field(validation_alias='name')
+    # running | failed | done
+    status: str
+    processed_records: int
+    error: str | None = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,67 @@
+import math
+from dataclasses import dataclass
+from typing import Literal
+
+from pydantic import BaseModel, field_validator
+
+Position = tuple[float, float]
+
+# Сетка кластеров, как в organization_grid_cells (миграция c3f8a61d2e47):
+# ячейка масштаба zoom - тайл масштаба zoom + GRID_SUBDIVISION
+GRID_MAX_ZOOM = 16
+GRID_SUBDIVISION = 2
+MERCATOR_HALF_WORLD = 20037508.342789244
+MERCATOR_MAX_LAT = 85.0511
+
+CellRange = tuple[int, int]
+
+
+@dataclass(frozen=True)
+class BBox:
+    min_lon: float
+    min_lat: float
+    max_lon: float
+    max_lat: float
+
+
+def grid_cell_size(zoom: int) -> float:
+    return 2 * MERCATOR_HALF_WORLD / 2 ** (zoom + GRID_SUBDIVISION)
+
+
+def grid_cell_range(bbox: BBox, zoom: int) -> tuple[CellRange, CellRange]:
+    '''Диапазоны cell_x и cell_y ячеек сетки, покрывающих bbox'''
+    size = grid_cell_size(zoom)
+    last = 2 ** (zoom + GRID_SUBDIVISION) - 1
+
+    def cell_x(lon: float) -> int:
+        x = lon * MERCATOR_HALF_WORLD / 180
+        return min(max(math.floor((x + MERCATOR_HALF_WORLD) / size), 0), last)
+
+    def cell_y(lat: float) -> int:
+        lat = max(min(lat, MERCATOR_MAX_LAT), -MERCATOR_MAX_LAT)
+        y = math.log(math.tan(math.pi / 4 + math.radians(lat) / 2)) * MERCATOR_HALF_WORLD / math.pi
+        return min(max(math.floor((MERCATOR_HALF_WORLD - y) / size), 0), last)
+
+    return (
+        (cell_x(bbox.min_lon), cell_x(bbox.max_lon)),
+        (cell_y(bbox.max_lat), cell_y(bbox.min_lat)),
+    )
+
+
+class GeoJSONPolygon(BaseModel):
+    type: Literal["Polygon"]
+    # Первое кольцо внешнее, остальные - дырки; координаты [lon, lat]
+    coordinates: list[list[Position]]
+
+    @field_validator("coordinates")
+    @classmethod
+    def check_rings(cls, rings: list[list[Position]]):
+        if not rings:
+            raise ValueError("Полигон должен содержать хотя бы одно кольцо")
+        for ring in rings:
+            if len(ring) < 4 or ring[0] != ring[-1]:
+                raise ValueError("Кольцо полигона должно быть замкнутым и содержать не меньше 4 точек")
+            for lon, lat in ring:
+                if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+                    raise ValueError("Координаты вне допустимого диапазона")
+        return rings
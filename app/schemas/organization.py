@@ -1,4 +1,9 @@
-from pydantic import BaseModel
+from enum import Enum
+from typing import Annotated
+
+from pydantic import BaseModel, Field
+
+from app.config.settings import settings
 
 
 class OrganizationOut(BaseModel):
@@ -15,3 +20,44 @@ class OrganizationActivityOut(BaseModel):
     organization: str
     activity: str
     phones: list[str] | None
+
+
+class OrganizationDistanceOut(BaseModel):
+    name: str
+    phones: list[str]
+    distance_m: float
+
+
+class SearchMode(str, Enum):
+    prefix = "prefix"
+    fuzzy = "fuzzy"
+    fulltext = "fulltext"
+
+
+class OrganizationSearchOut(BaseModel):
+    name: str
+    phones: list[str]
+    rank: float
+
+
+# Первичные ключи - integer, больший id PostgreSQL не примет в параметре
+ID_MAX = 2 ** 31 - 1
+OrganizationId = Annotated[int, Field(ge=1, le=ID_MAX)]
+
+
+class OrganizationBatchIn(BaseModel):
+    ids: list[OrganizationId] = Field(..., min_length=1, max_length=settings.BATCH_MAX_IDS)
+
+
+class OrganizationBatchItem(BaseModel):
+    id: int
+    found: bool
+    # None, если организации с таким id нет
+    organization: OrganizationOut | None = None
+
+
+class OrganizationClusterOut(BaseModel):
+    # Центроид организаций ячейки
+    lat: float
+    lon: float
+    count: int
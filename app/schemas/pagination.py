@@ -0,0 +1,43 @@
+import base64
+import json
+from typing import Generic, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    # None - это последняя страница
+    next_cursor: str | None = None
+
+
+def encode_cursor(keys: tuple | None) -> str | None:
+    '''Непрозрачный cursor из значений ключа последней строки страницы'''
+    if keys is None:
+        return None
+    raw = json.dumps(list(keys), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        keys = json.loads(raw)
+    except ValueError as exc:
+        raise InvalidCursorError(cursor) from exc
+    if (
+        not isinstance(keys, list)
+        or not keys
+        or not all(
+            isinstance(key, (int, float, str)) and not isinstance(key, bool)
+            for key in keys
+        )
+    ):
+        raise InvalidCursorError(cursor)
+    return tuple(keys)
@@ -0,0 +1,47 @@
+'''Запуск приложения в production: python -m app.server
+
+Число процессов берётся из WORKERS. При WORKERS > 1 метрики
+prometheus_client пишутся в общий каталог PROMETHEUS_MULTIPROC_DIR,
+и /metrics любого процесса отдаёт сумму по всем процессам.
+Переменную нужно выставить до импорта prometheus_client, поэтому
+здесь импортируются только настройки.
+'''
+import logging
+import os
+import shutil
+
+import uvicorn
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def prepare_multiprocess_dir() -> str:
+    '''Создаёт пустой каталог метрик: файлы прошлого запуска дали бы лишние значения'''
+    directory = os.environ.setdefault(
+        'PROMETHEUS_MULTIPROC_DIR', settings.PROMETHEUS_MULTIPROC_DIR
+    )
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    if settings.WORKERS > 1:
+        directory = prepare_multiprocess_dir()
+        logger.info('Запуск %s процессов, метрики в %s', settings.WORKERS, directory)
+    uvicorn.run(
+        'app.main:app',
+        host=settings.APP_HOST,
+        port=settings.APP_PORT,
+        workers=settings.WORKERS,
+        proxy_headers=True,
+        # Время на завершение запросов перед остановкой процесса
+        timeout_graceful_shutdown=30,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import cached
+from app.cache.single_flight import coalesced
+from app.repositories.activity import ActivityRepo
+from app.schemas.geo import BBox
+from app.services.activity_tree import ActivityTree, activity_tree_cache
+from app.services.organization import bbox_geometry
+
+
+def tree_ids(nodes) -> list[int]:
+    ids = []
+    for node in nodes:
+        ids.append(node['id'])
+        ids.extend(tree_ids(node['children']))
+    return ids
+
+
+def activity_tree_tags(arguments, result):
+    tags = ['activities', *(f'activity:{node_id}' for node_id in tree_ids(result))]
+    if arguments['building_id'] is not None:
+        tags.append(f'building:{arguments["building_id"]}')
+    if arguments['bbox'] is not None:
+        tags.extend(('buildings', 'organizations'))
+    return tags
+
+
+class ActivityService:
+
+    @coalesced()
+    @cached(tags=activity_tree_tags)
+    async def get_activity_tree(
+        self,
+        session: AsyncSession,
+        building_id: int | None = None,
+        bbox: BBox | None = None
+    ):
+        '''Дерево деятельностей с числом организаций у каждого узла.
+
+        Без building_id и bbox счётчики берутся из activity_org_count,
+        иначе считаются запросом по организациям здания/области.
+        '''
+        repo = ActivityRepo(session)
+        tree = activity_tree_cache.tree
+        if tree is None:
+            tree = ActivityTree.build(await repo.get_tree_nodes_db(), version=0)
+
+        if building_id is None and bbox is None:
+            counts = await repo.get_org_counts_db()
+        else:
+            area = bbox_geometry(bbox) if bbox is not None else None
+            counts = await repo.get_scoped_org_counts_db(building_id, area)
+
+        def node(activity_id: int) -> dict:
+            activity = tree.nodes[activity_id]
+            direct_count, subtree_count = counts.get(activity_id, (0, 0))
+            return {
+                'id': activity.id,
+                'name': activity.name,
+                'level': activity.level,
+                'direct_count': direct_count,
+                'subtree_count': subtree_count,
+                'children': [node(child_id) for child_id in tree.children[activity_id]],
+            }
+
+        return [
+            node(activity.id) for activity in tree.nodes.values()
+            if activity.parent_id is None
+        ]
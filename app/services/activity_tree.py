@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from time import perf_counter
+from types import MappingProxyType
+from typing import Iterable, Mapping
+
+from app.config.database import async_session
+from app.config.settings import settings
+from app.metrics import ACTIVITY_TREE_LOOKUPS, ACTIVITY_TREE_REBUILD_SECONDS
+from app.repositories.activity import ActivityRepo
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class ActivityNode:
+    id: int
+    name: str
+    level: int
+    parent_id: int | None
+
+
+@dataclass(frozen=True)
+class ActivityTree:
+    '''Неизменяемый снимок дерева деятельностей'''
+    version: int
+    nodes: Mapping[int, ActivityNode]
+    children: Mapping[int, tuple[int, ...]]
+    # Поддерево узла, включая сам узел
+    descendants: Mapping[int, tuple[int, ...]]
+
+    @classmethod
+    def build(cls, rows: Iterable, version: int) -> "ActivityTree":
+        nodes = {
+            row.id: ActivityNode(row.id, row.name, row.level, row.parent_id)
+            for row in rows
+        }
+        children: dict[int, list[int]] = {node_id: [] for node_id in nodes}
+        for node in nodes.values():
+            if node.parent_id in children:
+                children[node.parent_id].append(node.id)
+
+        descendants: dict[int, tuple[int, ...]] = {}
+
+        def collect(node_id: int) -> tuple[int, ...]:
+            if node_id not in descendants:
+                subtree = [node_id]
+                for child_id in children[node_id]:
+                    subtree.extend(collect(child_id))
+                descendants[node_id] = tuple(subtree)
+            return descendants[node_id]
+
+        for node_id in nodes:
+            collect(node_id)
+
+        return cls(
+            version=version,
+            nodes=MappingProxyType(nodes),
+            children=MappingProxyType(
+                {node_id: tuple(ids) for node_id, ids in children.items()}
+            ),
+            descendants=MappingProxyType(descendants),
+        )
+
+    def path(self, activity_id: int) -> tuple[str, ...]:
+        '''Названия от корня до узла'''
+        names = []
+        node = self.nodes.get(activity_id)
+        while node is not None:
+            names.append(node.name)
+            node = self.nodes.get(node.parent_id)
+        return tuple(reversed(names))
+
+
+class ActivityTreeCache:
+    '''Дерево деятельностей в памяти процесса.
+
+    Снимок заменяется целиком, поэтому читатели никогда не видят
+    частично обновлённое дерево. Пересборка запускается по NOTIFY
+    из БД и раз в ACTIVITY_TREE_REFRESH_SECONDS на случай потерянного
+    уведомления.
+    '''
+
+    def __init__(self) -> None:
+        self._tree: ActivityTree | None = None
+        self._version = 0
+        self._stale = False
+        self._rebuild_task: asyncio.Task | None = None
+        self._refresh_task: asyncio.Task | None = None
+
+    @property
+    def tree(self) -> ActivityTree | None:
+        return self._tree
+
+    def descendant_ids(self, activity_id: int) -> tuple[int, ...] | None:
+        '''Id поддерева или None, если ответа нет в кэше'''
+        tree = self._tree
+        if tree is None or activity_id not in tree.descendants:
+            ACTIVITY_TREE_LOOKUPS.labels(result='miss').inc()
+            return None
+        ACTIVITY_TREE_LOOKUPS.labels(result='hit').inc()
+        return tree.descendants[activity_id]
+
+    async def rebuild(self) -> ActivityTree:
+        started = perf_counter()
+        async with async_session() as session:
+            rows = await ActivityRepo(session).get_tree_nodes_db()
+        self._version += 1
+        tree = ActivityTree.build(rows, self._version)
+        self._tree = tree
+        ACTIVITY_TREE_REBUILD_SECONDS.observe(perf_counter() - started)
+        return tree
+
+    def request_rebuild(self, payload: str | None = None) -> None:
+        self._stale = True
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = asyncio.create_task(self._rebuild_while_stale())
+
+    async def _rebuild_while_stale(self) -> None:
+        # Уведомления, пришедшие во время пересборки, дают ещё один проход
+        while self._stale:
+            self._stale = False
+            try:
+                await self.rebuild()
+            except Exception:
+                logger.exception('Не удалось пересобрать дерево деятельностей')
+                return
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.ACTIVITY_TREE_REFRESH_SECONDS)
+            self.request_rebuild()
+
+    async def start(self) -> None:
+        try:
+            await self.rebuild()
+        except Exception:
+            # Приложение работает и без кэша, запросы уйдут в activity_closure
+            logger.exception('Не удалось загрузить дерево деятельностей')
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        for task in (self._refresh_task, self._rebuild_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._refresh_task = None
+        self._rebuild_task = None
+
+
+activity_tree_cache = ActivityTreeCache()
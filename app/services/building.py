@@ -0,0 +1,67 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import cached
+from app.cache.single_flight import coalesced
+from app.repositories.building import BuildingRepo
+from app.schemas.building import CoordinatesFormat
+
+
+def building_page_tags(arguments, result):
+    rows, _ = result
+    return ['buildings', *(f'building:{row["id"]}' for row in rows)]
+
+
+def building_id_tags(arguments, result):
+    return [f'building:{arguments["building_id"]}']
+
+
+def coordinates_tags(arguments, result):
+    # organization_count меняется вместе с организациями
+    return ['buildings', 'organizations']
+
+
+class BuildingService:
+
+    @coalesced()
+    @cached(tags=building_page_tags)
+    async def get_buildings(
+        self,
+        session: AsyncSession,
+        city: str | None,
+        street: str | None,
+        limit: int,
+        after: tuple | None = None
+    ):
+        repo = BuildingRepo(session)
+        return await repo.get_buildings_db(city, street, limit, after)
+
+    @coalesced()
+    @cached(tags=building_id_tags)
+    async def get_building(self, session: AsyncSession, building_id: int):
+        repo = BuildingRepo(session)
+        return await repo.get_building_db(building_id)
+
+    @coalesced()
+    @cached(tags=coordinates_tags)
+    async def get_building_coordinates(self, session: AsyncSession, coordinates_format: CoordinatesFormat):
+        '''Все здания с координатами: плоские массивы или GeoJSON FeatureCollection'''
+        repo = BuildingRepo(session)
+        rows = await repo.get_building_coordinates_db()
+        if coordinates_format is CoordinatesFormat.geojson:
+            return {
+                'type': 'FeatureCollection',
+                'features': [
+                    {
+                        'type': 'Feature',
+                        'id': row.id,
+                        'geometry': {'type': 'Point', 'coordinates': [row.longitude, row.latitude]},
+                        'properties': {'organization_count': row.organization_count},
+                    }
+                    for row in rows
+                ],
+            }
+        return {
+            'ids': [row.id for row in rows],
+            'coordinates': [value for row in rows for value in (row.longitude, row.latitude)],
+            'organization_counts': [row.organization_count for row in rows],
+        }
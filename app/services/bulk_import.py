@@ -0,0 +1,324 @@
+'''Массовая загрузка организаций из CSV или NDJSON.
+
+Одна запись - организация вместе со зданием, телефонами и деятельностями:
+id, name, building_id, city, street, house, office, latitude, longitude,
+phones, activity_ids. В CSV phones и activity_ids перечисляются через ';',
+в NDJSON могут быть и массивами. Если city пустой, здание не загружается
+и должно уже быть в базе. Пустые street, house, office, latitude и
+longitude у существующего здания не затирают сохранённые значения. Деятельности не создаются, неизвестные
+activity_id пропускаются.
+
+Вход читается пачками по batch_size записей. Каждая пачка идёт через
+COPY во временные таблицы и upsert в одной транзакции вместе со сдвигом
+контрольной точки в import_job, так что после сбоя повторный запуск
+с тем же именем задачи продолжает с первой незагруженной записи.
+Имя задачи по умолчанию - имя файла и начало его sha256 (default_job_name):
+другой файл с тем же именем - другая задача. Хэш хранится в
+import_job.source_hash, и продолжить задачу с другим файлом нельзя.
+
+Кэш ответов отдельно не сбрасывается: COPY и upsert проходят через
+триггеры cache_invalidate, и уведомление получают все процессы.
+'''
+import asyncio
+import csv
+import hashlib
+import itertools
+import json
+import logging
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import PurePath
+from time import perf_counter
+from typing import Any, BinaryIO, Iterator, TextIO
+
+from app.config.database import async_session
+from app.config.settings import settings
+from app.metrics import (IMPORT_BATCH_SECONDS, IMPORT_BATCHES, IMPORT_RECORDS,
+                         IMPORT_ROWS, IMPORT_SKIPPED_ACTIVITIES)
+from app.models import ImportJob
+from app.repositories.bulk_import import ImportRepo
+from app.schemas.bulk_import import ImportFormat, ImportResultOut
+
+logger = logging.getLogger(__name__)
+
+# Размер куска при копировании и хэшировании файла
+READ_CHUNK_SIZE = 1024 * 1024
+
+EXTENSIONS = {
+    '.csv': ImportFormat.csv,
+    '.ndjson': ImportFormat.ndjson,
+    '.jsonl': ImportFormat.ndjson,
+}
+
+
+class ImportFormatError(ValueError):
+    '''Некорректные входные данные'''
+
+
+class ImportConflictError(RuntimeError):
+    '''Задачу с тем же именем загружает кто-то ещё или она начата с другим файлом'''
+
+
+def detect_format(filename: str | None) -> ImportFormat:
+    suffix = PurePath(filename or '').suffix.lower()
+    if suffix not in EXTENSIONS:
+        raise ImportFormatError(f'Не удалось определить формат по имени файла {filename!r}')
+    return EXTENSIONS[suffix]
+
+
+def read_records(stream: TextIO, fmt: ImportFormat) -> Iterator[dict[str, Any]]:
+    if fmt is ImportFormat.csv:
+        yield from csv.DictReader(stream)
+        return
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise ImportFormatError(f'Строка {line_number}: некорректный JSON')
+
+
+def _text(value) -> str | None:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _list(value) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(';')
+    return [item for item in (_text(item) for item in value) if item]
+
+
+@dataclass
+class ImportBatch:
+    '''Пачка записей, разложенная по таблицам; повторы внутри пачки схлопываются'''
+    buildings: dict[int, tuple] = field(default_factory=dict)
+    organizations: dict[int, tuple] = field(default_factory=dict)
+    phones: set[tuple[int, str]] = field(default_factory=set)
+    activities: set[tuple[int, int]] = field(default_factory=set)
+    # Организации, чьи телефоны и деятельности заменяются списком из записи
+    phone_owners: set[int] = field(default_factory=set)
+    activity_owners: set[int] = field(default_factory=set)
+    records: int = 0
+
+    def add(self, record: dict[str, Any], number: int) -> None:
+        if _text(record.get('deleted')) in ('1', 'True', 'true'):
+            # Удаления из инкрементальной выгрузки не загружаются
+            self.records += 1
+            return
+        try:
+            organization_id = int(record['id'])
+            building_id = int(record['building_id'])
+            name = _text(record.get('name'))
+            if not name:
+                raise ValueError('пустое name')
+
+            city = _text(record.get('city'))
+            if city:
+                latitude = _text(record.get('latitude'))
+                longitude = _text(record.get('longitude'))
+                self.buildings[building_id] = (
+                    building_id,
+                    city,
+                    _text(record.get('street')),
+                    _text(record.get('house')),
+                    _text(record.get('office')),
+                    float(latitude) if latitude else None,
+                    float(longitude) if longitude else None,
+                )
+
+            self.organizations[organization_id] = (organization_id, name, building_id)
+            if record.get('phones') is not None:
+                self.phone_owners.add(organization_id)
+                self.phones.update(
+                    (organization_id, phone) for phone in _list(record['phones'])
+                )
+            if record.get('activity_ids') is not None:
+                self.activity_owners.add(organization_id)
+                self.activities.update(
+                    (organization_id, int(activity_id))
+                    for activity_id in _list(record['activity_ids'])
+                )
+        except (KeyError, TypeError, ValueError) as exc:
+            raise ImportFormatError(f'Запись {number}: {exc}')
+        self.records += 1
+
+
+def take_batch(records: Iterator[tuple[int, dict]], size: int) -> ImportBatch:
+    batch = ImportBatch()
+    for number, record in itertools.islice(records, size):
+        batch.add(record, number)
+    return batch
+
+
+def default_job_name(filename: str, source_hash: str) -> str:
+    return f'{PurePath(filename).name}@{source_hash[:12]}'
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(READ_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def start_job(name: str, restart: bool, source_hash: str | None = None) -> ImportJob:
+    '''Создаёт задачу или готовит её к продолжению.
+
+    Завершённая задача без restart возвращается как есть (status='done').
+    '''
+    async with async_session() as session:
+        repo = ImportRepo(session)
+        job = await repo.get_job_db(name)
+        if job is None:
+            job = await repo.create(
+                name=name, status='running', processed_records=0, source_hash=source_hash
+            )
+        elif restart:
+            job.status = 'running'
+            job.error = None
+            job.processed_records = 0
+            job.source_hash = source_hash
+        elif source_hash and job.source_hash and job.source_hash != source_hash:
+            raise ImportConflictError(
+                f'Задача {name} начата с другим файлом, для загрузки заново нужен restart'
+            )
+        elif job.status != 'done':
+            job.status = 'running'
+            job.error = None
+        await session.commit()
+        return job
+
+
+async def get_job(name: str) -> ImportJob | None:
+    async with async_session() as session:
+        return await ImportRepo(session).get_job_db(name)
+
+
+async def finish_job(name: str, status: str, error: str | None = None) -> None:
+    async with async_session() as session:
+        repo = ImportRepo(session)
+        job = await repo.get_job_db(name)
+        job.status = status
+        job.error = error
+        # И после сбоя: загруженные пачки уже заняли свои id
+        await repo.fix_sequences_db()
+        await session.commit()
+
+
+async def import_organizations(
+    stream: TextIO,
+    fmt: ImportFormat,
+    job_name: str,
+    batch_size: int = settings.IMPORT_BATCH_SIZE,
+    restart: bool = False,
+    source_hash: str | None = None
+) -> ImportResultOut:
+    job = await start_job(job_name, restart, source_hash)
+    processed = job.processed_records
+    result = ImportResultOut(
+        job=job_name,
+        status=job.status,
+        processed_records=processed,
+        imported_records=0,
+        batches=0,
+        rows={},
+        skipped_activities=0,
+    )
+    if job.status == 'done':
+        logger.info('Задача %s уже загружена, для повтора нужен restart', job_name)
+        return result
+
+    records = enumerate(read_records(stream, fmt), 1)
+    # Записи, загруженные прошлыми запусками, только вычитываются
+    records = itertools.islice(records, processed, None)
+    try:
+        while True:
+            # Чтение и разбор - синхронные, выносим из event loop
+            batch = await asyncio.to_thread(take_batch, records, batch_size)
+            if not batch.records:
+                break
+
+            started = perf_counter()
+            async with async_session() as session:
+                repo = ImportRepo(session)
+                await repo.copy_batch_db(batch)
+                unknown = await repo.unknown_activities_db()
+                rows = await repo.upsert_batch_db(batch)
+                if not await repo.advance_job_db(job_name, processed, batch.records):
+                    raise ImportConflictError(f'Задача {job_name} загружается параллельно')
+                await session.commit()
+            IMPORT_BATCH_SECONDS.observe(perf_counter() - started)
+            IMPORT_BATCHES.labels(status='ok').inc()
+            IMPORT_RECORDS.inc(batch.records)
+            for table, count in rows.items():
+                IMPORT_ROWS.labels(table=table).inc(count)
+                result.rows[table] = result.rows.get(table, 0) + count
+            if unknown:
+                skipped = sum(unknown.values())
+                IMPORT_SKIPPED_ACTIVITIES.inc(skipped)
+                result.skipped_activities += skipped
+                logger.warning(
+                    'Задача %s: пропущено %s ссылок на неизвестные деятельности %s',
+                    job_name, skipped, sorted(unknown)
+                )
+
+            processed += batch.records
+            result.imported_records += batch.records
+            result.batches += 1
+            logger.info(
+                'Задача %s: пачка %s, загружено записей %s',
+                job_name, result.batches, processed
+            )
+    except Exception as exc:
+        IMPORT_BATCHES.labels(status='failed').inc()
+        if not isinstance(exc, ImportConflictError):
+            await finish_job(job_name, 'failed', str(exc))
+        raise
+
+    await finish_job(job_name, 'done')
+
+    result.status = 'done'
+    result.processed_records = processed
+    return result
+
+
+def save_upload(source: BinaryIO, suffix: str = '') -> tuple[str, str]:
+    '''Копирует загруженный файл во временный, который переживёт запрос.
+
+    Возвращает путь и sha256 содержимого.
+    '''
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as target:
+        while chunk := source.read(READ_CHUNK_SIZE):
+            digest.update(chunk)
+            target.write(chunk)
+    return target.name, digest.hexdigest()
+
+
+async def import_file_in_background(
+    path: str,
+    fmt: ImportFormat,
+    job_name: str,
+    batch_size: int = settings.IMPORT_BATCH_SIZE
+) -> None:
+    '''Загружает временный файл и удаляет его.
+
+    Задача уже начата через start_job; итог и ошибка пишутся в import_job,
+    здесь их только логируем.
+    '''
+    try:
+        with open(path, encoding='utf-8', newline='') as stream:
+            await import_organizations(stream, fmt, job_name, batch_size)
+    except Exception:
+        logger.exception('Загрузка %s прервана', job_name)
+    finally:
+        os.unlink(path)
@@ -0,0 +1,163 @@
+'''Потоковая выгрузка справочника организаций в NDJSON или CSV.
+
+Строки читаются серверным курсором порциями по EXPORT_FETCH_SIZE и
+сразу отдаются клиенту, так что память не зависит от размера таблиц.
+Колонки CSV совместимы с массовой загрузкой (app.services.bulk_import).
+
+С updated_since после живых строк идут удалённые организации
+(organization_tombstone): в NDJSON - {"id", "building_id", "deleted":
+true}, в CSV - строки с deleted = 1. Следующую выгрузку нужно
+запрашивать с контрольной точкой export_checkpoint(), а не с моментом
+запроса.
+'''
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator
+
+from app.config.database import async_session, read_session_scope
+from app.config.settings import settings
+from app.repositories.activity import ActivityRepo
+from app.repositories.organization import OrganizationRepo
+from app.schemas.export import ExportFormat
+from app.services.activity_tree import ActivityTree, activity_tree_cache
+
+CSV_FIELDS = (
+    'id', 'name', 'building_id', 'city', 'street', 'house', 'office',
+    'latitude', 'longitude', 'phones', 'activity_ids', 'activity_paths',
+    'updated_at', 'deleted',
+)
+MEDIA_TYPES = {
+    ExportFormat.ndjson: 'application/x-ndjson',
+    ExportFormat.csv: 'text/csv; charset=utf-8',
+}
+
+
+def activity_path(tree: ActivityTree | None, activity_id: int) -> str:
+    path = tree.path(activity_id) if tree is not None else ()
+    return ' / '.join(path) or str(activity_id)
+
+
+def ndjson_line(row, tree: ActivityTree | None) -> str:
+    return json.dumps(
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'building': {
+                'id': row['building_id'],
+                'city': row['city'],
+                'street': row['street'],
+                'house': row['house'],
+                'office': row['office'],
+                'latitude': row['latitude'],
+                'longitude': row['longitude'],
+            },
+            'phones': row['phones'],
+            'activities': [
+                {'id': activity_id, 'path': activity_path(tree, activity_id)}
+                for activity_id in row['activity_ids']
+            ],
+            'updated_at': row['updated_at'].isoformat(),
+        },
+        ensure_ascii=False,
+    ) + '\n'
+
+
+def ndjson_deleted_line(row) -> str:
+    return json.dumps(
+        {
+            'id': row['id'],
+            'building_id': row['building_id'],
+            'deleted': True,
+            'updated_at': row['updated_at'].isoformat(),
+        }
+    ) + '\n'
+
+
+def csv_record(row, tree: ActivityTree | None) -> tuple:
+    return (
+        row['id'], row['name'], row['building_id'], row['city'], row['street'],
+        row['house'], row['office'], row['latitude'], row['longitude'],
+        ';'.join(row['phones']),
+        ';'.join(str(activity_id) for activity_id in row['activity_ids']),
+        ';'.join(activity_path(tree, activity_id) for activity_id in row['activity_ids']),
+        row['updated_at'].isoformat(),
+        '',
+    )
+
+
+def csv_deleted_record(row) -> tuple:
+    return (
+        row['id'], '', row['building_id'], '', '', '', '', '', '', '', '', '',
+        row['updated_at'].isoformat(),
+        1,
+    )
+
+
+def csv_chunk(records) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(records)
+    return buffer.getvalue()
+
+
+async def export_organizations(
+    fmt: ExportFormat,
+    building_id: int | None = None,
+    activity_id: int | None = None,
+    updated_since: datetime | None = None
+) -> AsyncIterator[str]:
+    '''Куски ответа по порции строк курсора.
+
+    Сессия открывается внутри генератора и живёт, пока идёт ответ; при
+    обрыве соединения генератор закрывается и соединение возвращается
+    в пул. Вся выгрузка читается из одного снимка (REPEATABLE READ).
+    '''
+    tree = activity_tree_cache.tree
+    if fmt is ExportFormat.csv:
+        yield csv_chunk([CSV_FIELDS])
+
+    async with read_session_scope(
+        isolation_level="REPEATABLE READ",
+        postgresql_readonly=True
+    ) as session:
+        activity_ids = None
+        if activity_id is not None:
+            activity_ids = activity_tree_cache.descendant_ids(activity_id)
+            if activity_ids is None:
+                activity_ids = await ActivityRepo(session).get_descendant_ids_db(activity_id)
+
+        result = await OrganizationRepo(session).stream_export_db(
+            settings.EXPORT_FETCH_SIZE, building_id, activity_ids, updated_since
+        )
+        async for rows in result.mappings().partitions():
+            if fmt is ExportFormat.csv:
+                yield csv_chunk(csv_record(row, tree) for row in rows)
+            else:
+                yield ''.join(ndjson_line(row, tree) for row in rows)
+
+        if updated_since is None:
+            return
+        # Удалённые организации не знают своих деятельностей, поэтому
+        # с activity_id отдаются все удаления
+        result = await OrganizationRepo(session).stream_deleted_db(
+            settings.EXPORT_FETCH_SIZE, updated_since, building_id
+        )
+        async for rows in result.mappings().partitions():
+            if fmt is ExportFormat.csv:
+                yield csv_chunk(csv_deleted_record(row) for row in rows)
+            else:
+                yield ''.join(ndjson_deleted_line(row) for row in rows)
+
+
+async def export_checkpoint() -> datetime:
+    '''updated_since для следующей выгрузки.
+
+    Считается на primary до открытия снимка выгрузки: всё, что
+    закоммичено раньше, в выгрузку попадёт, а строки транзакций, открытых
+    сейчас или позже, будут не старше точки.
+    '''
+    async with async_session() as session:
+        return await OrganizationRepo(session).get_export_checkpoint_db(
+            settings.EXPORT_CHECKPOINT_MARGIN_SECONDS
+        )
@@ -1,69 +1,323 @@
 from sqlalchemy import func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import Building
+from app.cache import cached
+from app.cache.single_flight import coalesced, round_coordinates
+from app.repositories.activity import ActivityRepo
 from app.repositories.organization import OrganizationRepo
+from app.schemas.geo import BBox, CellRange, GeoJSONPolygon
+from app.schemas.organization import SearchMode
+from app.services.activity_tree import activity_tree_cache
 
 
+def point_geography(lat: float, lon: float):
+    return func.geography(func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326))
+
+
+def bbox_geometry(bbox: BBox):
+    '''Прямоугольник в градусах: в отличие от geography, края - параллели и меридианы'''
+    return func.ST_MakeEnvelope(bbox.min_lon, bbox.min_lat, bbox.max_lon, bbox.max_lat, 4326)
+
+
+def organization_tags(rows) -> list[str]:
+    return [f'organization:{row["id"]}' for row in rows]
+
+
+def page_tags(*templates: str):
+    '''Теги для методов, возвращающих (rows, next_key).
+
+    templates форматируются аргументами вызова: 'building:{building_id}'.
+    '''
+    def tags(arguments, result):
+        rows, _ = result
+        return [
+            *(template.format(**arguments) for template in templates),
+            *organization_tags(rows),
+        ]
+    return tags
+
+
+def nested_activity_tags(arguments, result):
+    rows, _ = result
+    activity_id = arguments['activity_id']
+    tree = activity_tree_cache.tree
+    subtree = tree.descendants.get(activity_id, ()) if tree is not None else ()
+    return [
+        'activities',
+        *(f'activity:{node_id}' for node_id in subtree or (activity_id,)),
+        *organization_tags(rows),
+    ]
+
+
+def json_page_tags(*templates: str):
+    '''Как page_tags, для методов, возвращающих (items_json, next_key, ids)'''
+    def tags(arguments, result):
+        _, _, ids = result
+        return [
+            *(template.format(**arguments) for template in templates),
+            *(f'organization:{org_id}' for org_id in ids),
+        ]
+    return tags
+
+
+def cluster_tags(arguments, result):
+    activity_id = arguments['activity_id']
+    if activity_id is None:
+        return ['buildings', 'organizations']
+    tree = activity_tree_cache.tree
+    subtree = tree.descendants.get(activity_id, ()) if tree is not None else ()
+    return [
+        'buildings',
+        'organizations',
+        'activities',
+        *(f'activity:{node_id}' for node_id in subtree or (activity_id,)),
+    ]
+
+
+def organization_id_tags(arguments, result):
+    return [f'organization:{arguments["organization_id"]}']
+
+
+def nearest_tags(arguments, result):
+    return ['buildings', 'organizations', *organization_tags(result)]
+
 
 class OrganizationService:
 
+    @coalesced(round_coordinates)
+    @cached(tags=page_tags('buildings', 'organizations'))
     async def get_organizations_nearby(
         self,
         session: AsyncSession,
         lat: float,
         lon: float,
-        radius_m: float
+        radius_m: float,
+        limit: int,
+        after: tuple | None = None
     ):
-        point = func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326)
-        point_geog = func.geography(point)
+        repo = OrganizationRepo(session)
+        orgs = await repo.get_organizations_nearby_db(
+            point_geography(lat, lon), radius_m, limit, after
+        )
+        return orgs
 
-        building_point_geog = func.geography(
-            func.ST_SetSRID(func.ST_MakePoint(Building.longitude, Building.latitude), 4326)
+    @coalesced(round_coordinates)
+    @cached(tags=json_page_tags('buildings', 'organizations'))
+    async def get_organizations_nearby_json(
+        self,
+        session: AsyncSession,
+        lat: float,
+        lon: float,
+        radius_m: float,
+        limit: int,
+        after: tuple | None = None
+    ):
+        repo = OrganizationRepo(session)
+        return await repo.get_organizations_nearby_json_db(
+            point_geography(lat, lon), radius_m, limit, after
         )
+
+    @coalesced()
+    @cached(tags=cluster_tags)
+    async def get_organization_clusters(
+        self,
+        session: AsyncSession,
+        zoom: int,
+        cell_x: CellRange,
+        cell_y: CellRange,
+        activity_id: int | None = None
+    ):
+        '''Центроиды и число организаций в ячейках сетки.
+
+        Без фильтра - из предрассчитанной organization_grid,
+        с фильтром по поддереву деятельности - запросом к организациям.
+        '''
         repo = OrganizationRepo(session)
-        orgs = await repo.get_organizations_nearby_db(point_geog, building_point_geog, radius_m)
+        if activity_id is None:
+            return await repo.get_grid_clusters_db(zoom, cell_x, cell_y)
+        activity_ids = activity_tree_cache.descendant_ids(activity_id)
+        if activity_ids is None:
+            activity_ids = await ActivityRepo(session).get_descendant_ids_db(activity_id)
+        return await repo.get_live_clusters_db(zoom, cell_x, cell_y, activity_ids)
+
+    @coalesced(round_coordinates)
+    @cached(tags=nearest_tags)
+    async def get_nearest_organizations(
+        self,
+        session: AsyncSession,
+        lat: float,
+        lon: float,
+        k: int
+    ):
+        repo = OrganizationRepo(session)
+        orgs = await repo.get_nearest_organizations_db(point_geography(lat, lon), k)
         return orgs
-    
-    async def get_organizations_by_building(self, session: AsyncSession, building_id: int):
+
+    @coalesced()
+    @cached(tags=page_tags('buildings', 'organizations'))
+    async def get_organizations_in_bbox(
+        self,
+        session: AsyncSession,
+        bbox: BBox,
+        limit: int,
+        after: tuple | None = None
+    ):
+        area = bbox_geometry(bbox)
         repo = OrganizationRepo(session)
-        orgs = await repo.get_data_by_build_id_db(building_id)
+        orgs = await repo.get_organizations_within_db(area, limit, after)
         return orgs
-    
 
+    @coalesced()
+    @cached(tags=page_tags('buildings', 'organizations'))
+    async def get_organizations_in_polygon(
+        self,
+        session: AsyncSession,
+        polygon: GeoJSONPolygon,
+        limit: int,
+        after: tuple | None = None
+    ):
+        # Рёбра GeoJSON - прямые в координатах lon/lat (RFC 7946), как у геометрии
+        area = func.ST_SetSRID(func.ST_GeomFromGeoJSON(polygon.model_dump_json()), 4326)
+        repo = OrganizationRepo(session)
+        orgs = await repo.get_organizations_within_db(area, limit, after)
+        return orgs
+
+    @coalesced()
+    @cached(tags=page_tags('building:{building_id}'))
+    async def get_organizations_by_building(
+        self,
+        session: AsyncSession,
+        building_id: int,
+        limit: int,
+        after: tuple | None = None,
+        version=None
+    ):
+        # version (см. get_building_organizations_version) только входит
+        # в ключ кэша, чтобы тело ответа совпадало с его ETag
+        repo = OrganizationRepo(session)
+        orgs = await repo.get_data_by_build_id_db(building_id, limit, after)
+        return orgs
+
+    @coalesced()
+    @cached(tags=json_page_tags('building:{building_id}'))
+    async def get_organizations_by_building_json(
+        self,
+        session: AsyncSession,
+        building_id: int,
+        limit: int,
+        after: tuple | None = None,
+        version=None
+    ):
+        repo = OrganizationRepo(session)
+        return await repo.get_data_by_build_id_json_db(building_id, limit, after)
+
+    @coalesced()
+    @cached(tags=page_tags('activity:{activity_id}'))
     async def get_organizations_by_activity(
         self,
         session: AsyncSession,
-        activity_id: int
+        activity_id: int,
+        limit: int,
+        after: tuple | None = None
     ):
         repo = OrganizationRepo(session)
-        orgs = await repo.get_data_by_activity_id_db(activity_id)
+        orgs = await repo.get_data_by_activity_id_db(activity_id, limit, after)
         return orgs
-    
+
+    @coalesced()
+    @cached(tags=json_page_tags('activity:{activity_id}'))
+    async def get_organizations_by_activity_json(
+        self,
+        session: AsyncSession,
+        activity_id: int,
+        limit: int,
+        after: tuple | None = None
+    ):
+        repo = OrganizationRepo(session)
+        return await repo.get_data_by_activity_id_json_db(activity_id, limit, after)
+
+    @coalesced()
+    @cached(tags=nested_activity_tags)
     async def get_organizations_by_nested_activity(
         self,
         session: AsyncSession,
-        activity_id: int
+        activity_id: int,
+        limit: int,
+        after: tuple | None = None
     ):
         repo = OrganizationRepo(session)
-        orgs = await repo.organizations_by_nested_activity_db(activity_id)
+        activity_ids = activity_tree_cache.descendant_ids(activity_id)
+        if activity_ids is None:
+            orgs = await repo.organizations_by_nested_activity_db(activity_id, limit, after)
+        else:
+            orgs = await repo.organizations_by_activity_ids_db(activity_ids, limit, after)
         return orgs
-    
 
-    async def get_organization_by_id(\
+
+    async def get_organizations_by_ids(
+        self,
+        session: AsyncSession,
+        organization_ids: list[int]
+    ):
+        '''Словарь id -> организация для найденных id'''
+        repo = OrganizationRepo(session)
+        orgs = await repo.get_organizations_by_ids_db(sorted(set(organization_ids)))
+        return {org['id']: org for org in orgs}
+
+    @coalesced()
+    async def get_organization_version(
         self,
         session: AsyncSession,
         organization_id: int
     ):
+        repo = OrganizationRepo(session)
+        return await repo.get_organization_updated_at_db(organization_id)
+
+    @coalesced()
+    async def get_building_organizations_version(
+        self,
+        session: AsyncSession,
+        building_id: int
+    ):
+        repo = OrganizationRepo(session)
+        return await repo.get_building_organizations_version_db(building_id)
+
+    @coalesced()
+    @cached(tags=organization_id_tags)
+    async def get_organization_by_id(\
+        self,
+        session: AsyncSession,
+        organization_id: int,
+        version=None
+    ):
+        # version (updated_at) только входит в ключ кэша, см. выше
         repo = OrganizationRepo(session)
         org = await repo.get_organization_by_id_db(organization_id)
         return org
-    
+
+    @coalesced()
+    @cached(tags=page_tags('organizations'))
+    async def search_organizations(
+        self,
+        session: AsyncSession,
+        query: str,
+        mode: SearchMode,
+        limit: int,
+        after: tuple | None = None
+    ):
+        repo = OrganizationRepo(session)
+        orgs = await repo.search_organizations_db(query, mode, limit, after)
+        return orgs
+
+    @coalesced()
+    @cached(tags=page_tags('organizations'))
     async def get_organization_by_name(
         self,
         session: AsyncSession,
-        organization_name: str
+        organization_name: str,
+        limit: int,
+        after: tuple | None = None
     ):
         repo = OrganizationRepo(session)
-        org = await repo.get_organization_by_name_db(organization_name)
+        org = await repo.get_organization_by_name_db(organization_name, limit, after)
         return org
\ No newline at end of file
@@ -0,0 +1,61 @@
+'''Свёртка дельт organization_grid_delta в organization_grid.
+
+Триггеры на organization и building пишут изменения сетки дельтами,
+а переносит их в organization_grid фоновая задача каждого процесса
+приложения раз в GRID_FOLD_INTERVAL_SECONDS. Одновременно сворачивает
+один процесс (advisory lock в organization_grid_fold), остальные
+пропускают проход. Чтение кластеров складывает сетку и дельты, поэтому
+пауза свёртки сказывается только на размере organization_grid_delta.
+'''
+import asyncio
+import logging
+
+from app.config.database import async_session
+from app.config.settings import settings
+from app.metrics import GRID_DELTAS_FOLDED
+from app.repositories.organization import OrganizationRepo
+
+logger = logging.getLogger(__name__)
+
+
+async def fold_grid(batch_size: int = settings.GRID_FOLD_BATCH_SIZE) -> int:
+    '''Сворачивает дельты пачками по batch_size, каждая - своей транзакцией'''
+    total = 0
+    while True:
+        async with async_session() as session:
+            folded = await OrganizationRepo(session).fold_grid_db(batch_size)
+            await session.commit()
+        GRID_DELTAS_FOLDED.inc(folded)
+        total += folded
+        if folded < batch_size:
+            return total
+
+
+class GridFolder:
+
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+
+    async def _fold_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.GRID_FOLD_INTERVAL_SECONDS)
+            try:
+                await fold_grid()
+            except Exception:
+                logger.exception('Не удалось свернуть дельты organization_grid')
+
+    def start(self) -> None:
+        if settings.GRID_FOLD_INTERVAL_SECONDS > 0 and self._task is None:
+            self._task = asyncio.create_task(self._fold_periodically())
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+
+grid_folder = GridFolder()
@@ -0,0 +1,118 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache.single_flight import coalesced
+from app.config.settings import settings
+from app.metrics import TILE_CACHE_BYTES, TILE_CACHE_REQUESTS
+from app.repositories.building import BuildingRepo
+
+logger = logging.getLogger(__name__)
+
+TILES_CHANNEL = 'tiles_changed'
+
+TileKey = tuple[int, int, int]
+Extent = tuple[float, float, float, float]
+
+
+def tile_bounds(z: int, x: int, y: int) -> Extent:
+    '''Границы тайла XYZ в градусах: minLon, minLat, maxLon, maxLat'''
+    n = 2 ** z
+
+    def lat(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def intersects(a: Extent, b: Extent) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class TileCache:
+    '''LRU векторных тайлов процесса с бюджетом в байтах.
+
+    Тайлы сбрасываются по уведомлению tiles_changed из триггеров
+    building/organization/organization_activity: удаляются тайлы,
+    пересекающие охват изменённых зданий. TTL страхует от тайла,
+    прочитанного с отстающей реплики уже после уведомления.
+    '''
+
+    def __init__(self, max_bytes: int, ttl: float) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        # Растёт при каждом сбросе: тайл, запрошенный до сброса, не сохраняем
+        self.generation = 0
+        self._tiles: OrderedDict[TileKey, tuple[bytes, float]] = OrderedDict()
+
+    def get(self, key: TileKey) -> bytes | None:
+        entry = self._tiles.get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            self._drop(key)
+            entry = None
+        TILE_CACHE_REQUESTS.labels(result='miss' if entry is None else 'hit').inc()
+        if entry is None:
+            return None
+        self._tiles.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: TileKey, tile: bytes, generation: int) -> None:
+        if generation != self.generation or len(tile) > self.max_bytes:
+            return
+        self._drop(key)
+        self._tiles[key] = (tile, time.monotonic() + self.ttl)
+        self.size += len(tile)
+        while self.size > self.max_bytes:
+            self._drop(next(iter(self._tiles)))
+        TILE_CACHE_BYTES.set(self.size)
+
+    def invalidate_extent(self, extent: Extent) -> None:
+        self.generation += 1
+        for key in [key for key in self._tiles if intersects(tile_bounds(*key), extent)]:
+            self._drop(key)
+        TILE_CACHE_BYTES.set(self.size)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._tiles.clear()
+        self.size = 0
+        TILE_CACHE_BYTES.set(0)
+
+    def _drop(self, key: TileKey) -> None:
+        entry = self._tiles.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+    def on_notify(self, payload: str | None) -> None:
+        '''Обработчик tiles_changed; None - после переподключения LISTEN'''
+        if payload is None:
+            self.clear()
+            return
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(value) for value in payload.split(','))
+        except ValueError:
+            logger.warning('Непонятное уведомление %s: %r', TILES_CHANNEL, payload)
+            self.clear()
+            return
+        self.invalidate_extent((min_lon, min_lat, max_lon, max_lat))
+
+
+tile_cache = TileCache(settings.TILE_CACHE_MAX_BYTES, settings.TILE_CACHE_TTL_SECONDS)
+
+
+class TileService:
+
+    @coalesced()
+    async def get_tile(self, session: AsyncSession, z: int, x: int, y: int) -> bytes:
+        key = (z, x, y)
+        tile = tile_cache.get(key)
+        if tile is None:
+            generation = tile_cache.generation
+            repo = BuildingRepo(session)
+            tile = await repo.get_tile_db(z, x, y, settings.TILE_EXTENT, settings.TILE_BUFFER)
+            tile_cache.set(key, tile, generation)
+        return tile
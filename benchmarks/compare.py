@@ -0,0 +1,61 @@
+'''Сравнение двух отчётов benchmarks.run.
+
+    python -m benchmarks.compare base.json new.json [--threshold 10]
+
+Код 1, если p95 какого-либо эндпоинта вырос больше чем на --threshold %.
+'''
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def change(old: float | None, new: float | None) -> float | None:
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def number(value: float | None) -> str:
+    return f'{value:.1f}' if value is not None else '-'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Сравнение отчётов нагрузочных прогонов')
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Допустимый рост p95, %%')
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    print(f'{base["meta"]["commit"]} -> {new["meta"]["commit"]}')
+    regressions = []
+    rows = [('overall', base['overall'], new['overall'])] + [
+        (name, base['endpoints'][name], new['endpoints'][name])
+        for name in sorted(set(base['endpoints']) & set(new['endpoints']))
+    ]
+    for name, old, current in rows:
+        cells = []
+        for percent in ('p50', 'p95', 'p99'):
+            old_value = old['latency_ms'][percent]
+            new_value = current['latency_ms'][percent]
+            delta = change(old_value, new_value)
+            cells.append(
+                f'{percent} {number(old_value)}->{number(new_value)}'
+                + (f' ({delta:+.0f}%)' if delta is not None else '')
+            )
+            if percent == 'p95' and delta is not None and delta > args.threshold:
+                regressions.append(name)
+        print(f'{name:20} ' + '  '.join(cells))
+
+    if regressions:
+        print(f'Рост p95 больше {args.threshold}%: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+'''Сравнение обычного и быстрого пути сериализации страницы организаций.
+
+Обычный путь повторяет то, что делает FastAPI с response_model:
+модели OrganizationOut по строкам, проверка Page[OrganizationOut],
+dump в JSON-совместимые объекты и json.dumps. Быстрый путь -
+app.api.responses.fast_page.
+
+    python -m benchmarks.fast_json --rows 500 --repeat 200
+'''
+import argparse
+import json
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.api.responses import fast_page, orjson
+from app.schemas.organization import OrganizationOut
+from app.schemas.pagination import Page, encode_cursor
+
+
+def make_rows(count: int) -> list[dict]:
+    return [
+        {
+            'id': org_id,
+            'name': f'Организация {org_id}',
+            'phones': [f'+7-999-{org_id:03d}-00-{phone:02d}' for phone in range(2)],
+        }
+        for org_id in range(1, count + 1)
+    ]
+
+
+def pydantic_path(adapter: TypeAdapter, rows: list[dict]) -> bytes:
+    page = Page(
+        items=[OrganizationOut(name=row['name'], phones=row['phones']) for row in rows],
+        next_cursor=encode_cursor((rows[-1]['id'],)),
+    )
+    content = adapter.dump_python(adapter.validate_python(page), mode='json')
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False).encode('utf-8')
+
+
+def fast_path(rows: list[dict]) -> bytes:
+    return fast_page(rows, (rows[-1]['id'],)).body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Обычный и быстрый путь JSON-ответа')
+    parser.add_argument('--rows', type=int, default=500, help='Строк на странице')
+    parser.add_argument('--repeat', type=int, default=200, help='Повторов на замер')
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    adapter = TypeAdapter(Page[OrganizationOut])
+    if json.loads(pydantic_path(adapter, rows)) != json.loads(fast_path(rows)):
+        raise SystemExit('Ответы обычного и быстрого пути различаются')
+
+    pydantic_seconds = min(timeit.repeat(lambda: pydantic_path(adapter, rows), number=args.repeat, repeat=5))
+    fast_seconds = min(timeit.repeat(lambda: fast_path(rows), number=args.repeat, repeat=5))
+
+    print(f'строк на странице: {args.rows}, сериализатор: {"orjson" if orjson else "json"}')
+    print(f'pydantic: {pydantic_seconds / args.repeat * 1000:.3f} мс на ответ')
+    print(f'fast:     {fast_seconds / args.repeat * 1000:.3f} мс на ответ')
+    print(f'ускорение: x{pydantic_seconds / fast_seconds:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+'''Генератор синтетического справочника для нагрузочных тестов.
+
+    python -m benchmarks.generate --seed 42 --buildings 5000 --out benchmarks/data
+    python -m benchmarks.generate --seed 42 --buildings 5000 --out benchmarks/data --load
+
+Пишет в --out:
+- activities.csv - дерево деятельностей из трёх уровней;
+- organizations.ndjson - организации в формате массовой загрузки
+  (app.services.bulk_import) со зданиями, телефонами и деятельностями;
+- manifest.json - параметры и диапазоны id для сценариев benchmarks.run.
+
+С одинаковым --seed и параметрами данные совпадают байт в байт.
+С --load деятельности вставляются в БД, а организации загружаются
+через массовую загрузку.
+'''
+import argparse
+import asyncio
+import csv
+import json
+import random
+from pathlib import Path
+
+# Москва в пределах МКАД
+DEFAULT_BBOX = (37.37, 55.57, 37.84, 55.91)
+
+STREETS = (
+    'Ленина', 'Тверская', 'Профсоюзная', 'Садовая', 'Мира', 'Арбат',
+    'Лесная', 'Новая', 'Школьная', 'Гагарина', 'Пушкина', 'Полевая',
+    'Советская', 'Набережная', 'Молодёжная', 'Парковая', 'Заводская',
+)
+NAME_PREFIXES = ('ООО', 'ИП', 'АО', 'ЗАО', '')
+NAME_WORDS = (
+    'Альфа', 'Вектор', 'Гранит', 'Дельта', 'Заря', 'Исток', 'Континент',
+    'Лидер', 'Меридиан', 'Норд', 'Орион', 'Прайм', 'Радуга', 'Сфера',
+    'Титан', 'Урал', 'Феникс', 'Эталон', 'Дом', 'Мир', 'Сервис', 'Плюс',
+)
+ACTIVITY_WORDS = (
+    'Еда', 'Автомобили', 'Услуги', 'Строительство', 'Медицина', 'Образование',
+    'Спорт', 'Красота', 'Туризм', 'Финансы', 'Одежда', 'Электроника',
+)
+
+
+def build_activities(rng: random.Random, roots: int, children: int) -> list[dict]:
+    '''Три уровня: roots корней, у каждого узла children детей'''
+    activities = []
+    next_id = 1
+    level_nodes = []
+    for index in range(roots):
+        name = ACTIVITY_WORDS[index % len(ACTIVITY_WORDS)]
+        if index >= len(ACTIVITY_WORDS):
+            name = f'{name} {index // len(ACTIVITY_WORDS) + 1}'
+        activities.append({'id': next_id, 'name': name, 'parent_id': None, 'level': 1})
+        level_nodes.append(activities[-1])
+        next_id += 1
+
+    for level in (2, 3):
+        parents, level_nodes = level_nodes, []
+        for parent in parents:
+            for index in range(children):
+                node = {
+                    'id': next_id,
+                    'name': f'{rng.choice(NAME_WORDS)} {parent["id"]}.{index + 1}',
+                    'parent_id': parent['id'],
+                    'level': level,
+                }
+                activities.append(node)
+                level_nodes.append(node)
+                next_id += 1
+    return activities
+
+
+def random_point(rng: random.Random, bbox, centers) -> tuple[float, float]:
+    '''Половина зданий - в кластерах вокруг центров, остальные равномерно'''
+    min_lon, min_lat, max_lon, max_lat = bbox
+    if rng.random() < 0.5:
+        lon, lat = rng.choice(centers)
+        lon = rng.gauss(lon, (max_lon - min_lon) / 40)
+        lat = rng.gauss(lat, (max_lat - min_lat) / 40)
+    else:
+        lon = rng.uniform(min_lon, max_lon)
+        lat = rng.uniform(min_lat, max_lat)
+    return (
+        round(min(max(lon, min_lon), max_lon), 6),
+        round(min(max(lat, min_lat), max_lat), 6),
+    )
+
+
+def generate(args) -> dict:
+    rng = random.Random(args.seed)
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+
+    activities = build_activities(rng, args.activity_roots, args.activity_children)
+    with open(out / 'activities.csv', 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=('id', 'name', 'parent_id', 'level'))
+        writer.writeheader()
+        writer.writerows(activities)
+    # Организации чаще привязаны к листьям дерева
+    leaves = [activity['id'] for activity in activities if activity['level'] == 3]
+    inner = [activity['id'] for activity in activities if activity['level'] < 3]
+
+    bbox = tuple(args.bbox)
+    centers = [
+        (rng.uniform(bbox[0], bbox[2]), rng.uniform(bbox[1], bbox[3]))
+        for _ in range(args.clusters)
+    ]
+    organization_id = 0
+    phones = 0
+    with open(out / 'organizations.ndjson', 'w', encoding='utf-8') as file:
+        for building_id in range(1, args.buildings + 1):
+            lon, lat = random_point(rng, bbox, centers)
+            building = {
+                'building_id': building_id,
+                'city': args.city,
+                'street': rng.choice(STREETS),
+                'house': str(rng.randint(1, 200)),
+                'office': str(rng.randint(1, 500)) if rng.random() < 0.6 else None,
+                'latitude': lat,
+                'longitude': lon,
+            }
+            # Среднее --orgs-per-building, разброс от 1 до удвоенного
+            for _ in range(rng.randint(1, 2 * args.orgs_per_building - 1)):
+                organization_id += 1
+                prefix = rng.choice(NAME_PREFIXES)
+                name = ' '.join(
+                    part for part in (prefix, rng.choice(NAME_WORDS), rng.choice(NAME_WORDS)) if part
+                )
+                org_phones = [
+                    f'+7-9{rng.randint(0, 99):02d}-{rng.randint(0, 999):03d}-'
+                    f'{rng.randint(0, 99):02d}-{rng.randint(0, 99):02d}'
+                    for _ in range(rng.randint(1, args.max_phones))
+                ]
+                phones += len(org_phones)
+                activity_ids = sorted({
+                    rng.choice(leaves if rng.random() < 0.8 else inner)
+                    for _ in range(rng.randint(1, args.max_activities))
+                })
+                record = {
+                    'id': organization_id,
+                    'name': f'{name} №{organization_id}',
+                    **building,
+                    'phones': org_phones,
+                    'activity_ids': activity_ids,
+                }
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    manifest = {
+        'seed': args.seed,
+        'city': args.city,
+        'bbox': list(bbox),
+        'buildings': args.buildings,
+        'organizations': organization_id,
+        'phones': phones,
+        'activity_ids': [activity['id'] for activity in activities],
+        'root_activity_ids': [activity['id'] for activity in activities if activity['level'] == 1],
+    }
+    with open(out / 'manifest.json', 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+    return manifest
+
+
+async def load(out: Path, seed: int) -> None:
+    from sqlalchemy import text
+    from sqlalchemy.dialects.postgresql import insert
+
+    from app.config.database import async_session
+    from app.models import Activity
+    from app.schemas.bulk_import import ImportFormat
+    from app.services.bulk_import import import_organizations
+
+    with open(out / 'activities.csv', encoding='utf-8', newline='') as file:
+        activities = [
+            {
+                'id': int(row['id']),
+                'name': row['name'],
+                'parent_id': int(row['parent_id']) if row['parent_id'] else None,
+                'level': int(row['level']),
+            }
+            for row in csv.DictReader(file)
+        ]
+    async with async_session() as session:
+        # По одному уровню, чтобы триггеры activity_closure видели родителей
+        for level in (1, 2, 3):
+            rows = [activity for activity in activities if activity['level'] == level]
+            await session.execute(insert(Activity).values(rows).on_conflict_do_nothing())
+        await session.execute(
+            text("SELECT setval(pg_get_serial_sequence('activity', 'id'), max(id)) FROM activity")
+        )
+        await session.commit()
+
+    with open(out / 'organizations.ndjson', encoding='utf-8') as file:
+        result = await import_organizations(
+            file, ImportFormat.ndjson, f'benchmark-seed-{seed}', restart=True
+        )
+    print(f'Загружено организаций: {result.processed_records}, строки: {result.rows}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Генератор данных для нагрузочных тестов')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default='benchmarks/data')
+    parser.add_argument('--city', default='Москва')
+    parser.add_argument('--bbox', type=float, nargs=4, default=DEFAULT_BBOX,
+                        metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'))
+    parser.add_argument('--buildings', type=int, default=5000)
+    parser.add_argument('--clusters', type=int, default=10, help='Центров скопления зданий')
+    parser.add_argument('--orgs-per-building', type=int, default=4, help='В среднем')
+    parser.add_argument('--activity-roots', type=int, default=8)
+    parser.add_argument('--activity-children', type=int, default=5, help='Детей у каждого узла')
+    parser.add_argument('--max-phones', type=int, default=3)
+    parser.add_argument('--max-activities', type=int, default=3)
+    parser.add_argument('--load', action='store_true', help='Загрузить данные в БД')
+    args = parser.parse_args()
+
+    manifest = generate(args)
+    print(
+        f'Сгенерировано: зданий {manifest["buildings"]}, организаций {manifest["organizations"]}, '
+        f'телефонов {manifest["phones"]}, деятельностей {len(manifest["activity_ids"])}'
+    )
+    if args.load:
+        asyncio.run(load(Path(args.out), args.seed))
+
+
+if __name__ == '__main__':
+    main()
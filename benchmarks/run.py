@@ -0,0 +1,240 @@
+'''Прогон сценария нагрузки против запущенного приложения.
+
+    python -m benchmarks.run --scenario benchmarks/scenarios/default.jsonl --rps 200 --duration 60
+
+Сценарий - JSONL, по запросу на строку: name, weight, method, path и
+необязательные params / json. Подстановки вида "{building_id}" берутся
+случайно из manifest.json генератора (benchmarks.generate); значение,
+целиком состоящее из подстановки, сохраняет тип (число, список).
+
+Запросы отправляются с постоянной частотой --rps независимо от ответов
+(открытая модель), задержка считается от запланированного момента
+отправки, поэтому очередь при перегрузке попадает в перцентили.
+Отчёт (p50/p95/p99, пропускная способность, ошибки, число SQL-запросов
+по db_queries_total из /metrics) сохраняется в JSON.
+'''
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import subprocess
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+from benchmarks.generate import NAME_WORDS
+
+PLACEHOLDER = re.compile(r'\{(\w+)\}')
+# Сторона случайного bbox в градусах, около километра
+BBOX_SIZE = 0.01
+
+
+def load_scenario(path: str) -> list[dict]:
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def placeholder_values(manifest: dict, rng: random.Random) -> dict:
+    min_lon, min_lat, max_lon, max_lat = manifest['bbox']
+    lon = round(rng.uniform(min_lon, max_lon - BBOX_SIZE), 6)
+    lat = round(rng.uniform(min_lat, max_lat - BBOX_SIZE), 6)
+    return {
+        'building_id': rng.randint(1, manifest['buildings']),
+        'organization_id': rng.randint(1, manifest['organizations']),
+        'organization_ids': [
+            rng.randint(1, manifest['organizations']) for _ in range(50)
+        ],
+        'activity_id': rng.choice(manifest['activity_ids']),
+        'root_activity_id': rng.choice(manifest['root_activity_ids']),
+        'lat': lat,
+        'lon': lon,
+        'bbox': f'{lon},{lat},{round(lon + BBOX_SIZE, 6)},{round(lat + BBOX_SIZE, 6)}',
+        'name_word': rng.choice(NAME_WORDS),
+    }
+
+
+def render(value, values: dict):
+    if isinstance(value, str):
+        match = PLACEHOLDER.fullmatch(value)
+        if match:
+            return values[match.group(1)]
+        return PLACEHOLDER.sub(lambda match: str(values[match.group(1)]), value)
+    if isinstance(value, dict):
+        return {key: render(item, values) for key, item in value.items()}
+    if isinstance(value, list):
+        return [render(item, values) for item in value]
+    return value
+
+
+def percentile(sorted_values: list[float], percent: float) -> float | None:
+    '''Перцентиль по методу ближайшего ранга'''
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(samples: list[tuple[float, int | None]], elapsed: float) -> dict:
+    latencies = sorted(latency * 1000 for latency, _ in samples)
+    statuses = Counter(str(status) if status is not None else 'error' for _, status in samples)
+    errors = sum(
+        count for status, count in statuses.items()
+        if status == 'error' or status.startswith('5')
+    )
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'statuses': dict(statuses),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'max': latencies[-1] if latencies else None,
+        },
+    }
+
+
+async def scrape_queries(client: httpx.AsyncClient) -> float | None:
+    '''Сумма db_queries_total из /metrics приложения'''
+    try:
+        response = await client.get('/metrics')
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    return sum(
+        sample.value
+        for family in text_string_to_metric_families(response.text)
+        for sample in family.samples
+        if sample.name == 'db_queries_total'
+    )
+
+
+async def send(client, semaphore, request: dict, scheduled: float, samples: list) -> None:
+    loop = asyncio.get_running_loop()
+    async with semaphore:
+        try:
+            response = await client.request(
+                request['method'],
+                request['path'],
+                params=request.get('params'),
+                json=request.get('json'),
+            )
+            status = response.status_code
+        except httpx.HTTPError:
+            status = None
+    samples.append((loop.time() - scheduled, status))
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    scenario = load_scenario(args.scenario)
+    with open(args.manifest, encoding='utf-8') as file:
+        manifest = json.load(file)
+    rng = random.Random(args.seed)
+    weights = [entry.get('weight', 1) for entry in scenario]
+    samples: dict[str, list] = defaultdict(list)
+
+    limits = httpx.Limits(max_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        queries_before = await scrape_queries(client)
+        semaphore = asyncio.Semaphore(args.max_in_flight)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        tasks = []
+        for index in range(int(args.rps * args.duration)):
+            scheduled = started + index / args.rps
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            entry = rng.choices(scenario, weights)[0]
+            request = render(entry, placeholder_values(manifest, rng))
+            tasks.append(asyncio.create_task(
+                send(client, semaphore, request, scheduled, samples[entry['name']])
+            ))
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - started
+        queries_after = await scrape_queries(client)
+
+    all_samples = [sample for endpoint in samples.values() for sample in endpoint]
+    overall = summarize(all_samples, elapsed)
+    queries = None
+    if queries_before is not None and queries_after is not None:
+        queries = queries_after - queries_before
+    overall['db_queries'] = queries
+    overall['db_queries_per_request'] = (
+        round(queries / len(all_samples), 3) if queries is not None and all_samples else None
+    )
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'base_url': args.base_url,
+            'scenario': args.scenario,
+            'target_rps': args.rps,
+            'duration_s': args.duration,
+            'seed': args.seed,
+            'elapsed_s': round(elapsed, 3),
+            'dataset': {
+                key: manifest[key] for key in ('seed', 'buildings', 'organizations', 'phones')
+            },
+        },
+        'overall': overall,
+        'endpoints': {
+            name: summarize(endpoint_samples, elapsed)
+            for name, endpoint_samples in sorted(samples.items())
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон сценария')
+    parser.add_argument('--scenario', default='benchmarks/scenarios/default.jsonl')
+    parser.add_argument('--manifest', default='benchmarks/data/manifest.json')
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--rps', type=float, default=100)
+    parser.add_argument('--duration', type=float, default=30, help='Секунды')
+    parser.add_argument('--max-in-flight', type=int, default=200, help='Одновременных запросов')
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--report', help='Путь отчёта, по умолчанию benchmarks/reports/<время>-<коммит>.json')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    path = Path(args.report or (
+        f'benchmarks/reports/{datetime.now():%Y%m%dT%H%M%S}-{report["meta"]["commit"] or "nocommit"}.json'
+    ))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    overall = report['overall']
+    # Без успешных ответов перцентилей нет
+    latency = ' '.join(
+        f'{name}={"-" if value is None else f"{value:.1f}"}'
+        for name, value in overall['latency_ms'].items()
+        if name in ('p50', 'p95', 'p99')
+    )
+    print(
+        f'{overall["requests"]} запросов, {overall["throughput_rps"]} rps, ошибок {overall["errors"]}, '
+        f'{latency} мс, SQL на запрос: {overall["db_queries_per_request"]}'
+    )
+    print(f'Отчёт: {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""cache invalidation notifications
+
+Revision ID: 0c5e2b7d9f14
+Revises: f3b8c1d6a924
+Create Date: 2026-10-18 21:24:50.318277
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c5e2b7d9f14'
+down_revision: Union[str, Sequence[str], None] = 'f3b8c1d6a924'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Теги кэша ответов по строке таблицы, как entity_tags в app.cache
+TABLE_TAGS = {
+    'building': ("'building:' || id",),
+    'organization': ("'organization:' || id", "'building:' || building_id", "'organizations'"),
+    'organization_phone': ("'organization:' || organization_id",),
+    'organization_activity': ("'organization:' || organization_id", "'activity:' || activity_id"),
+}
+# Теги, которые UPDATE шлёт, только если у какой-то строки изменились
+# перечисленные столбцы; INSERT и DELETE шлют их всегда. Списки зданий
+# зависят от адреса и координат, а organization_count меняется при каждой
+# записи в organization - для него хватает тега building:{id}.
+# Столбцы - как BUILDING_COLUMNS в e2a7c5f93b18
+CHANGE_TAGS = {
+    'building': ("'buildings'", ('city', 'street', 'house', 'office', 'latitude', 'longitude')),
+}
+EVENTS = (
+    ('insert', 'INSERT', 'REFERENCING NEW TABLE AS new_rows'),
+    ('update', 'UPDATE', 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+    ('delete', 'DELETE', 'REFERENCING OLD TABLE AS old_rows'),
+)
+
+
+def change_tags_sql(table: str) -> str:
+    if table not in CHANGE_TAGS:
+        return ''
+    tag, columns = CHANGE_TAGS[table]
+    old_columns = ', '.join(f'o.{column}' for column in columns)
+    new_columns = ', '.join(f'n.{column}' for column in columns)
+    return f"""
+                IF TG_OP = 'UPDATE' THEN
+                    IF EXISTS (
+                        SELECT 1
+                        FROM old_rows o
+                        JOIN new_rows n ON n.id = o.id
+                        WHERE ({old_columns}) IS DISTINCT FROM ({new_columns})
+                    ) THEN
+                        tags := tags || ARRAY[{tag}];
+                    END IF;
+                ELSIF cardinality(tags) > 0 THEN
+                    tags := tags || ARRAY[{tag}];
+                END IF;"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Уведомление доставляется всем процессам приложения после коммита,
+    # так что кэш сбрасывается при любой записи: триггеры, COPY массовой
+    # загрузки, команды и SQL вручную. Слишком длинный список тегов
+    # (предел payload - 8000 байт) заменяется на '*' - сбросить всё
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION cache_notify_tags(tags text[])
+        RETURNS void AS $$
+        DECLARE
+            payload text;
+        BEGIN
+            IF tags IS NULL OR cardinality(tags) = 0 THEN
+                RETURN;
+            END IF;
+            payload := array_to_string(ARRAY(SELECT DISTINCT unnest(tags)), ',');
+            IF octet_length(payload) > 7000 THEN
+                payload := '*';
+            END IF;
+            PERFORM pg_notify('cache_invalidate', payload);
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION cache_notify_all()
+        RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('cache_invalidate', '*');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for table, tags in TABLE_TAGS.items():
+        row_tags = ', '.join(tags)
+        op.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION {table}_cache_changed()
+            RETURNS trigger AS $$
+            DECLARE
+                tags text[] := '{{}}';
+            BEGIN
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    tags := tags || ARRAY(
+                        SELECT unnest(ARRAY[{row_tags}]) FROM new_rows
+                    );
+                END IF;
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    tags := tags || ARRAY(
+                        SELECT unnest(ARRAY[{row_tags}]) FROM old_rows
+                    );
+                END IF;{change_tags_sql(table)}
+                PERFORM cache_notify_tags(tags);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """
+        )
+        for suffix, event, referencing in EVENTS:
+            op.execute(
+                f"""
+                CREATE TRIGGER trg_{table}_cache_{suffix}
+                AFTER {event} ON {table}
+                {referencing}
+                FOR EACH STATEMENT EXECUTE FUNCTION {table}_cache_changed();
+                """
+            )
+        op.execute(
+            f"""
+            CREATE TRIGGER trg_{table}_cache_truncate
+            AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION cache_notify_all();
+            """
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLE_TAGS:
+        for suffix in ('truncate', 'delete', 'update', 'insert'):
+            op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_cache_{suffix} ON {table};")
+        op.execute(f"DROP FUNCTION IF EXISTS {table}_cache_changed();")
+    op.execute("DROP FUNCTION IF EXISTS cache_notify_all();")
+    op.execute("DROP FUNCTION IF EXISTS cache_notify_tags(text[]);")
@@ -0,0 +1,66 @@
+"""bulk import support
+
+Revision ID: 1c4e9a7d3b20
+Revises: e6f1a4c82d07
+Create Date: 2026-10-18 16:48:37.205914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c4e9a7d3b20'
+down_revision: Union[str, Sequence[str], None] = 'e6f1a4c82d07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Для ON CONFLICT при загрузке телефонов; дубликаты оставляем по меньшему id
+    op.execute(
+        """
+        DELETE FROM organization_phone duplicate
+        USING organization_phone kept
+        WHERE duplicate.organization_id = kept.organization_id
+          AND duplicate.phone = kept.phone
+          AND duplicate.id > kept.id;
+        """
+    )
+    op.create_unique_constraint(
+        'uq_organization_phone_org_phone',
+        'organization_phone',
+        ['organization_id', 'phone']
+    )
+
+    op.create_table(
+        'import_job',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('processed_records', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_import_job_updated_at
+        BEFORE UPDATE ON import_job
+        FOR EACH ROW
+        WHEN (OLD.* IS DISTINCT FROM NEW.*)
+        EXECUTE FUNCTION set_updated_at();
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS trg_import_job_updated_at ON import_job;")
+    op.drop_table('import_job')
+    op.drop_constraint('uq_organization_phone_org_phone', 'organization_phone', type_='unique')
@@ -0,0 +1,94 @@
+"""building organizations changed_at
+
+Revision ID: 1f7a3c9e5b62
+Revises: 0c5e2b7d9f14
+Create Date: 2026-10-18 21:47:09.664120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1f7a3c9e5b62'
+down_revision: Union[str, Sequence[str], None] = '0c5e2b7d9f14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+EVENTS = (
+    ('insert', 'INSERT', 'REFERENCING NEW TABLE AS new_rows'),
+    ('update', 'UPDATE', 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+    ('delete', 'DELETE', 'REFERENCING OLD TABLE AS old_rows'),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Версия списка организаций здания для ETag/Last-Modified
+    # /organizations/by_building: в отличие от max(organization.updated_at)
+    # сдвигается и при удалении организации
+    op.add_column(
+        'building',
+        sa.Column(
+            'organizations_changed_at',
+            sa.DateTime(timezone=True),
+            server_default=sa.text('now()'),
+            nullable=False
+        )
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION building_organizations_changed()
+        RETURNS trigger AS $$
+        DECLARE
+            building_ids int[];
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                building_ids := ARRAY(SELECT building_id FROM new_rows);
+            ELSIF TG_OP = 'DELETE' THEN
+                building_ids := ARRAY(SELECT building_id FROM old_rows);
+            ELSE
+                building_ids := ARRAY(
+                    SELECT building_id FROM old_rows
+                    UNION
+                    SELECT building_id FROM new_rows
+                );
+            END IF;
+            -- Блокируем здания по порядку id, чтобы параллельные
+            -- транзакции не ждали друг друга по кругу
+            PERFORM 1
+            FROM building
+            WHERE id = ANY(building_ids)
+            ORDER BY id
+            FOR NO KEY UPDATE;
+            UPDATE building
+            SET organizations_changed_at = now()
+            WHERE id = ANY(building_ids)
+              AND organizations_changed_at IS DISTINCT FROM now();
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for suffix, event, referencing in EVENTS:
+        op.execute(
+            f"""
+            CREATE TRIGGER trg_building_organizations_changed_{suffix}
+            AFTER {event} ON organization
+            {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION building_organizations_changed();
+            """
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for suffix, _, _ in EVENTS:
+        op.execute(
+            f"DROP TRIGGER IF EXISTS trg_building_organizations_changed_{suffix} ON organization;"
+        )
+    op.execute("DROP FUNCTION IF EXISTS building_organizations_changed();")
+    op.drop_column('building', 'organizations_changed_at')
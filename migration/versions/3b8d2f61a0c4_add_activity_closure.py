@@ -0,0 +1,123 @@
+"""add activity closure
+
+Revision ID: 3b8d2f61a0c4
+Revises: f501911fd08b
+Create Date: 2026-10-18 10:12:41.518302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8d2f61a0c4'
+down_revision: Union[str, Sequence[str], None] = 'f501911fd08b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'activity_closure',
+        sa.Column('ancestor_id', sa.Integer(), nullable=False),
+        sa.Column('descendant_id', sa.Integer(), nullable=False),
+        sa.Column('depth', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['ancestor_id'], ['activity.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['descendant_id'], ['activity.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index(
+        'ix_activity_closure_descendant_id',
+        'activity_closure',
+        ['descendant_id']
+    )
+
+    # Новая деятельность: сама себе предок + все предки родителя
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION activity_closure_after_insert()
+        RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO activity_closure (ancestor_id, descendant_id, depth)
+            SELECT NEW.id, NEW.id, 0
+            UNION ALL
+            SELECT ancestor_id, NEW.id, depth + 1
+            FROM activity_closure
+            WHERE descendant_id = NEW.parent_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    # Перенос поддерева: отрываем его от старых предков и
+    # подвешиваем ко всем предкам нового родителя
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION activity_closure_after_update()
+        RETURNS trigger AS $$
+        BEGIN
+            DELETE FROM activity_closure
+            WHERE descendant_id IN (
+                SELECT descendant_id FROM activity_closure WHERE ancestor_id = NEW.id
+            )
+            AND ancestor_id NOT IN (
+                SELECT descendant_id FROM activity_closure WHERE ancestor_id = NEW.id
+            );
+
+            INSERT INTO activity_closure (ancestor_id, descendant_id, depth)
+            SELECT sup.ancestor_id, sub.descendant_id, sup.depth + sub.depth + 1
+            FROM activity_closure sup
+            CROSS JOIN activity_closure sub
+            WHERE sup.descendant_id = NEW.parent_id
+              AND sub.ancestor_id = NEW.id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_activity_closure_insert
+        AFTER INSERT ON activity
+        FOR EACH ROW EXECUTE FUNCTION activity_closure_after_insert();
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_activity_closure_update
+        AFTER UPDATE OF parent_id ON activity
+        FOR EACH ROW
+        WHEN (OLD.parent_id IS DISTINCT FROM NEW.parent_id)
+        EXECUTE FUNCTION activity_closure_after_update();
+        """
+    )
+    # Удаление покрывается ON DELETE CASCADE на внешних ключах
+
+    # Заполнение по уже существующим данным
+    op.execute(
+        """
+        INSERT INTO activity_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE tree AS (
+            SELECT id AS ancestor_id, id AS descendant_id, 0 AS depth
+            FROM activity
+            UNION ALL
+            SELECT tree.ancestor_id, activity.id, tree.depth + 1
+            FROM tree
+            JOIN activity ON activity.parent_id = tree.descendant_id
+        )
+        SELECT ancestor_id, descendant_id, depth FROM tree;
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS trg_activity_closure_update ON activity;")
+    op.execute("DROP TRIGGER IF EXISTS trg_activity_closure_insert ON activity;")
+    op.execute("DROP FUNCTION IF EXISTS activity_closure_after_update();")
+    op.execute("DROP FUNCTION IF EXISTS activity_closure_after_insert();")
+    op.drop_index('ix_activity_closure_descendant_id', table_name='activity_closure')
+    op.drop_table('activity_closure')
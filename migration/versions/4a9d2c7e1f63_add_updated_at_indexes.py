@@ -0,0 +1,50 @@
+"""add updated_at indexes
+
+Revision ID: 4a9d2c7e1f63
+Revises: 1c4e9a7d3b20
+Create Date: 2026-10-18 17:21:04.913562
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4a9d2c7e1f63'
+down_revision: Union[str, Sequence[str], None] = '1c4e9a7d3b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Для выгрузки с updated_since
+INDEXES = (
+    ('ix_organization_updated_at', 'organization', 'updated_at'),
+    ('ix_building_updated_at', 'building', 'updated_at'),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, column in INDEXES:
+            op.create_index(
+                name,
+                table,
+                [column],
+                postgresql_concurrently=True,
+                if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True
+            )
@@ -0,0 +1,117 @@
+"""building stored geography
+
+Revision ID: 5f0a9c3e7d12
+Revises: 8e41c7d09a5b
+Create Date: 2026-10-18 12:20:54.771093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f0a9c3e7d12'
+down_revision: Union[str, Sequence[str], None] = '8e41c7d09a5b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Строк building за одно UPDATE при заполнении geog
+BACKFILL_BATCH_SIZE = 10000
+GEOG = "geography(ST_SetSRID(ST_MakePoint({0}longitude, {0}latitude), 4326))"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Хранимая колонка вместо индекса по выражению: запросам больше не
+    # нужно повторять выражение дословно, и точка не пересчитывается
+    # для каждой проверяемой строки.
+    #
+    # Колонка добавляется без перезаписи таблицы (nullable, без default)
+    # и поддерживается триггером, а не GENERATED ... STORED: тот
+    # перезаписал бы building целиком под ACCESS EXCLUSIVE
+    op.execute("ALTER TABLE building ADD COLUMN geog geography(Point, 4326);")
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION building_set_geog()
+        RETURNS trigger AS $$
+        BEGIN
+            NEW.geog := {GEOG.format('NEW.')};
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_building_geog
+        BEFORE INSERT OR UPDATE OF longitude, latitude ON building
+        FOR EACH ROW EXECUTE FUNCTION building_set_geog();
+        """
+    )
+
+    # Заполнение пачками по id, каждая пачка в своей транзакции: блокируются
+    # только строки пачки. Строки, вставленные или сдвинутые после
+    # коммита триггера, он уже заполнил сам. Индекс строится CONCURRENTLY
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        after = 0
+        while True:
+            after = bind.execute(
+                sa.text(
+                    f"""
+                    WITH batch AS (
+                        SELECT id FROM building
+                        WHERE id > :after
+                        ORDER BY id
+                        LIMIT :size
+                    ), filled AS (
+                        UPDATE building b
+                        SET geog = {GEOG.format('b.')}
+                        FROM batch
+                        WHERE b.id = batch.id AND b.geog IS NULL
+                    )
+                    SELECT max(id) FROM batch
+                    """
+                ),
+                {'after': after, 'size': BACKFILL_BATCH_SIZE}
+            ).scalar()
+            if after is None:
+                break
+        op.create_index(
+            'ix_building_geog',
+            'building',
+            ['geog'],
+            postgresql_using='gist',
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+        op.drop_index(
+            'ix_building_geo_geog',
+            table_name='building',
+            postgresql_concurrently=True,
+            if_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute(
+            f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_building_geo_geog
+            ON building
+            USING GIST ({GEOG.format('')});
+            """
+        )
+        op.drop_index(
+            'ix_building_geog',
+            table_name='building',
+            postgresql_concurrently=True,
+            if_exists=True
+        )
+    op.execute("DROP TRIGGER IF EXISTS trg_building_geog ON building;")
+    op.execute("DROP FUNCTION IF EXISTS building_set_geog();")
+    op.drop_column('building', 'geog')
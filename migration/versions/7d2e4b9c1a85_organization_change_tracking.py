@@ -0,0 +1,136 @@
+"""organization change tracking
+
+Revision ID: 7d2e4b9c1a85
+Revises: 1f7a3c9e5b62
+Create Date: 2026-10-18 22:06:31.207415
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2e4b9c1a85'
+down_revision: Union[str, Sequence[str], None] = '1f7a3c9e5b62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+EVENTS = (
+    ('insert', 'INSERT', 'REFERENCING NEW TABLE AS new_rows'),
+    ('update', 'UPDATE', 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+    ('delete', 'DELETE', 'REFERENCING OLD TABLE AS old_rows'),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Смена деятельностей сдвигает organization.updated_at, чтобы
+    # организация попала в выгрузку с updated_since
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION organization_activity_touch()
+        RETURNS trigger AS $$
+        DECLARE
+            org_ids int[];
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                org_ids := ARRAY(SELECT organization_id FROM new_rows);
+            ELSIF TG_OP = 'DELETE' THEN
+                org_ids := ARRAY(SELECT organization_id FROM old_rows);
+            ELSE
+                org_ids := ARRAY(
+                    SELECT organization_id FROM old_rows
+                    UNION
+                    SELECT organization_id FROM new_rows
+                );
+            END IF;
+            PERFORM 1
+            FROM organization
+            WHERE id = ANY(org_ids)
+            ORDER BY id
+            FOR NO KEY UPDATE;
+            UPDATE organization
+            SET updated_at = now()
+            WHERE id = ANY(org_ids);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for suffix, event, referencing in EVENTS:
+        op.execute(
+            f"""
+            CREATE TRIGGER trg_organization_activity_touch_{suffix}
+            AFTER {event} ON organization_activity
+            {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION organization_activity_touch();
+            """
+        )
+
+    # Удалённые организации для инкрементальной выгрузки. Повторная
+    # вставка того же id (например, массовой загрузкой) снимает запись
+    op.create_table(
+        'organization_tombstone',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('building_id', sa.Integer(), nullable=False),
+        sa.Column(
+            'deleted_at',
+            sa.DateTime(timezone=True),
+            server_default=sa.text('now()'),
+            nullable=False
+        ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_organization_tombstone_deleted_at',
+        'organization_tombstone',
+        ['deleted_at']
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION organization_tombstone_sync()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO organization_tombstone (id, building_id, deleted_at)
+                SELECT id, building_id, now() FROM old_rows
+                ON CONFLICT (id) DO UPDATE
+                SET building_id = EXCLUDED.building_id,
+                    deleted_at = EXCLUDED.deleted_at;
+            ELSE
+                DELETE FROM organization_tombstone
+                WHERE id IN (SELECT id FROM new_rows);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for suffix, event, referencing in EVENTS:
+        if suffix == 'update':
+            continue
+        op.execute(
+            f"""
+            CREATE TRIGGER trg_organization_tombstone_{suffix}
+            AFTER {event} ON organization
+            {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION organization_tombstone_sync();
+            """
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for suffix in ('delete', 'insert'):
+        op.execute(f"DROP TRIGGER IF EXISTS trg_organization_tombstone_{suffix} ON organization;")
+    op.execute("DROP FUNCTION IF EXISTS organization_tombstone_sync();")
+    op.drop_index('ix_organization_tombstone_deleted_at', table_name='organization_tombstone')
+    op.drop_table('organization_tombstone')
+    for suffix, _, _ in EVENTS:
+        op.execute(
+            f"DROP TRIGGER IF EXISTS trg_organization_activity_touch_{suffix} ON organization_activity;"
+        )
+    op.execute("DROP FUNCTION IF EXISTS organization_activity_touch();")
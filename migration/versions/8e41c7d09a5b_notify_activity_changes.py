@@ -0,0 +1,48 @@
+"""notify activity changes
+
+Revision ID: 8e41c7d09a5b
+Revises: 3b8d2f61a0c4
+Create Date: 2026-10-18 11:03:17.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e41c7d09a5b'
+down_revision: Union[str, Sequence[str], None] = '3b8d2f61a0c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Приложение держит дерево деятельностей в памяти и
+    # пересобирает его по этому уведомлению
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION activity_notify_changed()
+        RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('activity_changed', TG_OP);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_activity_notify_changed
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON activity
+        FOR EACH STATEMENT EXECUTE FUNCTION activity_notify_changed();
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS trg_activity_notify_changed ON activity;")
+    op.execute("DROP FUNCTION IF EXISTS activity_notify_changed();")
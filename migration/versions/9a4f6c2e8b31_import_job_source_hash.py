@@ -0,0 +1,29 @@
+"""import job source hash
+
+Revision ID: 9a4f6c2e8b31
+Revises: 7d2e4b9c1a85
+Create Date: 2026-10-18 23:41:09.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4f6c2e8b31'
+down_revision: Union[str, Sequence[str], None] = '7d2e4b9c1a85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # sha256 загружаемого файла: продолжать задачу можно только с тем же файлом
+    op.add_column('import_job', sa.Column('source_hash', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('import_job', 'source_hash')
@@ -0,0 +1,48 @@
+"""organization name search indexes
+
+Revision ID: a7c3e5b19f86
+Revises: 5f0a9c3e7d12
+Create Date: 2026-10-18 13:41:09.385120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e5b19f86'
+down_revision: Union[str, Sequence[str], None] = '5f0a9c3e7d12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    # Точный поиск по названию
+    op.create_index('ix_organization_name', 'organization', ['name'])
+    # Префиксный (ILIKE 'abc%') и нечёткий (%) поиск
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_organization_name_trgm
+        ON organization
+        USING GIN (name gin_trgm_ops);
+        """
+    )
+    # Полнотекстовый поиск, выражение должно совпадать с запросом
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_organization_name_tsv
+        ON organization
+        USING GIN (to_tsvector('russian', name));
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS ix_organization_name_tsv;")
+    op.execute("DROP INDEX IF EXISTS ix_organization_name_trgm;")
+    op.drop_index('ix_organization_name', table_name='organization')
@@ -0,0 +1,146 @@
+"""organization grid delta
+
+Revision ID: b5e1d8a4c702
+Revises: 9a4f6c2e8b31
+Create Date: 2026-10-18 23:58:44.106927
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e1d8a4c702'
+down_revision: Union[str, Sequence[str], None] = '9a4f6c2e8b31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+APPLY_TO_GRID = """
+    INSERT INTO organization_grid AS g (zoom, cell_x, cell_y, org_count, sum_lon, sum_lat)
+    SELECT c.zoom, c.cell_x, c.cell_y,
+           sum(d.delta), sum(d.delta * d.lon), sum(d.delta * d.lat)
+    FROM unnest(lons, lats, deltas) AS d(lon, lat, delta)
+    CROSS JOIN LATERAL organization_grid_cells(d.lon, d.lat) AS c
+    WHERE d.lon IS NOT NULL AND d.lat IS NOT NULL
+    GROUP BY c.zoom, c.cell_x, c.cell_y
+    ORDER BY c.zoom, c.cell_x, c.cell_y
+    ON CONFLICT (zoom, cell_x, cell_y) DO UPDATE SET
+        org_count = g.org_count + EXCLUDED.org_count,
+        sum_lon = g.sum_lon + EXCLUDED.sum_lon,
+        sum_lat = g.sum_lat + EXCLUDED.sum_lat;
+"""
+
+APPLY_TO_DELTA = """
+    INSERT INTO organization_grid_delta (zoom, cell_x, cell_y, org_count, sum_lon, sum_lat)
+    SELECT c.zoom, c.cell_x, c.cell_y,
+           sum(d.delta), sum(d.delta * d.lon), sum(d.delta * d.lat)
+    FROM unnest(lons, lats, deltas) AS d(lon, lat, delta)
+    CROSS JOIN LATERAL organization_grid_cells(d.lon, d.lat) AS c
+    WHERE d.lon IS NOT NULL AND d.lat IS NOT NULL
+    GROUP BY c.zoom, c.cell_x, c.cell_y;
+"""
+
+
+def create_apply(body: str) -> None:
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION organization_grid_apply(lons float8[], lats float8[], deltas int[])
+        RETURNS void AS $$
+        BEGIN
+            {body}
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Ячейки масштабов 0-2 общие почти для всех точек: прямой upsert в
+    # organization_grid делал любую запись в organization последовательной
+    # на этих строках. Триггеры теперь только дописывают дельты, без
+    # конфликтов и блокировок, а organization_grid_fold переносит их в
+    # organization_grid. Чтение складывает сетку и ещё не свёрнутые дельты.
+    op.create_table(
+        'organization_grid_delta',
+        sa.Column('id', sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column('zoom', sa.SmallInteger(), nullable=False),
+        sa.Column('cell_x', sa.Integer(), nullable=False),
+        sa.Column('cell_y', sa.Integer(), nullable=False),
+        sa.Column('org_count', sa.Integer(), nullable=False),
+        sa.Column('sum_lon', sa.Float(), nullable=False),
+        sa.Column('sum_lat', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_organization_grid_delta_cell',
+        'organization_grid_delta',
+        ['zoom', 'cell_x', 'cell_y']
+    )
+    create_apply(APPLY_TO_DELTA)
+    # Переносит до batch_size самых старых дельт в organization_grid и
+    # возвращает их число. Сворачивает один процесс на всю базу: остальные
+    # получают 0 и ждут следующего прохода. Ячейки обновляются по порядку
+    # ключа, как раньше в organization_grid_apply
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION organization_grid_fold(batch_size int)
+        RETURNS int AS $$
+        DECLARE
+            folded int;
+        BEGIN
+            IF NOT pg_try_advisory_xact_lock(hashtext('organization_grid_fold')) THEN
+                RETURN 0;
+            END IF;
+            WITH moved AS (
+                DELETE FROM organization_grid_delta
+                WHERE id IN (
+                    SELECT id FROM organization_grid_delta ORDER BY id LIMIT batch_size
+                )
+                RETURNING zoom, cell_x, cell_y, org_count, sum_lon, sum_lat
+            ), applied AS (
+                INSERT INTO organization_grid AS g (zoom, cell_x, cell_y, org_count, sum_lon, sum_lat)
+                SELECT zoom, cell_x, cell_y, sum(org_count), sum(sum_lon), sum(sum_lat)
+                FROM moved
+                GROUP BY zoom, cell_x, cell_y
+                ORDER BY zoom, cell_x, cell_y
+                ON CONFLICT (zoom, cell_x, cell_y) DO UPDATE SET
+                    org_count = g.org_count + EXCLUDED.org_count,
+                    sum_lon = g.sum_lon + EXCLUDED.sum_lon,
+                    sum_lat = g.sum_lat + EXCLUDED.sum_lat
+            )
+            SELECT count(*) INTO folded FROM moved;
+            RETURN folded;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    create_apply(APPLY_TO_GRID)
+    # Оставшиеся дельты - в сетку, не дожидаясь свёртки
+    op.execute(
+        """
+        WITH moved AS (
+            DELETE FROM organization_grid_delta
+            RETURNING zoom, cell_x, cell_y, org_count, sum_lon, sum_lat
+        )
+        INSERT INTO organization_grid AS g (zoom, cell_x, cell_y, org_count, sum_lon, sum_lat)
+        SELECT zoom, cell_x, cell_y, sum(org_count), sum(sum_lon), sum(sum_lat)
+        FROM moved
+        GROUP BY zoom, cell_x, cell_y
+        ORDER BY zoom, cell_x, cell_y
+        ON CONFLICT (zoom, cell_x, cell_y) DO UPDATE SET
+            org_count = g.org_count + EXCLUDED.org_count,
+            sum_lon = g.sum_lon + EXCLUDED.sum_lon,
+            sum_lat = g.sum_lat + EXCLUDED.sum_lat;
+        """
+    )
+    op.execute("DROP FUNCTION IF EXISTS organization_grid_fold(int);")
+    op.drop_index('ix_organization_grid_delta_cell', table_name='organization_grid_delta')
+    op.drop_table('organization_grid_delta')
@@ -0,0 +1,153 @@
+"""tile index and change notifications
+
+Revision ID: b7d31e95c0a8
+Revises: 4a9d2c7e1f63
+Create Date: 2026-10-18 18:02:41.386215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d31e95c0a8'
+down_revision: Union[str, Sequence[str], None] = '4a9d2c7e1f63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Транзитные таблицы нельзя объявить у триггера на несколько событий,
+# поэтому на каждую таблицу по три триггера с одной функцией
+TRIGGERS = {
+    'building': 'building_tiles_changed',
+    'organization': 'organization_tiles_changed',
+    'organization_activity': 'organization_activity_tiles_changed',
+}
+EVENTS = (
+    ('insert', 'INSERT', 'REFERENCING NEW TABLE AS new_rows'),
+    ('update', 'UPDATE', 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+    ('delete', 'DELETE', 'REFERENCING OLD TABLE AS old_rows'),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Точки зданий в EPSG:3857 для отбора по ST_TileEnvelope
+    with op.get_context().autocommit_block():
+        op.execute(
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_building_geom_3857
+            ON building
+            USING GIST (ST_Transform(geometry(geog), 3857));
+            """
+        )
+
+    # Приложение держит векторные тайлы в кэше и сбрасывает тайлы,
+    # пересекающие охват (minLon,minLat,maxLon,maxLat) из уведомления
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION tiles_notify_extent(extent box2d)
+        RETURNS void AS $$
+        BEGIN
+            IF extent IS NOT NULL THEN
+                PERFORM pg_notify(
+                    'tiles_changed',
+                    concat_ws(',', ST_XMin(extent), ST_YMin(extent),
+                                   ST_XMax(extent), ST_YMax(extent))
+                );
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION building_tiles_changed()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM tiles_notify_extent(
+                    (SELECT ST_Extent(geometry(geog)) FROM new_rows)
+                );
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM tiles_notify_extent(
+                    (SELECT ST_Extent(geometry(geog)) FROM old_rows)
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION organization_tiles_changed()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM tiles_notify_extent((
+                    SELECT ST_Extent(geometry(b.geog))
+                    FROM new_rows r JOIN building b ON b.id = r.building_id
+                ));
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM tiles_notify_extent((
+                    SELECT ST_Extent(geometry(b.geog))
+                    FROM old_rows r JOIN building b ON b.id = r.building_id
+                ));
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION organization_activity_tiles_changed()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM tiles_notify_extent((
+                    SELECT ST_Extent(geometry(b.geog))
+                    FROM new_rows r
+                    JOIN organization o ON o.id = r.organization_id
+                    JOIN building b ON b.id = o.building_id
+                ));
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM tiles_notify_extent((
+                    SELECT ST_Extent(geometry(b.geog))
+                    FROM old_rows r
+                    JOIN organization o ON o.id = r.organization_id
+                    JOIN building b ON b.id = o.building_id
+                ));
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for table, function in TRIGGERS.items():
+        for suffix, event, referencing in EVENTS:
+            op.execute(
+                f"""
+                CREATE TRIGGER trg_{table}_tiles_{suffix}
+                AFTER {event} ON {table}
+                {referencing}
+                FOR EACH STATEMENT EXECUTE FUNCTION {function}();
+                """
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, function in TRIGGERS.items():
+        for suffix, _, _ in EVENTS:
+            op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_tiles_{suffix} ON {table};")
+        op.execute(f"DROP FUNCTION IF EXISTS {function}();")
+    op.execute("DROP FUNCTION IF EXISTS tiles_notify_extent(box2d);")
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_building_geom_3857;")
@@ -0,0 +1,208 @@
+"""organization grid
+
+Revision ID: c3f8a61d2e47
+Revises: b7d31e95c0a8
+Create Date: 2026-10-18 18:47:12.508391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f8a61d2e47'
+down_revision: Union[str, Sequence[str], None] = 'b7d31e95c0a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Должны совпадать с GRID_MAX_ZOOM и GRID_SUBDIVISION в app.schemas.geo
+GRID_MAX_ZOOM = 16
+GRID_SUBDIVISION = 2
+
+EVENTS = (
+    ('insert', 'INSERT', 'REFERENCING NEW TABLE AS new_rows'),
+    ('update', 'UPDATE', 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+    ('delete', 'DELETE', 'REFERENCING OLD TABLE AS old_rows'),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'organization_grid',
+        sa.Column('zoom', sa.SmallInteger(), nullable=False),
+        sa.Column('cell_x', sa.Integer(), nullable=False),
+        sa.Column('cell_y', sa.Integer(), nullable=False),
+        sa.Column('org_count', sa.Integer(), nullable=False),
+        sa.Column('sum_lon', sa.Float(), nullable=False),
+        sa.Column('sum_lat', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('zoom', 'cell_x', 'cell_y')
+    )
+
+    # Ячейки точки на всех масштабах, нумерация как у тайлов XYZ
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION organization_grid_cells(lon float8, lat float8)
+        RETURNS TABLE (zoom smallint, cell_x int, cell_y int) AS $$
+            SELECT
+                z::smallint,
+                floor((ST_X(p) + 20037508.342789244) / (40075016.68557849 / 2 ^ (z + {GRID_SUBDIVISION})))::int,
+                floor((20037508.342789244 - ST_Y(p)) / (40075016.68557849 / 2 ^ (z + {GRID_SUBDIVISION})))::int
+            FROM generate_series(0, {GRID_MAX_ZOOM}) AS z,
+                 ST_Transform(
+                     ST_SetSRID(ST_MakePoint(lon, greatest(least(lat, 85.0511), -85.0511)), 4326),
+                     3857
+                 ) AS p
+        $$ LANGUAGE sql IMMUTABLE;
+        """
+    )
+    # deltas[i] организаций добавляется в точку (lons[i], lats[i]).
+    # Ячейки обновляются по порядку ключа: параллельные транзакции берут
+    # блокировки строк в одном порядке и не взаимоблокируются. Миграция
+    # b5e1d8a4c702 заменяет функцию записью в organization_grid_delta:
+    # ячейки масштабов 0-2 общие почти для всех точек
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION organization_grid_apply(lons float8[], lats float8[], deltas int[])
+        RETURNS void AS $$
+        BEGIN
+            INSERT INTO organization_grid AS g (zoom, cell_x, cell_y, org_count, sum_lon, sum_lat)
+            SELECT c.zoom, c.cell_x, c.cell_y,
+                   sum(d.delta), sum(d.delta * d.lon), sum(d.delta * d.lat)
+            FROM unnest(lons, lats, deltas) AS d(lon, lat, delta)
+            CROSS JOIN LATERAL organization_grid_cells(d.lon, d.lat) AS c
+            WHERE d.lon IS NOT NULL AND d.lat IS NOT NULL
+            GROUP BY c.zoom, c.cell_x, c.cell_y
+            ORDER BY c.zoom, c.cell_x, c.cell_y
+            ON CONFLICT (zoom, cell_x, cell_y) DO UPDATE SET
+                org_count = g.org_count + EXCLUDED.org_count,
+                sum_lon = g.sum_lon + EXCLUDED.sum_lon,
+                sum_lat = g.sum_lat + EXCLUDED.sum_lat;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION organization_grid_organization_changed()
+        RETURNS trigger AS $$
+        DECLARE
+            lons float8[];
+            lats float8[];
+            deltas int[];
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                SELECT array_agg(b.longitude), array_agg(b.latitude), array_agg(1)
+                INTO lons, lats, deltas
+                FROM new_rows r JOIN building b ON b.id = r.building_id;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT array_agg(b.longitude), array_agg(b.latitude), array_agg(-1)
+                INTO lons, lats, deltas
+                FROM old_rows r JOIN building b ON b.id = r.building_id;
+            ELSE
+                -- Переезд организации в другое здание
+                SELECT array_agg(b.longitude), array_agg(b.latitude), array_agg(r.delta)
+                INTO lons, lats, deltas
+                FROM (
+                    SELECT o.building_id, -1 AS delta
+                    FROM old_rows o JOIN new_rows n ON n.id = o.id
+                    WHERE o.building_id IS DISTINCT FROM n.building_id
+                    UNION ALL
+                    SELECT n.building_id, 1
+                    FROM old_rows o JOIN new_rows n ON n.id = o.id
+                    WHERE o.building_id IS DISTINCT FROM n.building_id
+                ) r
+                JOIN building b ON b.id = r.building_id;
+            END IF;
+            IF lons IS NOT NULL THEN
+                PERFORM organization_grid_apply(lons, lats, deltas);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    # Вставка и удаление здания сетку не меняют: удалить здание
+    # с организациями не даёт внешний ключ
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION organization_grid_building_moved()
+        RETURNS trigger AS $$
+        DECLARE
+            lons float8[];
+            lats float8[];
+            deltas int[];
+        BEGIN
+            SELECT array_agg(m.lon), array_agg(m.lat), array_agg(m.delta)
+            INTO lons, lats, deltas
+            FROM (
+                SELECT o.longitude AS lon, o.latitude AS lat, -count(org.id)::int AS delta
+                FROM old_rows o
+                JOIN new_rows n ON n.id = o.id
+                JOIN organization org ON org.building_id = o.id
+                WHERE (o.longitude, o.latitude) IS DISTINCT FROM (n.longitude, n.latitude)
+                GROUP BY o.id, o.longitude, o.latitude
+                UNION ALL
+                SELECT n.longitude, n.latitude, count(org.id)::int
+                FROM old_rows o
+                JOIN new_rows n ON n.id = o.id
+                JOIN organization org ON org.building_id = n.id
+                WHERE (o.longitude, o.latitude) IS DISTINCT FROM (n.longitude, n.latitude)
+                GROUP BY n.id, n.longitude, n.latitude
+            ) m;
+            IF lons IS NOT NULL THEN
+                PERFORM organization_grid_apply(lons, lats, deltas);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for suffix, event, referencing in EVENTS:
+        op.execute(
+            f"""
+            CREATE TRIGGER trg_organization_grid_{suffix}
+            AFTER {event} ON organization
+            {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION organization_grid_organization_changed();
+            """
+        )
+    op.execute(
+        """
+        CREATE TRIGGER trg_building_organization_grid
+        AFTER UPDATE ON building
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION organization_grid_building_moved();
+        """
+    )
+
+    # Начальное заполнение по существующим организациям
+    op.execute(
+        """
+        SELECT organization_grid_apply(
+            array_agg(b.longitude), array_agg(b.latitude), array_agg(c.org_count)
+        )
+        FROM (
+            SELECT building_id, count(*)::int AS org_count
+            FROM organization
+            GROUP BY building_id
+        ) c
+        JOIN building b ON b.id = c.building_id
+        HAVING count(*) > 0;
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS trg_building_organization_grid ON building;")
+    for suffix, _, _ in EVENTS:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_organization_grid_{suffix} ON organization;")
+    op.execute("DROP FUNCTION IF EXISTS organization_grid_building_moved();")
+    op.execute("DROP FUNCTION IF EXISTS organization_grid_organization_changed();")
+    op.execute("DROP FUNCTION IF EXISTS organization_grid_apply(float8[], float8[], int[]);")
+    op.execute("DROP FUNCTION IF EXISTS organization_grid_cells(float8, float8);")
+    op.drop_table('organization_grid')
@@ -0,0 +1,52 @@
+"""add foreign key indexes
+
+Revision ID: c94d1e27b8a3
+Revises: a7c3e5b19f86
+Create Date: 2026-10-18 14:28:33.640917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c94d1e27b8a3'
+down_revision: Union[str, Sequence[str], None] = 'a7c3e5b19f86'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = (
+    ('ix_organization_building_id', 'organization', 'building_id'),
+    ('ix_organization_phone_organization_id', 'organization_phone', 'organization_id'),
+    ('ix_organization_activity_activity_id', 'organization_activity', 'activity_id'),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в таблицы, но не может
+    # выполняться внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, column in INDEXES:
+            op.create_index(
+                name,
+                table,
+                [column],
+                postgresql_concurrently=True,
+                if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True
+            )
@@ -0,0 +1,134 @@
+"""organization phone_numbers read model
+
+Revision ID: d2b6f08e4c51
+Revises: c94d1e27b8a3
+Create Date: 2026-10-18 15:17:46.902214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2b6f08e4c51'
+down_revision: Union[str, Sequence[str], None] = 'c94d1e27b8a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'organization',
+        sa.Column(
+            'phone_numbers',
+            postgresql.ARRAY(sa.String()),
+            server_default=sa.text("'{}'"),
+            nullable=False
+        )
+    )
+
+    # Сначала блокируем организации (по порядку id, без взаимоблокировок),
+    # и только потом пересчитываем: в READ COMMITTED UPDATE берёт снимок
+    # до ожидания блокировки строки, и подзапрос ARRAY(...) не увидел бы
+    # телефоны параллельной транзакции, закоммиченные за время ожидания.
+    # Следующий оператор plpgsql берёт новый снимок, уже после блокировки
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION organization_refresh_phone_numbers(org_ids integer[])
+        RETURNS void AS $$
+        BEGIN
+            PERFORM 1
+            FROM organization
+            WHERE id = ANY(org_ids)
+            ORDER BY id
+            FOR NO KEY UPDATE;
+
+            UPDATE organization
+            SET phone_numbers = ARRAY(
+                SELECT phone
+                FROM organization_phone
+                WHERE organization_phone.organization_id = organization.id
+                ORDER BY organization_phone.id
+            )
+            WHERE organization.id = ANY(org_ids);
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    # Триггеры уровня оператора с transition-таблицами: пакетная
+    # вставка телефонов обновляет каждую организацию один раз
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION organization_phone_sync()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM organization_refresh_phone_numbers(
+                    ARRAY(SELECT DISTINCT organization_id FROM new_rows)
+                );
+            ELSIF TG_OP = 'UPDATE' THEN
+                PERFORM organization_refresh_phone_numbers(
+                    ARRAY(
+                        SELECT organization_id FROM old_rows
+                        UNION
+                        SELECT organization_id FROM new_rows
+                    )
+                );
+            ELSIF TG_OP = 'DELETE' THEN
+                PERFORM organization_refresh_phone_numbers(
+                    ARRAY(SELECT DISTINCT organization_id FROM old_rows)
+                );
+            ELSE
+                UPDATE organization SET phone_numbers = '{}' WHERE phone_numbers <> '{}';
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_organization_phone_sync_insert
+        AFTER INSERT ON organization_phone
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION organization_phone_sync();
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_organization_phone_sync_update
+        AFTER UPDATE ON organization_phone
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION organization_phone_sync();
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_organization_phone_sync_delete
+        AFTER DELETE ON organization_phone
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION organization_phone_sync();
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_organization_phone_sync_truncate
+        AFTER TRUNCATE ON organization_phone
+        FOR EACH STATEMENT EXECUTE FUNCTION organization_phone_sync();
+        """
+    )
+
+    op.execute("SELECT organization_refresh_phone_numbers(ARRAY(SELECT id FROM organization));")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for suffix in ('truncate', 'delete', 'update', 'insert'):
+        op.execute(f"DROP TRIGGER IF EXISTS trg_organization_phone_sync_{suffix} ON organization_phone;")
+    op.execute("DROP FUNCTION IF EXISTS organization_phone_sync();")
+    op.execute("DROP FUNCTION IF EXISTS organization_refresh_phone_numbers(integer[]);")
+    op.drop_column('organization', 'phone_numbers')
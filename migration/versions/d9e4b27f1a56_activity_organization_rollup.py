@@ -0,0 +1,349 @@
+"""activity organization rollup
+
+Revision ID: d9e4b27f1a56
+Revises: c3f8a61d2e47
+Create Date: 2026-10-18 19:26:55.731042
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9e4b27f1a56'
+down_revision: Union[str, Sequence[str], None] = 'c3f8a61d2e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+EVENTS = (
+    ('insert', 'INSERT', 'REFERENCING NEW TABLE AS new_rows'),
+    ('update', 'UPDATE', 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+    ('delete', 'DELETE', 'REFERENCING OLD TABLE AS old_rows'),
+)
+ACTIVITY_EVENTS = EVENTS[:2]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Сколько деятельностей организации входит в поддерево предка:
+    # организация считается в поддереве, пока links > 0
+    op.create_table(
+        'activity_organization_link',
+        sa.Column('ancestor_id', sa.Integer(), nullable=False),
+        sa.Column('organization_id', sa.Integer(), nullable=False),
+        sa.Column('links', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['ancestor_id'], ['activity.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('ancestor_id', 'organization_id')
+    )
+    op.create_index(
+        'ix_activity_organization_link_organization_id',
+        'activity_organization_link',
+        ['organization_id']
+    )
+    op.create_table(
+        'activity_org_count',
+        sa.Column('activity_id', sa.Integer(), nullable=False),
+        sa.Column('direct_count', sa.Integer(), nullable=False),
+        sa.Column('subtree_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['activity_id'], ['activity.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('activity_id')
+    )
+
+    # links организации organization_ids[i] в поддереве ancestor_ids[i]
+    # меняется на deltas[i]; пары не повторяются. Upsert'ы идут по порядку
+    # ключа, чтобы параллельные транзакции блокировали строки в одном порядке
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION activity_rollup_apply_links(
+            ancestor_ids int[], organization_ids int[], deltas int[]
+        )
+        RETURNS void AS $$
+        BEGIN
+            WITH changes AS (
+                SELECT *
+                FROM unnest(ancestor_ids, organization_ids, deltas)
+                    AS d(ancestor_id, organization_id, n)
+            ), changed AS (
+                INSERT INTO activity_organization_link AS l (ancestor_id, organization_id, links)
+                SELECT ancestor_id, organization_id, n FROM changes
+                ORDER BY ancestor_id, organization_id
+                ON CONFLICT (ancestor_id, organization_id) DO UPDATE
+                    SET links = l.links + EXCLUDED.links
+                RETURNING l.ancestor_id, l.organization_id, l.links
+            )
+            -- Организация вошла в поддерево (links стал > 0) или вышла из него
+            INSERT INTO activity_org_count AS c (activity_id, direct_count, subtree_count)
+            SELECT ch.ancestor_id, 0, sum(
+                CASE
+                    WHEN ch.links > 0 AND ch.links - d.n <= 0 THEN 1
+                    WHEN ch.links <= 0 AND ch.links - d.n > 0 THEN -1
+                    ELSE 0
+                END
+            )
+            FROM changed ch
+            JOIN changes d
+                ON d.ancestor_id = ch.ancestor_id AND d.organization_id = ch.organization_id
+            GROUP BY ch.ancestor_id
+            ORDER BY ch.ancestor_id
+            ON CONFLICT (activity_id) DO UPDATE
+                SET subtree_count = c.subtree_count + EXCLUDED.subtree_count;
+
+            DELETE FROM activity_organization_link l
+            USING unnest(organization_ids) AS o(id)
+            WHERE l.organization_id = o.id AND l.links <= 0;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    # sign = 1 - связи (org_ids[i], activity_ids[i]) добавлены, -1 - удалены
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION activity_rollup_apply(org_ids int[], activity_ids int[], sign int)
+        RETURNS void AS $$
+        DECLARE
+            link_ancestor_ids int[];
+            link_organization_ids int[];
+            link_deltas int[];
+        BEGIN
+            INSERT INTO activity_org_count AS c (activity_id, direct_count, subtree_count)
+            SELECT a.activity_id, sign * count(*), 0
+            FROM unnest(activity_ids) AS a(activity_id)
+            GROUP BY a.activity_id
+            ORDER BY a.activity_id
+            ON CONFLICT (activity_id) DO UPDATE
+                SET direct_count = c.direct_count + EXCLUDED.direct_count;
+
+            SELECT array_agg(d.ancestor_id), array_agg(d.organization_id), array_agg(d.n)
+            INTO link_ancestor_ids, link_organization_ids, link_deltas
+            FROM (
+                SELECT cl.ancestor_id, r.organization_id, sign * count(*)::int AS n
+                FROM unnest(org_ids, activity_ids) AS r(organization_id, activity_id)
+                JOIN activity_closure cl ON cl.descendant_id = r.activity_id
+                GROUP BY cl.ancestor_id, r.organization_id
+            ) d;
+            IF link_ancestor_ids IS NOT NULL THEN
+                PERFORM activity_rollup_apply_links(link_ancestor_ids, link_organization_ids, link_deltas);
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION activity_rollup_organization_activity_changed()
+        RETURNS trigger AS $$
+        DECLARE
+            org_ids int[];
+            activity_ids int[];
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                SELECT array_agg(organization_id), array_agg(activity_id)
+                INTO org_ids, activity_ids
+                FROM old_rows;
+                IF org_ids IS NOT NULL THEN
+                    PERFORM activity_rollup_apply(org_ids, activity_ids, -1);
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT array_agg(organization_id), array_agg(activity_id)
+                INTO org_ids, activity_ids
+                FROM new_rows;
+                IF org_ids IS NOT NULL THEN
+                    PERFORM activity_rollup_apply(org_ids, activity_ids, 1);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    # Полный пересчёт - для команды app.commands.activity_rollup и
+    # начального заполнения, триггеры его не вызывают
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION activity_rollup_rebuild()
+        RETURNS void AS $$
+        BEGIN
+            DELETE FROM activity_organization_link;
+            DELETE FROM activity_org_count;
+            INSERT INTO activity_organization_link (ancestor_id, organization_id, links)
+            SELECT cl.ancestor_id, oa.organization_id, count(*)
+            FROM organization_activity oa
+            JOIN activity_closure cl ON cl.descendant_id = oa.activity_id
+            GROUP BY cl.ancestor_id, oa.organization_id;
+            INSERT INTO activity_org_count (activity_id, direct_count, subtree_count)
+            SELECT
+                a.id,
+                (SELECT count(*) FROM organization_activity oa WHERE oa.activity_id = a.id),
+                (SELECT count(*) FROM activity_organization_link l WHERE l.ancestor_id = a.id)
+            FROM activity a;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    # Перенос узла moved_id: предки старого родителя, которых нет среди
+    # предков нового, теряют организации поддерева, новые - получают.
+    # Общие предки и само поддерево не меняются. Работа пропорциональна
+    # организациям переносимого поддерева, а не всей таблице.
+    # activity_closure к этому моменту уже перестроена строковыми
+    # триггерами, но цепочка старого родителя при переносе одного узла
+    # не меняется
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION activity_rollup_move(
+            moved_id int, old_parent_id int, new_parent_id int
+        )
+        RETURNS void AS $$
+        DECLARE
+            link_ancestor_ids int[];
+            link_organization_ids int[];
+            link_deltas int[];
+        BEGIN
+            WITH old_chain AS (
+                SELECT ancestor_id FROM activity_closure WHERE descendant_id = old_parent_id
+            ), new_chain AS (
+                SELECT ancestor_id FROM activity_closure WHERE descendant_id = new_parent_id
+            ), chain AS (
+                SELECT ancestor_id, -1 AS sign
+                FROM (SELECT ancestor_id FROM old_chain EXCEPT SELECT ancestor_id FROM new_chain) o
+                UNION ALL
+                SELECT ancestor_id, 1
+                FROM (SELECT ancestor_id FROM new_chain EXCEPT SELECT ancestor_id FROM old_chain) n
+            ), moved AS (
+                -- Сколько деятельностей поддерева у каждой его организации
+                SELECT oa.organization_id, count(*)::int AS n
+                FROM activity_closure cl
+                JOIN organization_activity oa ON oa.activity_id = cl.descendant_id
+                WHERE cl.ancestor_id = moved_id
+                GROUP BY oa.organization_id
+            )
+            SELECT array_agg(c.ancestor_id), array_agg(m.organization_id), array_agg(c.sign * m.n)
+            INTO link_ancestor_ids, link_organization_ids, link_deltas
+            FROM chain c
+            CROSS JOIN moved m;
+            IF link_ancestor_ids IS NOT NULL THEN
+                PERFORM activity_rollup_apply_links(link_ancestor_ids, link_organization_ids, link_deltas);
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    # Пересчёт поддеревьев только перечисленных предков
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION activity_rollup_rebuild_ancestors(ancestor_ids int[])
+        RETURNS void AS $$
+        BEGIN
+            PERFORM 1
+            FROM activity_org_count
+            WHERE activity_id = ANY(ancestor_ids)
+            ORDER BY activity_id
+            FOR NO KEY UPDATE;
+            DELETE FROM activity_organization_link WHERE ancestor_id = ANY(ancestor_ids);
+            INSERT INTO activity_organization_link (ancestor_id, organization_id, links)
+            SELECT cl.ancestor_id, oa.organization_id, count(*)
+            FROM activity_closure cl
+            JOIN organization_activity oa ON oa.activity_id = cl.descendant_id
+            WHERE cl.ancestor_id = ANY(ancestor_ids)
+            GROUP BY cl.ancestor_id, oa.organization_id;
+            UPDATE activity_org_count c
+            SET subtree_count = (
+                SELECT count(*) FROM activity_organization_link l WHERE l.ancestor_id = c.activity_id
+            )
+            WHERE c.activity_id = ANY(ancestor_ids);
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    # Новая деятельность - лист без организаций. Удалить деятельность с
+    # организациями или детьми не дают внешние ключи, а её строки уходят
+    # по ON DELETE CASCADE, так что удаление триггер не обрабатывает
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION activity_rollup_activity_changed()
+        RETURNS trigger AS $$
+        DECLARE
+            moved int;
+            moved_id int;
+            old_parent_id int;
+            new_parent_id int;
+            ancestor_ids int[];
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO activity_org_count (activity_id, direct_count, subtree_count)
+                SELECT id, 0, 0 FROM new_rows
+                ORDER BY id
+                ON CONFLICT (activity_id) DO NOTHING;
+                RETURN NULL;
+            END IF;
+
+            SELECT count(*), min(n.id), min(o.parent_id), min(n.parent_id)
+            INTO moved, moved_id, old_parent_id, new_parent_id
+            FROM old_rows o
+            JOIN new_rows n ON n.id = o.id
+            WHERE o.parent_id IS DISTINCT FROM n.parent_id;
+            IF moved = 1 THEN
+                PERFORM activity_rollup_move(moved_id, old_parent_id, new_parent_id);
+            ELSIF moved > 1 THEN
+                -- Переносы могут быть вложены друг в друга, поэтому вместо
+                -- дельт пересчитываются все предки старых и новых родителей
+                SELECT array_agg(DISTINCT cl.ancestor_id) INTO ancestor_ids
+                FROM old_rows o
+                JOIN new_rows n ON n.id = o.id
+                JOIN activity_closure cl ON cl.descendant_id IN (o.parent_id, n.parent_id)
+                WHERE o.parent_id IS DISTINCT FROM n.parent_id;
+                IF ancestor_ids IS NOT NULL THEN
+                    PERFORM activity_rollup_rebuild_ancestors(ancestor_ids);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for suffix, event, referencing in EVENTS:
+        op.execute(
+            f"""
+            CREATE TRIGGER trg_organization_activity_rollup_{suffix}
+            AFTER {event} ON organization_activity
+            {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION activity_rollup_organization_activity_changed();
+            """
+        )
+    # Срабатывают после строковых триггеров activity_closure
+    for suffix, event, referencing in ACTIVITY_EVENTS:
+        op.execute(
+            f"""
+            CREATE TRIGGER trg_activity_rollup_{suffix}
+            AFTER {event} ON activity
+            {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION activity_rollup_activity_changed();
+            """
+        )
+    op.execute("SELECT activity_rollup_rebuild();")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for suffix, _, _ in ACTIVITY_EVENTS:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_activity_rollup_{suffix} ON activity;")
+    for suffix, _, _ in EVENTS:
+        op.execute(
+            f"DROP TRIGGER IF EXISTS trg_organization_activity_rollup_{suffix} ON organization_activity;"
+        )
+    op.execute("DROP FUNCTION IF EXISTS activity_rollup_activity_changed();")
+    op.execute("DROP FUNCTION IF EXISTS activity_rollup_rebuild_ancestors(int[]);")
+    op.execute("DROP FUNCTION IF EXISTS activity_rollup_move(int, int, int);")
+    op.execute("DROP FUNCTION IF EXISTS activity_rollup_rebuild();")
+    op.execute("DROP FUNCTION IF EXISTS activity_rollup_organization_activity_changed();")
+    op.execute("DROP FUNCTION IF EXISTS activity_rollup_apply(int[], int[], int);")
+    op.execute("DROP FUNCTION IF EXISTS activity_rollup_apply_links(int[], int[], int[]);")
+    op.drop_table('activity_org_count')
+    op.drop_index(
+        'ix_activity_organization_link_organization_id',
+        table_name='activity_organization_link'
+    )
+    op.drop_table('activity_organization_link')
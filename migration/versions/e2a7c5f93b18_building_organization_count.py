@@ -0,0 +1,132 @@
+"""building organization count
+
+Revision ID: e2a7c5f93b18
+Revises: d9e4b27f1a56
+Create Date: 2026-10-18 20:08:37.194620
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a7c5f93b18'
+down_revision: Union[str, Sequence[str], None] = 'd9e4b27f1a56'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Колонки, смена которых сдвигает building.updated_at (как в e6f1a4c82d07):
+# явный список, без organization_count и updated_at
+BUILDING_COLUMNS = ('city', 'street', 'house', 'office', 'latitude', 'longitude')
+BUILDING_CHANGED = (
+    f"({', '.join('OLD.' + column for column in BUILDING_COLUMNS)})"
+    ' IS DISTINCT FROM '
+    f"({', '.join('NEW.' + column for column in BUILDING_COLUMNS)})"
+)
+
+EVENTS = (
+    ('insert', 'INSERT', 'REFERENCING NEW TABLE AS new_rows'),
+    ('update', 'UPDATE', 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+    ('delete', 'DELETE', 'REFERENCING OLD TABLE AS old_rows'),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'building',
+        sa.Column('organization_count', sa.Integer(), server_default='0', nullable=False)
+    )
+    # Фильтры и keyset-пагинация списка зданий
+    op.create_index('ix_building_city_street_id', 'building', ['city', 'street', 'id'])
+    op.create_index('ix_building_street', 'building', ['street'])
+
+    # Счётчик не должен сдвигать updated_at здания (ETag, выгрузка updated_since)
+    op.execute("DROP TRIGGER IF EXISTS trg_building_updated_at ON building;")
+    op.execute(
+        f"""
+        CREATE TRIGGER trg_building_updated_at
+        BEFORE UPDATE ON building
+        FOR EACH ROW
+        WHEN ({BUILDING_CHANGED})
+        EXECUTE FUNCTION set_updated_at();
+        """
+    )
+
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION building_organization_count_changed()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                UPDATE building b SET organization_count = b.organization_count + d.n
+                FROM (SELECT building_id, count(*) AS n FROM new_rows GROUP BY building_id) d
+                WHERE b.id = d.building_id;
+            ELSIF TG_OP = 'DELETE' THEN
+                UPDATE building b SET organization_count = b.organization_count - d.n
+                FROM (SELECT building_id, count(*) AS n FROM old_rows GROUP BY building_id) d
+                WHERE b.id = d.building_id;
+            ELSE
+                -- Только организации, переехавшие в другое здание
+                UPDATE building b SET organization_count = b.organization_count + d.n
+                FROM (
+                    SELECT m.building_id, sum(m.n) AS n
+                    FROM (
+                        SELECT o.building_id, -1 AS n
+                        FROM old_rows o JOIN new_rows r ON r.id = o.id
+                        WHERE o.building_id IS DISTINCT FROM r.building_id
+                        UNION ALL
+                        SELECT r.building_id, 1
+                        FROM old_rows o JOIN new_rows r ON r.id = o.id
+                        WHERE o.building_id IS DISTINCT FROM r.building_id
+                    ) m
+                    GROUP BY m.building_id
+                    HAVING sum(m.n) <> 0
+                ) d
+                WHERE b.id = d.building_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for suffix, event, referencing in EVENTS:
+        op.execute(
+            f"""
+            CREATE TRIGGER trg_building_organization_count_{suffix}
+            AFTER {event} ON organization
+            {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION building_organization_count_changed();
+            """
+        )
+
+    op.execute(
+        """
+        UPDATE building b SET organization_count = c.n
+        FROM (SELECT building_id, count(*) AS n FROM organization GROUP BY building_id) c
+        WHERE b.id = c.building_id;
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for suffix, _, _ in EVENTS:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_building_organization_count_{suffix} ON organization;")
+    op.execute("DROP FUNCTION IF EXISTS building_organization_count_changed();")
+    op.execute("DROP TRIGGER IF EXISTS trg_building_updated_at ON building;")
+    op.execute(
+        f"""
+        CREATE TRIGGER trg_building_updated_at
+        BEFORE UPDATE ON building
+        FOR EACH ROW
+        WHEN ({BUILDING_CHANGED})
+        EXECUTE FUNCTION set_updated_at();
+        """
+    )
+    op.drop_index('ix_building_street', table_name='building')
+    op.drop_index('ix_building_city_street_id', table_name='building')
+    op.drop_column('building', 'organization_count')
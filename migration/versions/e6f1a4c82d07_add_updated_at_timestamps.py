@@ -0,0 +1,76 @@
+"""add updated_at timestamps
+
+Revision ID: e6f1a4c82d07
+Revises: d2b6f08e4c51
+Create Date: 2026-10-18 16:05:12.448731
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6f1a4c82d07'
+down_revision: Union[str, Sequence[str], None] = 'd2b6f08e4c51'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Таблица -> условие WHEN триггера updated_at. У building сравниваются
+# только адрес и координаты: geog выводится из координат, а счётчики
+# и служебные колонки, добавленные позже, не должны сдвигать updated_at
+TABLES = {
+    'building': (
+        '(OLD.city, OLD.street, OLD.house, OLD.office, OLD.latitude, OLD.longitude)'
+        ' IS DISTINCT FROM '
+        '(NEW.city, NEW.street, NEW.house, NEW.office, NEW.latitude, NEW.longitude)'
+    ),
+    'organization': 'OLD.* IS DISTINCT FROM NEW.*',
+    'organization_phone': 'OLD.* IS DISTINCT FROM NEW.*',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION set_updated_at()
+        RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at = now();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for table, changed in TABLES.items():
+        op.add_column(
+            table,
+            sa.Column(
+                'updated_at',
+                sa.DateTime(timezone=True),
+                server_default=sa.text('now()'),
+                nullable=False
+            )
+        )
+        # Пустые UPDATE (например, пересчёт phone_numbers без изменений)
+        # не сдвигают updated_at и не сбрасывают ETag
+        op.execute(
+            f"""
+            CREATE TRIGGER trg_{table}_updated_at
+            BEFORE UPDATE ON {table}
+            FOR EACH ROW
+            WHEN ({changed})
+            EXECUTE FUNCTION set_updated_at();
+            """
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_updated_at ON {table};")
+        op.drop_column(table, 'updated_at')
+    op.execute("DROP FUNCTION IF EXISTS set_updated_at();")
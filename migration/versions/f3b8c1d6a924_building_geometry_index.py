@@ -0,0 +1,38 @@
+"""building geometry index
+
+Revision ID: f3b8c1d6a924
+Revises: e2a7c5f93b18
+Create Date: 2026-10-18 21:02:17.530846
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8c1d6a924'
+down_revision: Union[str, Sequence[str], None] = 'e2a7c5f93b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Поиск по bbox и полигону идёт в геометрии 4326: у geography рёбра
+    # прямоугольника - дуги большого круга, а не параллели
+    with op.get_context().autocommit_block():
+        op.execute(
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_building_geom
+            ON building
+            USING GIST (geometry(geog));
+            """
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_building_geom;")
@@ -0,0 +1,211 @@
+'''Массовая загрузка: разбор записей и upsert без БД, продолжение
+прерванной задачи - на реальной БД (нужен DATABASE_URL).
+'''
+import hashlib
+import io
+import os
+import uuid
+
+import pytest
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql
+
+from app.models import (Building, ImportJob, Organization, OrganizationActivity,
+                        OrganizationPhone, OrganizationTombstone)
+from app.repositories.bulk_import import (BUILDING_KEEP, ImportRepo,
+                                          import_building, upsert_from)
+from app.schemas.bulk_import import ImportFormat
+from app.services.bulk_import import (ImportBatch, ImportConflictError,
+                                      ImportFormatError, default_job_name,
+                                      file_digest, import_organizations,
+                                      save_upload)
+
+# id вне диапазона данных генератора, удаляются после теста
+BUILDING_ID = 900_000_001
+ORGANIZATION_IDS = (900_000_001, 900_000_002, 900_000_003)
+
+
+def record(**fields):
+    return {
+        'id': '1',
+        'name': 'Рога и копыта',
+        'building_id': '10',
+        'city': 'Москва',
+        'street': 'Ленина',
+        'house': '1',
+        'office': '5',
+        'latitude': '55.75',
+        'longitude': '37.61',
+        'phones': '2-222-222;3-333-333',
+        'activity_ids': '1;2',
+        **fields,
+    }
+
+
+def test_batch_splits_record_by_table():
+    batch = ImportBatch()
+    batch.add(record(), 1)
+    assert batch.buildings == {10: (10, 'Москва', 'Ленина', '1', '5', 55.75, 37.61)}
+    assert batch.organizations == {1: (1, 'Рога и копыта', 10)}
+    assert batch.phones == {(1, '2-222-222'), (1, '3-333-333')}
+    assert batch.activities == {(1, 1), (1, 2)}
+    assert batch.records == 1
+
+
+def test_batch_ndjson_lists_and_repeats():
+    batch = ImportBatch()
+    batch.add(record(phones=['2-222-222', ' '], activity_ids=[1, 1]), 1)
+    batch.add(record(name='Новое имя', phones=None, activity_ids=None), 2)
+    # Повтор в пачке схлопывается, последняя запись побеждает
+    assert batch.organizations == {1: (1, 'Новое имя', 10)}
+    assert batch.phones == {(1, '2-222-222')}
+    assert batch.activities == {(1, 1)}
+    assert batch.records == 2
+
+
+def test_batch_partial_building_keeps_missing_fields_empty():
+    batch = ImportBatch()
+    batch.add(record(street='', house=None, office=' ', latitude='', longitude=None), 1)
+    # None в staging - "не передано", upsert сохранит значения из базы
+    assert batch.buildings == {10: (10, 'Москва', None, None, None, None, None)}
+
+
+def test_batch_without_city_skips_building():
+    batch = ImportBatch()
+    batch.add(record(city=''), 1)
+    assert batch.buildings == {}
+    assert batch.organizations == {1: (1, 'Рога и копыта', 10)}
+
+
+def test_batch_skips_deleted():
+    batch = ImportBatch()
+    batch.add(record(deleted='true'), 1)
+    assert not batch.organizations
+    assert batch.records == 1
+
+
+@pytest.mark.parametrize('fields', [
+    {'id': 'x'},
+    {'building_id': None},
+    {'name': ' '},
+    {'latitude': 'север'},
+    {'activity_ids': '1;a'},
+])
+def test_batch_rejects_bad_record(fields):
+    with pytest.raises(ImportFormatError, match='Запись 7'):
+        ImportBatch().add(record(**fields), 7)
+
+
+def test_building_upsert_keeps_missing_columns():
+    stmt = upsert_from(Building, import_building, BUILDING_KEEP)
+    sql = str(
+        stmt.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True})
+    ).replace('\n', ' ')
+    # Вставка подставляет '' в NOT NULL столбцы, обновление их не затирает
+    assert "coalesce(import_building.street, '')" in sql
+    assert "street = coalesce(nullif(excluded.street, ''), building.street)" in sql
+    assert 'latitude = coalesce(excluded.latitude, building.latitude)' in sql
+    assert 'city = excluded.city' in sql
+
+
+def test_batch_replaces_only_listed_phones_and_activities():
+    batch = ImportBatch()
+    batch.add(record(id='1', phones='', activity_ids='3'), 1)
+    batch.add(record(id='2', phones=None), 2)
+    without_activities = record(id='3')
+    del without_activities['activity_ids']
+    batch.add(without_activities, 3)
+    # Пустой список - заменить ничем, нет поля - не трогать
+    assert batch.phone_owners == {1, 3}
+    assert batch.activity_owners == {1, 2}
+    assert batch.phones == {(3, '2-222-222'), (3, '3-333-333')}
+    assert batch.activities == {(1, 3), (2, 1), (2, 2)}
+
+
+def test_save_upload_hashes_content():
+    path, source_hash = save_upload(io.BytesIO(b'id,name\n1,x\n'), '.csv')
+    try:
+        assert path.endswith('.csv')
+        with open(path, 'rb') as file:
+            assert file.read() == b'id,name\n1,x\n'
+        assert source_hash == hashlib.sha256(b'id,name\n1,x\n').hexdigest()
+        assert file_digest(path) == source_hash
+    finally:
+        os.unlink(path)
+
+
+def test_default_job_name_depends_on_content():
+    first = default_job_name('/tmp/organizations.csv', 'a' * 64)
+    assert first == 'organizations.csv@' + 'a' * 12
+    assert default_job_name('organizations.csv', 'b' * 64) != first
+
+
+def csv_stream(*rows: str) -> io.StringIO:
+    header = 'id,name,building_id,city,street,house,office,latitude,longitude,phones,activity_ids'
+    return io.StringIO('\n'.join((header, *rows)) + '\n')
+
+
+def organization_row(organization_id) -> str:
+    return f'{organization_id},Организация {organization_id},{BUILDING_ID},Москва,Ленина,1,,55.75,37.61,1-111-111,'
+
+
+@pytest.fixture
+async def cleanup(engine):
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from app.config.database import dispose_engines
+
+    jobs = []
+    try:
+        yield jobs
+    finally:
+        # Пул приложения привязан к циклу событий теста
+        await dispose_engines()
+        async with AsyncSession(engine) as session:
+            for model, column in (
+                (OrganizationPhone, OrganizationPhone.organization_id),
+                (OrganizationActivity, OrganizationActivity.organization_id),
+                (Organization, Organization.id),
+                (OrganizationTombstone, OrganizationTombstone.id),
+            ):
+                await session.execute(delete(model).where(column.in_(ORGANIZATION_IDS)))
+            await session.execute(delete(Building).where(Building.id == BUILDING_ID))
+            await session.execute(delete(ImportJob).where(ImportJob.name.in_(jobs)))
+            await ImportRepo(session).fix_sequences_db()
+            await session.commit()
+
+
+@pytest.mark.anyio
+async def test_failed_import_resumes_from_checkpoint(engine, cleanup):
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    job = f'test-resume-{uuid.uuid4().hex}'
+    cleanup.append(job)
+    rows = [organization_row(organization_id) for organization_id in ORGANIZATION_IDS]
+
+    broken = csv_stream(rows[0], rows[1], 'x,Сломанная,1,,,,,,,,')
+    with pytest.raises(ImportFormatError, match='Запись 3'):
+        await import_organizations(broken, ImportFormat.csv, job, batch_size=2, source_hash='a' * 64)
+
+    async with AsyncSession(engine) as session:
+        import_job = await ImportRepo(session).get_job_db(job)
+        assert (import_job.status, import_job.processed_records) == ('failed', 2)
+
+    # Исправленный файл - другой файл: продолжить по хэшу нельзя
+    with pytest.raises(ImportConflictError):
+        await import_organizations(csv_stream(*rows), ImportFormat.csv, job, batch_size=2, source_hash='b' * 64)
+
+    # Без хэша (stdin) задача продолжается с первой незагруженной записи
+    result = await import_organizations(csv_stream(*rows), ImportFormat.csv, job, batch_size=2)
+    assert (result.status, result.processed_records, result.imported_records) == ('done', 3, 1)
+
+    result = await import_organizations(csv_stream(*rows), ImportFormat.csv, job, batch_size=2)
+    assert (result.status, result.imported_records) == ('done', 0)
+
+    async with AsyncSession(engine) as session:
+        names = await session.scalars(
+            select(Organization.name)
+            .where(Organization.id.in_(ORGANIZATION_IDS))
+            .order_by(Organization.id)
+        )
+        assert names.all() == [f'Организация {organization_id}' for organization_id in ORGANIZATION_IDS]
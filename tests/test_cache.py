@@ -0,0 +1,172 @@
+'''Бэкенды кэша ответов и ResponseCache без БД.
+
+RedisBackend проверяется на fakeredis (pip install fakeredis), без
+него эти тесты пропускаются.
+'''
+from types import SimpleNamespace
+
+import pytest
+
+from app.cache import ResponseCache, cached, response_cache
+from app.cache import backends
+from app.cache.backends import MISS, CacheBackend, MemoryBackend, RedisBackend
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # Только часы бэкенда: time.monotonic нужен и циклу событий
+    monkeypatch.setattr(backends, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+
+@pytest.fixture
+async def redis_backend():
+    fakeredis = pytest.importorskip('fakeredis')
+    client = fakeredis.FakeAsyncRedis()
+    try:
+        yield RedisBackend(client=client, prefix='test:')
+    finally:
+        await client.aclose()
+
+
+class BrokenBackend(CacheBackend):
+    name = 'broken'
+
+    async def get(self, key):
+        raise ConnectionError('cache down')
+
+    async def set(self, key, value, ttl, tags):
+        raise ConnectionError('cache down')
+
+    async def invalidate_tags(self, tags):
+        raise ConnectionError('cache down')
+
+    async def clear(self):
+        raise ConnectionError('cache down')
+
+
+async def test_memory_get_set(clock):
+    cache = MemoryBackend(max_entries=10)
+    assert await cache.get('a') is MISS
+    await cache.set('a', None, ttl=60, tags=())
+    # Закэшированный None отличается от промаха
+    assert await cache.get('a') is None
+
+
+async def test_memory_lru_eviction(clock):
+    cache = MemoryBackend(max_entries=2)
+    await cache.set('a', 1, ttl=60, tags=('t',))
+    await cache.set('b', 2, ttl=60, tags=('t',))
+    assert await cache.get('a') == 1
+    await cache.set('c', 3, ttl=60, tags=('t',))
+    assert await cache.get('b') is MISS
+    assert await cache.get('a') == 1
+    assert await cache.get('c') == 3
+    # Вытесненный ключ не остаётся в индексе тегов
+    assert cache._tags['t'] == {'a', 'c'}
+
+
+async def test_memory_ttl_expiry(clock):
+    cache = MemoryBackend(max_entries=10)
+    await cache.set('a', 1, ttl=5, tags=('t',))
+    clock.now += 4.9
+    assert await cache.get('a') == 1
+    clock.now += 0.2
+    assert await cache.get('a') is MISS
+    assert 't' not in cache._tags
+
+
+async def test_memory_tag_invalidation(clock):
+    cache = MemoryBackend(max_entries=10)
+    await cache.set('a', 1, ttl=60, tags=('organization:1', 'organizations'))
+    await cache.set('b', 2, ttl=60, tags=('organization:2', 'organizations'))
+    await cache.set('c', 3, ttl=60, tags=('building:1',))
+    await cache.invalidate_tags(['organization:1'])
+    assert await cache.get('a') is MISS
+    assert await cache.get('b') == 2
+    await cache.invalidate_tags(['organizations'])
+    assert await cache.get('b') is MISS
+    assert await cache.get('c') == 3
+
+
+async def test_memory_clear(clock):
+    cache = MemoryBackend(max_entries=10)
+    await cache.set('a', 1, ttl=60, tags=('t',))
+    await cache.clear()
+    assert await cache.get('a') is MISS
+    assert not cache._tags
+
+
+async def test_redis_get_set_and_ttl(redis_backend):
+    assert await redis_backend.get('a') is MISS
+    await redis_backend.set('a', {'name': 'x'}, ttl=5, tags=('t',))
+    assert await redis_backend.get('a') == {'name': 'x'}
+    key_ttl = await redis_backend._redis.pttl(redis_backend._key('a'))
+    tag_ttl = await redis_backend._redis.pttl(redis_backend._tag('t'))
+    assert 0 < key_ttl <= 5000
+    assert 0 < tag_ttl <= 5000
+
+
+async def test_redis_tag_invalidation(redis_backend):
+    await redis_backend.set('a', 1, ttl=60, tags=('organization:1', 'organizations'))
+    await redis_backend.set('b', 2, ttl=60, tags=('organization:2', 'organizations'))
+    await redis_backend.invalidate_tags(['organization:1'])
+    assert await redis_backend.get('a') is MISS
+    assert await redis_backend.get('b') == 2
+    await redis_backend.invalidate_tags(['organizations', 'unknown'])
+    assert await redis_backend.get('b') is MISS
+
+
+async def test_redis_clear_keeps_foreign_keys(redis_backend):
+    await redis_backend.set('a', 1, ttl=60, tags=('t',))
+    await redis_backend._redis.set('other:key', b'1')
+    await redis_backend.clear()
+    assert await redis_backend.get('a') is MISS
+    assert await redis_backend._redis.get('other:key') == b'1'
+
+
+async def test_response_cache_degrades_to_miss():
+    cache = ResponseCache(BrokenBackend(), ttl=60)
+    assert await cache.get('a', 'method') is MISS
+    # Ошибки записи и сброса не выходят наружу
+    await cache.set('a', 1, ('t',))
+    await cache.invalidate(('t',))
+    await cache.clear()
+
+
+async def test_response_cache_skips_set_after_invalidation(clock):
+    cache = ResponseCache(MemoryBackend(max_entries=10), ttl=60)
+    generation = cache.generation
+    await cache.invalidate(('organization:1',))
+    await cache.set('a', 1, ('organization:1',), generation)
+    assert await cache.get('a', 'method') is MISS
+
+    await cache.set('a', 2, ('organization:1',), cache.generation)
+    assert await cache.get('a', 'method') == 2
+
+
+async def test_cached_does_not_store_value_read_before_invalidation(monkeypatch, clock):
+    monkeypatch.setattr(response_cache, 'backend', MemoryBackend(max_entries=10))
+    calls = []
+
+    @cached(lambda arguments, result: {f"organization:{arguments['organization_id']}"})
+    async def get_organization(organization_id: int):
+        calls.append(organization_id)
+        # Уведомление о записи пришло, пока шло чтение из БД
+        await response_cache.invalidate({f'organization:{organization_id}'})
+        return {'name': f'v{len(calls)}'}
+
+    assert await get_organization(1) == {'name': 'v1'}
+    assert await get_organization(1) == {'name': 'v2'}
+    assert calls == [1, 1]
@@ -0,0 +1,124 @@
+'''Страницы, собранные в JSON на стороне БД, совпадают с обычным путём.
+
+Для каждого эндпоинта, который можно включить в DB_JSON_ENDPOINTS,
+на выборке зданий, деятельностей и точек (координаты зданий) проходятся
+все страницы обоими способами и сравниваются элементы и ключи страниц.
+Маленький LIMIT даёт больше страниц и проверяет курсоры.
+'''
+import json
+from typing import Awaitable, Callable
+
+import pytest
+from sqlalchemy import select
+
+from app.config.settings import settings
+from app.models import Activity, Building, OrganizationActivity
+from app.repositories.organization import OrganizationRepo
+from app.schemas.organization import OrganizationOut
+from app.services.organization import point_geography
+
+pytestmark = pytest.mark.anyio
+
+SAMPLES = 5
+LIMIT = 2
+MAX_PAGES = 50
+
+RowsPage = Callable[[int, tuple | None], Awaitable]
+Case = tuple[str, RowsPage, RowsPage]
+
+
+async def building_cases(session, repo: OrganizationRepo) -> list[Case]:
+    building_ids = (
+        await session.scalars(
+            select(Building.id)
+            .where(Building.organization_count > 0)
+            .order_by(Building.id)
+            .limit(SAMPLES)
+        )
+    ).all()
+    return [
+        (
+            f'building {building_id}',
+            lambda limit, after, building_id=building_id:
+                repo.get_data_by_build_id_db(building_id, limit, after),
+            lambda limit, after, building_id=building_id:
+                repo.get_data_by_build_id_json_db(building_id, limit, after),
+        )
+        for building_id in building_ids
+    ]
+
+
+async def activity_cases(session, repo: OrganizationRepo) -> list[Case]:
+    activity_ids = (
+        await session.scalars(
+            select(Activity.id)
+            .where(
+                select(OrganizationActivity.id)
+                .where(OrganizationActivity.activity_id == Activity.id)
+                .exists()
+            )
+            .order_by(Activity.id)
+            .limit(SAMPLES)
+        )
+    ).all()
+    return [
+        (
+            f'activity {activity_id}',
+            lambda limit, after, activity_id=activity_id:
+                repo.get_data_by_activity_id_db(activity_id, limit, after),
+            lambda limit, after, activity_id=activity_id:
+                repo.get_data_by_activity_id_json_db(activity_id, limit, after),
+        )
+        for activity_id in activity_ids
+    ]
+
+
+async def nearby_cases(session, repo: OrganizationRepo) -> list[Case]:
+    buildings = (
+        await session.execute(
+            select(Building.latitude, Building.longitude)
+            .where(Building.geog.is_not(None), Building.organization_count > 0)
+            .order_by(Building.id)
+            .limit(SAMPLES)
+        )
+    ).all()
+    cases = []
+    for building in buildings:
+        point = point_geography(building.latitude, building.longitude)
+        cases.append((
+            f'point {building.latitude},{building.longitude}',
+            lambda limit, after, point=point:
+                repo.get_organizations_nearby_db(point, settings.DEFAULT_RADIUS, limit, after),
+            lambda limit, after, point=point:
+                repo.get_organizations_nearby_json_db(point, settings.DEFAULT_RADIUS, limit, after),
+        ))
+    return cases
+
+
+ENDPOINTS = {
+    'by_building': building_cases,
+    'by_activity': activity_cases,
+    'nearby': nearby_cases,
+}
+
+
+@pytest.mark.parametrize('endpoint', list(ENDPOINTS))
+async def test_db_json_matches_pydantic(session, endpoint):
+    cases = await ENDPOINTS[endpoint](session, OrganizationRepo(session))
+    if not cases:
+        pytest.skip('В базе нет данных, см. python -m benchmarks.generate --load')
+
+    for name, rows_page, json_page in cases:
+        after = None
+        for _ in range(MAX_PAGES):
+            rows, next_key = await rows_page(LIMIT, after)
+            items_json, json_next_key, _ = await json_page(LIMIT, after)
+            expected = [
+                OrganizationOut(name=row['name'], phones=row['phones']).model_dump()
+                for row in rows
+            ]
+            assert json.loads(items_json) == expected, f'{name}, after={after}'
+            assert json_next_key == next_key, f'{name}, after={after}'
+            if next_key is None:
+                break
+            after = next_key
@@ -0,0 +1,87 @@
+'''Cursor keyset-пагинации: кодирование и отказ на подделанных значениях'''
+import base64
+import json
+
+import pytest
+from sqlalchemy import (BigInteger, Column, Float, Integer, MetaData, String,
+                        Table, select)
+
+from app.repositories.base import BaseRepo, cursor_value_fits
+from app.schemas.pagination import (InvalidCursorError, decode_cursor,
+                                    encode_cursor)
+
+items = Table(
+    'items',
+    MetaData(),
+    Column('id', Integer),
+    Column('name', String),
+    Column('distance', Float),
+)
+
+
+def raw_cursor(value) -> str:
+    raw = json.dumps(value).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+@pytest.mark.parametrize('keys', [(1,), (0.5, 17), ('Рога и копыта', 3), (-2, 'a', 1.25)])
+def test_cursor_round_trip(keys):
+    cursor = encode_cursor(keys)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == keys
+
+
+def test_encode_last_page():
+    assert encode_cursor(None) is None
+
+
+@pytest.mark.parametrize('cursor', [
+    'не base64',
+    base64.urlsafe_b64encode(b'{not json').decode(),
+    raw_cursor({'id': 1}),
+    raw_cursor([]),
+    raw_cursor([True]),
+    raw_cursor([None]),
+    raw_cursor([[1, 2]]),
+    raw_cursor(1),
+])
+def test_decode_rejects_tampered_cursor(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize('column_type, value, fits', [
+    (Integer(), 2 ** 31 - 1, True),
+    (Integer(), 2 ** 31, False),
+    (Integer(), -2 ** 31, True),
+    (BigInteger(), 2 ** 40, True),
+    (Integer(), 1.5, False),
+    (Integer(), '1', False),
+    (Integer(), True, False),
+    (Float(), 1, True),
+    (Float(), float('inf'), False),
+    (Float(), 'x', False),
+    (String(), 'abc', True),
+    (String(), 'a\x00b', False),
+    (String(), 1, False),
+])
+def test_cursor_value_fits(column_type, value, fits):
+    assert cursor_value_fits(column_type, value) is fits
+
+
+def page_select(after):
+    keys = [items.c.distance.label('distance'), items.c.id.label('id')]
+    stmt = select(items.c.id, items.c.name, items.c.distance)
+    return BaseRepo(None)._page_select(stmt, keys, after, 10)
+
+
+def test_page_select_accepts_matching_cursor():
+    sql = str(page_select((0.5, 3)))
+    assert 'LIMIT' in sql
+    assert '>' in sql
+
+
+@pytest.mark.parametrize('after', [(0.5,), (0.5, 3, 4), ('x', 3), (0.5, 'x'), (0.5, 2 ** 31)])
+def test_page_select_rejects_mistyped_cursor(after):
+    with pytest.raises(InvalidCursorError):
+        page_select(after)
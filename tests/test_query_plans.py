@@ -0,0 +1,242 @@
+'''Планы запросов репозиториев.
+
+Каждый запрос выполняется на реальной БД, для его SQL снимается
+EXPLAIN (FORMAT JSON). Последовательное чтение запрещено
+(enable_seqscan = off), так что Seq Scan по большой таблице означает,
+что подходящего индекса нет. Для запросов с известным индексом
+проверяется, что он есть в плане: например, get_tile_db отбирает по
+ix_building_geom_3857, только если выражение совпадает с индексным.
+'''
+import json
+import math
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+import pytest
+from sqlalchemy import event, select, text
+
+from app.models import Activity, Building, Organization
+from app.repositories.building import BuildingRepo
+from app.repositories.organization import OrganizationRepo
+from app.schemas.geo import BBox, grid_cell_range
+from app.schemas.organization import SearchMode
+from app.services.organization import bbox_geometry, point_geography
+
+pytestmark = pytest.mark.anyio
+
+LARGE_TABLES = {
+    'building',
+    'organization',
+    'organization_phone',
+    'organization_activity',
+    'organization_grid',
+}
+TILE_ZOOM = 15
+CLUSTER_ZOOM = 12
+
+
+@dataclass
+class Context:
+    organizations: OrganizationRepo
+    buildings: BuildingRepo
+    building: Any
+    organization: Any
+    activity_id: int
+
+    @property
+    def point(self):
+        return point_geography(self.building.latitude, self.building.longitude)
+
+    @property
+    def bbox(self) -> BBox:
+        return BBox(
+            self.building.longitude - 0.01,
+            self.building.latitude - 0.01,
+            self.building.longitude + 0.01,
+            self.building.latitude + 0.01,
+        )
+
+    @property
+    def tile(self) -> tuple[int, int, int]:
+        n = 2 ** TILE_ZOOM
+        lat = math.radians(self.building.latitude)
+        x = int((self.building.longitude + 180) / 360 * n)
+        y = int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+        return TILE_ZOOM, x, y
+
+
+Scenario = Callable[[Context], Awaitable]
+
+# Имя -> (индекс, который должен быть в плане, или None; вызов)
+SCENARIOS: dict[str, tuple[str | None, Scenario]] = {
+    'get_organization_by_id_db': (
+        'organization_pkey',
+        lambda c: c.organizations.get_organization_by_id_db(c.organization.id),
+    ),
+    'get_organizations_by_ids_db': (
+        'organization_pkey',
+        lambda c: c.organizations.get_organizations_by_ids_db([c.organization.id]),
+    ),
+    'get_organization_by_name_db': (
+        'ix_organization_name',
+        lambda c: c.organizations.get_organization_by_name_db(c.organization.name, 50),
+    ),
+    'get_data_by_build_id_db': (
+        'ix_organization_building_id',
+        lambda c: c.organizations.get_data_by_build_id_db(c.building.id, 50),
+    ),
+    'get_data_by_build_id_json_db': (
+        'ix_organization_building_id',
+        lambda c: c.organizations.get_data_by_build_id_json_db(c.building.id, 50),
+    ),
+    'get_data_by_activity_id_db': (
+        'ix_organization_activity_activity_id',
+        lambda c: c.organizations.get_data_by_activity_id_db(c.activity_id, 50),
+    ),
+    'get_data_by_activity_id_json_db': (
+        'ix_organization_activity_activity_id',
+        lambda c: c.organizations.get_data_by_activity_id_json_db(c.activity_id, 50),
+    ),
+    'organizations_by_nested_activity_db': (
+        None,
+        lambda c: c.organizations.organizations_by_nested_activity_db(c.activity_id, 50),
+    ),
+    'organizations_by_activity_ids_db': (
+        'ix_organization_activity_activity_id',
+        lambda c: c.organizations.organizations_by_activity_ids_db([c.activity_id], 50),
+    ),
+    'get_organizations_nearby_db': (
+        'ix_building_geog',
+        lambda c: c.organizations.get_organizations_nearby_db(c.point, 1000, 50),
+    ),
+    'get_organizations_nearby_json_db': (
+        'ix_building_geog',
+        lambda c: c.organizations.get_organizations_nearby_json_db(c.point, 1000, 50),
+    ),
+    'get_organizations_within_db': (
+        'ix_building_geom',
+        lambda c: c.organizations.get_organizations_within_db(bbox_geometry(c.bbox), 50),
+    ),
+    'get_nearest_organizations_db': (
+        'ix_building_geog',
+        lambda c: c.organizations.get_nearest_organizations_db(c.point, 10),
+    ),
+    'search_organizations_db[fulltext]': (
+        'ix_organization_name_tsv',
+        lambda c: c.organizations.search_organizations_db(
+            c.organization.name, SearchMode.fulltext, 50
+        ),
+    ),
+    'search_organizations_db[fuzzy]': (
+        'ix_organization_name_trgm',
+        lambda c: c.organizations.search_organizations_db(
+            c.organization.name, SearchMode.fuzzy, 50
+        ),
+    ),
+    'search_organizations_db[prefix]': (
+        'ix_organization_name_trgm',
+        lambda c: c.organizations.search_organizations_db(
+            c.organization.name, SearchMode.prefix, 50
+        ),
+    ),
+    'get_grid_clusters_db': (
+        'organization_grid_pkey',
+        lambda c: c.organizations.get_grid_clusters_db(
+            CLUSTER_ZOOM, *grid_cell_range(c.bbox, CLUSTER_ZOOM)
+        ),
+    ),
+    'get_live_clusters_db': (
+        'ix_building_geom_3857',
+        lambda c: c.organizations.get_live_clusters_db(
+            CLUSTER_ZOOM, *grid_cell_range(c.bbox, CLUSTER_ZOOM), [c.activity_id]
+        ),
+    ),
+    'get_tile_db': (
+        'ix_building_geom_3857',
+        lambda c: c.buildings.get_tile_db(*c.tile, 4096, 64),
+    ),
+    'get_buildings_db': (
+        'ix_building_city_street_id',
+        lambda c: c.buildings.get_buildings_db(c.building.city, c.building.street, 50),
+    ),
+}
+
+
+def walk(plan: dict):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from walk(child)
+
+
+async def explain(session, call: Callable[[], Awaitable]) -> list[dict]:
+    '''Выполняет call и возвращает планы всех его SQL-выражений'''
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    sync_engine = session.bind.sync_engine
+    event.listen(sync_engine, 'before_cursor_execute', capture)
+    try:
+        await call()
+    finally:
+        event.remove(sync_engine, 'before_cursor_execute', capture)
+
+    connection = await session.connection()
+    plans = []
+    for statement, parameters in statements:
+        result = await connection.exec_driver_sql(
+            'EXPLAIN (FORMAT JSON) ' + statement, parameters
+        )
+        raw = result.scalar_one()
+        plans.append((json.loads(raw) if isinstance(raw, str) else raw)[0]['Plan'])
+    return plans
+
+
+@pytest.fixture
+async def context(session):
+    await session.execute(text('SET LOCAL enable_seqscan = off'))
+    building = (
+        await session.execute(
+            select(
+                Building.id,
+                Building.city,
+                Building.street,
+                Building.latitude,
+                Building.longitude,
+            )
+            .where(Building.geog.is_not(None), Building.organization_count > 0)
+            .limit(1)
+        )
+    ).one_or_none()
+    organization = (
+        await session.execute(select(Organization.id, Organization.name).limit(1))
+    ).one_or_none()
+    activity_id = await session.scalar(
+        select(Activity.id).where(Activity.parent_id.is_(None)).limit(1)
+    )
+    if building is None or organization is None or activity_id is None:
+        pytest.skip('В базе нет данных, см. python -m benchmarks.generate --load')
+    return Context(
+        OrganizationRepo(session),
+        BuildingRepo(session),
+        building,
+        organization,
+        activity_id,
+    )
+
+
+@pytest.mark.parametrize('name', list(SCENARIOS))
+async def test_query_plan_uses_index(session, context, name):
+    expected_index, call = SCENARIOS[name]
+    nodes = [node for plan in await explain(session, lambda: call(context)) for node in walk(plan)]
+
+    seq_scans = sorted({
+        node['Relation Name'] for node in nodes
+        if node.get('Node Type') == 'Seq Scan' and node.get('Relation Name') in LARGE_TABLES
+    })
+    assert not seq_scans, f'{name}: Seq Scan по {", ".join(seq_scans)}'
+
+    if expected_index is not None:
+        indexes = {node['Index Name'] for node in nodes if 'Index Name' in node}
+        assert expected_index in indexes, f'{name}: нет {expected_index} в плане, есть {sorted(indexes)}'
@@ -0,0 +1,97 @@
+'''Выбор движка для чтения (ReplicaRouter) без БД'''
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import database
+from app.config.database import ReplicaRouter
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(database, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def engine(name: str):
+    return SimpleNamespace(url=name)
+
+
+@pytest.fixture
+def engines():
+    return engine('primary'), [engine('replica0'), engine('replica1'), engine('replica2')]
+
+
+def names(candidates) -> list[str]:
+    return [candidate.url for candidate in candidates]
+
+
+def test_round_robin_with_primary_last(clock, engines):
+    primary, replicas = engines
+    router = ReplicaRouter(primary, replicas, eject_seconds=30)
+    assert names(router.candidates()) == ['replica0', 'replica1', 'replica2', 'primary']
+    assert names(router.candidates()) == ['replica1', 'replica2', 'replica0', 'primary']
+    assert names(router.candidates()) == ['replica2', 'replica0', 'replica1', 'primary']
+    assert names(router.candidates()) == ['replica0', 'replica1', 'replica2', 'primary']
+
+
+def test_without_replicas_reads_primary(clock, engines):
+    primary, _ = engines
+    router = ReplicaRouter(primary, [], eject_seconds=30)
+    assert names(router.candidates()) == ['primary']
+
+
+def test_ejected_replica_recovers(clock, engines):
+    primary, replicas = engines
+    router = ReplicaRouter(primary, replicas, eject_seconds=30)
+    router.eject(replicas[1])
+    for _ in range(3):
+        assert 'replica1' not in names(router.candidates())
+
+    clock.now += 30
+    candidates = [names(router.candidates()) for _ in range(3)]
+    assert all('replica1' in item for item in candidates)
+
+
+def test_all_ejected_falls_back_to_primary(clock, engines):
+    primary, replicas = engines
+    router = ReplicaRouter(primary, replicas, eject_seconds=30)
+    for replica in replicas:
+        router.eject(replica)
+    assert names(router.candidates()) == ['primary']
+
+
+def test_eject_ignores_primary(clock, engines):
+    primary, replicas = engines
+    router = ReplicaRouter(primary, replicas, eject_seconds=30)
+    router.eject(primary)
+    assert names(router.candidates())[-1] == 'primary'
+    assert len(router.candidates()) == 4
+
+
+def test_reads_primary_after_write(clock, engines):
+    primary, replicas = engines
+    router = ReplicaRouter(primary, replicas, eject_seconds=30, sticky_seconds=1)
+    router.mark_written()
+    assert names(router.candidates()) == ['primary']
+    clock.now += 0.9
+    assert names(router.candidates()) == ['primary']
+    clock.now += 0.2
+    assert names(router.candidates())[-1] == 'primary'
+    assert len(router.candidates()) == 4
+
+
+def test_sticky_disabled(clock, engines):
+    primary, replicas = engines
+    router = ReplicaRouter(primary, replicas, eject_seconds=30, sticky_seconds=0)
+    router.mark_written()
+    assert len(router.candidates()) == 4
@@ -0,0 +1,178 @@
+'''Single-flight: общий вызов для одинаковых запросов, без БД'''
+import asyncio
+
+import pytest
+
+from app.cache import single_flight as module
+from app.cache.single_flight import (SingleFlight, coalesced,
+                                     release_read_connection,
+                                     round_coordinates)
+from app.config.database import READ_ONLY_SESSION_KEY, SNAPSHOT_SESSION_KEY
+
+pytestmark = pytest.mark.anyio
+
+
+async def settle() -> None:
+    '''Даёт запущенным задачам дойти до ожидания'''
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class Call:
+    '''Вызов, который ждёт release и считает, сколько раз его выполнили'''
+
+    def __init__(self, result='result', error: BaseException | None = None) -> None:
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class FakeSession:
+    def __init__(self, **info) -> None:
+        self.info = info
+        self.closed = False
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+async def test_followers_share_leader_result():
+    flight = SingleFlight()
+    call = Call()
+    tasks = [asyncio.create_task(flight.do('key', 'method', call)) for _ in range(3)]
+    await settle()
+    call.release.set()
+    assert await asyncio.gather(*tasks) == ['result'] * 3
+    assert call.calls == 1
+    assert not flight._calls
+
+
+async def test_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+    first, second = Call('first'), Call('second')
+    tasks = [
+        asyncio.create_task(flight.do('a', 'method', first)),
+        asyncio.create_task(flight.do('b', 'method', second)),
+    ]
+    await settle()
+    first.release.set()
+    second.release.set()
+    assert await asyncio.gather(*tasks) == ['first', 'second']
+    assert (first.calls, second.calls) == (1, 1)
+
+
+async def test_leader_exception_reaches_followers():
+    flight = SingleFlight()
+    call = Call(error=LookupError('нет данных'))
+    tasks = [asyncio.create_task(flight.do('key', 'method', call)) for _ in range(3)]
+    await settle()
+    call.release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(result, LookupError) for result in results)
+    assert call.calls == 1
+
+    # Ошибка не остаётся закэшированной: следующий вызов выполняется заново
+    retry = Call('retry')
+    retry.release.set()
+    assert await flight.do('key', 'method', retry) == 'retry'
+
+
+async def test_follower_cancellation_keeps_leader_running():
+    flight = SingleFlight()
+    call = Call()
+    leader = asyncio.create_task(flight.do('key', 'method', call))
+    await settle()
+    follower = asyncio.create_task(flight.do('key', 'method', call))
+    await settle()
+    follower.cancel()
+    await settle()
+    call.release.set()
+    assert await leader == 'result'
+    assert follower.cancelled()
+
+
+async def test_follower_retries_after_leader_cancellation():
+    flight = SingleFlight()
+    leader_call = Call('leader')
+    follower_call = Call('follower')
+    leader = asyncio.create_task(flight.do('key', 'method', leader_call))
+    await settle()
+    follower = asyncio.create_task(flight.do('key', 'method', follower_call))
+    await settle()
+    leader.cancel()
+    await settle()
+    follower_call.release.set()
+    assert await follower == 'follower'
+    assert leader.cancelled()
+    assert follower_call.calls == 1
+
+
+async def test_follower_releases_read_connection():
+    flight = SingleFlight()
+    call = Call()
+    session = FakeSession(**{READ_ONLY_SESSION_KEY: True})
+    leader = asyncio.create_task(flight.do('key', 'method', call))
+    await settle()
+    follower = asyncio.create_task(flight.do('key', 'method', call, session))
+    await settle()
+    assert session.closed
+    call.release.set()
+    await asyncio.gather(leader, follower)
+
+
+@pytest.mark.parametrize('info, released', [
+    ({READ_ONLY_SESSION_KEY: True}, True),
+    ({}, False),
+    ({READ_ONLY_SESSION_KEY: True, SNAPSHOT_SESSION_KEY: True}, False),
+])
+async def test_release_read_connection(info, released):
+    session = FakeSession(**info)
+    assert await release_read_connection(session) is released
+    assert session.closed is released
+
+
+async def test_coalesced_uses_normalized_arguments(monkeypatch):
+    monkeypatch.setattr(module.settings, 'COALESCE_COORDINATE_PRECISION', 2)
+    release = asyncio.Event()
+    calls = []
+
+    @coalesced(round_coordinates)
+    async def nearby(lat: float, lon: float, session=None):
+        calls.append((lat, lon))
+        await release.wait()
+        return [lat, lon]
+
+    tasks = [
+        asyncio.create_task(nearby(55.7512, 37.6184)),
+        asyncio.create_task(nearby(55.7498, 37.6211, session=FakeSession())),
+    ]
+    await settle()
+    release.set()
+    assert await asyncio.gather(*tasks) == [[55.75, 37.62]] * 2
+    assert calls == [(55.75, 37.62)]
+
+
+async def test_coalesced_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(module.settings, 'COALESCE_REQUESTS', False)
+    release = asyncio.Event()
+    calls = []
+
+    @coalesced()
+    async def get(building_id: int):
+        calls.append(building_id)
+        await release.wait()
+        return building_id
+
+    tasks = [asyncio.create_task(get(1)) for _ in range(2)]
+    await settle()
+    release.set()
+    assert await asyncio.gather(*tasks) == [1, 1]
+    assert calls == [1, 1]
@@ -0,0 +1,141 @@
+'''Кэш векторных тайлов: бюджет в байтах, TTL, сброс по охвату, без БД'''
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import tiles
+from app.services.tiles import TileCache, TileService, intersects, tile_bounds
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # Только часы модуля тайлов: time.monotonic нужен и циклу событий
+    monkeypatch.setattr(tiles, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def test_tile_bounds():
+    assert tile_bounds(0, 0, 0) == pytest.approx((-180, -85.0511, 180, 85.0511), abs=1e-4)
+    min_lon, min_lat, max_lon, max_lat = tile_bounds(1, 1, 0)
+    assert (min_lon, max_lon) == (0, 180)
+    assert min_lat == pytest.approx(0) and max_lat == pytest.approx(85.0511, abs=1e-4)
+
+
+def test_intersects():
+    assert intersects((0, 0, 10, 10), (5, 5, 15, 15))
+    # Касание по границе - пересечение: точка на границе попадает в оба тайла
+    assert intersects((0, 0, 10, 10), (10, 10, 10, 10))
+    assert not intersects((0, 0, 10, 10), (10.1, 0, 20, 10))
+
+
+def test_get_set(clock):
+    cache = TileCache(max_bytes=100, ttl=60)
+    assert cache.get((1, 0, 0)) is None
+    cache.set((1, 0, 0), b'tile', cache.generation)
+    assert cache.get((1, 0, 0)) == b'tile'
+    cache.set((1, 0, 0), b'longer tile', cache.generation)
+    assert cache.size == len(b'longer tile')
+
+
+def test_byte_budget_evicts_least_recent(clock):
+    cache = TileCache(max_bytes=10, ttl=60)
+    cache.set((2, 0, 0), b'aaaa', cache.generation)
+    cache.set((2, 0, 1), b'bbbb', cache.generation)
+    cache.get((2, 0, 0))
+    cache.set((2, 1, 0), b'cccc', cache.generation)
+    assert cache.get((2, 0, 1)) is None
+    assert cache.get((2, 0, 0)) == b'aaaa'
+    assert cache.get((2, 1, 0)) == b'cccc'
+    assert cache.size == 8
+
+
+def test_tile_over_budget_is_not_stored(clock):
+    cache = TileCache(max_bytes=4, ttl=60)
+    cache.set((2, 0, 0), b'aaa', cache.generation)
+    cache.set((2, 0, 1), b'too big', cache.generation)
+    assert cache.get((2, 0, 1)) is None
+    assert cache.get((2, 0, 0)) == b'aaa'
+
+
+def test_ttl_expiry(clock):
+    cache = TileCache(max_bytes=100, ttl=5)
+    cache.set((1, 0, 0), b'tile', cache.generation)
+    clock.now += 4.9
+    assert cache.get((1, 0, 0)) == b'tile'
+    clock.now += 0.2
+    assert cache.get((1, 0, 0)) is None
+    assert cache.size == 0
+
+
+def test_invalidate_extent_drops_only_intersecting_tiles(clock):
+    cache = TileCache(max_bytes=100, ttl=60)
+    # z=1: (1, 0, 0) - северо-запад, (1, 1, 0) - северо-восток
+    cache.set((1, 0, 0), b'nw', cache.generation)
+    cache.set((1, 1, 0), b'ne', cache.generation)
+    cache.set((0, 0, 0), b'world', cache.generation)
+    cache.invalidate_extent((37.6, 55.7, 37.7, 55.8))
+    assert cache.get((1, 1, 0)) is None
+    assert cache.get((0, 0, 0)) is None
+    assert cache.get((1, 0, 0)) == b'nw'
+    assert cache.size == 2
+
+
+def test_set_after_invalidation_is_skipped(clock):
+    cache = TileCache(max_bytes=100, ttl=60)
+    generation = cache.generation
+    cache.invalidate_extent((37.6, 55.7, 37.7, 55.8))
+    # Тайл прочитан до сброса, даже если сброс его не задел
+    cache.set((1, 0, 0), b'stale', generation)
+    assert cache.get((1, 0, 0)) is None
+
+
+@pytest.mark.parametrize('payload', [None, 'не координаты', '1,2,3'])
+def test_notify_without_extent_clears(clock, payload):
+    cache = TileCache(max_bytes=100, ttl=60)
+    cache.set((1, 0, 0), b'nw', cache.generation)
+    generation = cache.generation
+    cache.on_notify(payload)
+    assert cache.get((1, 0, 0)) is None
+    assert cache.size == 0
+    assert cache.generation > generation
+
+
+def test_notify_with_extent(clock):
+    cache = TileCache(max_bytes=100, ttl=60)
+    cache.set((1, 0, 0), b'nw', cache.generation)
+    cache.set((1, 1, 0), b'ne', cache.generation)
+    cache.on_notify('37.6,55.7,37.7,55.8')
+    assert cache.get((1, 0, 0)) == b'nw'
+    assert cache.get((1, 1, 0)) is None
+
+
+@pytest.mark.anyio
+async def test_service_does_not_cache_tile_read_before_invalidation(monkeypatch, clock):
+    cache = TileCache(max_bytes=100, ttl=60)
+    monkeypatch.setattr(tiles, 'tile_cache', cache)
+    reads = []
+
+    class Repo:
+        def __init__(self, session) -> None:
+            pass
+
+        async def get_tile_db(self, z, x, y, extent, buffer):
+            reads.append((z, x, y))
+            # Уведомление о записи пришло, пока тайл читался из БД
+            cache.on_notify('37.6,55.7,37.7,55.8')
+            return f'v{len(reads)}'.encode()
+
+    monkeypatch.setattr(tiles, 'BuildingRepo', Repo)
+    service = TileService()
+    assert await service.get_tile(None, 1, 1, 0) == b'v1'
+    assert await service.get_tile(None, 1, 1, 0) == b'v2'
+    assert len(reads) == 2